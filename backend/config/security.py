@@ -108,6 +108,11 @@ BANNED_DESTRUCTIVE_PATTERNS: List[str] = [
     # "python -c 'import socket",
 ]
 
+# Un solo passaggio sul comando invece di un "in" per pattern
+_BANNED_DESTRUCTIVE_RE = re.compile(
+    "|".join(re.escape(pattern.lower()) for pattern in BANNED_DESTRUCTIVE_PATTERNS)
+)
+
 # Tool offensivi bloccati in modalità SAFE
 BANNED_TOOLS_SAFE_MODE: List[str] = [
     "masscan",
@@ -198,18 +203,21 @@ def _extract_command_name(segment: str) -> str:
     
     return words[0].lower() if words else ""
 
+# Pattern per path assoluti, relativi e con ~ (compilati una volta)
+_PATH_PATTERNS = (
+    re.compile(r'(/[^\s|><&;]+)'),        # Path assoluti
+    re.compile(r'(\./[^\s|><&;]+)'),      # Path relativi ./
+    re.compile(r'(~/[^\s|><&;]+)'),       # Home paths ~/
+)
+
+# Separatori di pipeline (|, &&, ||, ;)
+_PIPELINE_SEPARATORS = re.compile(r'\s*(?:\|{1,2}|&&|;)\s*')
+
 def _extract_paths_from_segment(segment: str) -> List[str]:
     """Estrae tutti i path da un segmento di comando."""
     paths = []
     
-    # Pattern per path assoluti, relativi e con ~
-    path_patterns = [
-        re.compile(r'(/[^\s|><&;]+)'),        # Path assoluti
-        re.compile(r'(\./[^\s|><&;]+)'),      # Path relativi ./
-        re.compile(r'(~/[^\s|><&;]+)'),       # Home paths ~/
-    ]
-    
-    for pattern in path_patterns:
+    for pattern in _PATH_PATTERNS:
         matches = pattern.findall(segment)
         paths.extend(matches)
     
@@ -273,9 +281,7 @@ def check_protected_path_access(command: str) -> Tuple[bool, str]:
         return (True, "UNRESTRICTED mode - path check skipped")
     
     # Dividi in segmenti di pipeline (|, &&, ||, ;)
-    # Regex per separare mantenendo la logica
-    pipeline_separators = re.compile(r'\s*(?:\|{1,2}|&&|;)\s*')
-    segments = pipeline_separators.split(command)
+    segments = _PIPELINE_SEPARATORS.split(command)
     
     for segment in segments:
         segment = segment.strip()
@@ -323,6 +329,30 @@ DOMAIN_PATTERN = re.compile(
     r'\b(?:[a-zA-Z0-9](?:[a-zA-Z0-9-]{0,61}[a-zA-Z0-9])?\.)+[a-zA-Z]{2,}\b'
 )
 
+# Estensioni file da ignorare (non sono domini!)
+IGNORED_EXTENSIONS = (
+    # Config files
+    '.conf', '.cfg', '.ini', '.yaml', '.yml', '.toml', '.env',
+    # Code files
+    '.txt', '.log', '.py', '.sh', '.bash', '.zsh', '.fish',
+    '.json', '.xml', '.html', '.css', '.js', '.ts', '.jsx', '.tsx',
+    '.c', '.cpp', '.h', '.hpp', '.java', '.go', '.rs', '.rb', '.php',
+    # Data files
+    '.csv', '.tsv', '.sql', '.db', '.sqlite', '.bak',
+    # Archive files
+    '.tar', '.zip', '.gz', '.bz2', '.xz', '.rar', '.7z',
+    # Binary files
+    '.bin', '.exe', '.dll', '.so', '.dylib', '.o', '.a',
+    # Document files
+    '.pdf', '.doc', '.docx', '.md', '.rst', '.tex',
+    # Image files
+    '.png', '.jpg', '.jpeg', '.gif', '.svg', '.ico', '.bmp',
+    # System files
+    '.pid', '.sock', '.lock', '.tmp', '.cache', '.swp',
+    # Keys and certs
+    '.pem', '.key', '.crt', '.cer', '.pub', '.gpg',
+)
+
 # Domini sempre permessi (per lookup, non attacco)
 ALLOWED_DOMAINS: List[str] = [
     "localhost",
@@ -433,9 +463,11 @@ def validate_command(command: str) -> Tuple[bool, str]:
         return (True, "UNRESTRICTED mode - all commands allowed")
     
     # Check pattern distruttivi (sempre bloccati)
-    for pattern in BANNED_DESTRUCTIVE_PATTERNS:
-        if pattern.lower() in command_lower:
-            return (False, f"Destructive pattern detected: {pattern}")
+    if _BANNED_DESTRUCTIVE_RE.search(command_lower):
+        # Solo sul percorso di blocco: primo pattern in ordine di lista per il motivo
+        for pattern in BANNED_DESTRUCTIVE_PATTERNS:
+            if pattern.lower() in command_lower:
+                return (False, f"Destructive pattern detected: {pattern}")
     
     # In modalità SAFE, blocca anche tool offensivi
     if CURRENT_SECURITY_LEVEL == SecurityLevel.SAFE:
@@ -461,36 +493,12 @@ def extract_targets_from_command(command: str) -> List[str]:
     ips = IP_PATTERN.findall(command)
     targets.extend(ips)
     
-    # Estensioni file da ignorare (non sono domini!)
-    IGNORED_EXTENSIONS = (
-        # Config files
-        '.conf', '.cfg', '.ini', '.yaml', '.yml', '.toml', '.env',
-        # Code files
-        '.txt', '.log', '.py', '.sh', '.bash', '.zsh', '.fish',
-        '.json', '.xml', '.html', '.css', '.js', '.ts', '.jsx', '.tsx',
-        '.c', '.cpp', '.h', '.hpp', '.java', '.go', '.rs', '.rb', '.php',
-        # Data files
-        '.csv', '.tsv', '.sql', '.db', '.sqlite', '.bak',
-        # Archive files
-        '.tar', '.zip', '.gz', '.bz2', '.xz', '.rar', '.7z',
-        # Binary files
-        '.bin', '.exe', '.dll', '.so', '.dylib', '.o', '.a',
-        # Document files
-        '.pdf', '.doc', '.docx', '.md', '.rst', '.tex',
-        # Image files
-        '.png', '.jpg', '.jpeg', '.gif', '.svg', '.ico', '.bmp',
-        # System files
-        '.pid', '.sock', '.lock', '.tmp', '.cache', '.swp',
-        # Keys and certs
-        '.pem', '.key', '.crt', '.cer', '.pub', '.gpg',
-    )
-    
     # Estrai domini (escludi estensioni file comuni)
     domains = DOMAIN_PATTERN.findall(command)
     for domain in domains:
         # Ignora se termina con un'estensione file conosciuta
         domain_lower = domain.lower()
-        if not any(domain_lower.endswith(ext) for ext in IGNORED_EXTENSIONS):
+        if not domain_lower.endswith(IGNORED_EXTENSIONS):
             targets.append(domain)
     
     return list(set(targets))  # Rimuovi duplicati
@@ -12,6 +12,7 @@ import queue
 import logging
 import subprocess
 import threading
+from concurrent.futures import Future, ThreadPoolExecutor
 from typing import Dict, Any, Optional, Generator, List
 from pathlib import Path
 from datetime import datetime
@@ -25,6 +26,97 @@ ARENA_DIR = Path("arena")
 GENERATED_DIR = Path("data/arena_dreams")
 GENERATED_DIR.mkdir(parents=True, exist_ok=True)
 
+# Sessions are serialized: one reusable worker instead of a thread per session
+_session_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="dream")
+
+# Victim templates (%-formatted, so literal braces need no escaping)
+_DOCKERFILE = """FROM python:3.11-slim
+WORKDIR /app
+COPY victim.py .
+EXPOSE 8000-9000
+CMD ["python", "-u", "victim.py"]
+"""
+
+_SOCKET_SETUP_TCP = """sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+sock.bind(("0.0.0.0", %s))
+"""
+_SOCKET_SETUP_UDP = _SOCKET_SETUP_TCP.replace("SOCK_STREAM", "SOCK_DGRAM")
+
+_TIMEOUT_VICTIM = """import socket
+import time
+
+PORT = %(port)s
+%(socket_setup)s%(listen)s
+print(f"[VICTIM] Silent listener on {PORT}...")
+
+while True:
+    %(loop_body)s
+"""
+_TIMEOUT_LOOP_TCP = "conn, addr = sock.accept(); time.sleep(30); conn.close()"
+_TIMEOUT_LOOP_UDP = "data, addr = sock.recvfrom(1024); time.sleep(30)"
+
+_AUTH_VICTIM = """import socket
+import hashlib
+
+PORT = %(port)s
+SECRET = "KALI_MASTER"
+FLAG = "FLAG{TRAUMA_AUTH_HEALED}"
+
+%(socket_setup)ssock.listen(5)
+print(f"[VICTIM] Auth server on {PORT}...")
+
+while True:
+    conn, addr = sock.accept()
+    conn.send(b"AUTH REQUIRED. SEND PASSWORD:\\n")
+    try:
+        pwd = conn.recv(1024).decode().strip()
+        if hashlib.sha256(pwd.encode()).hexdigest()[:8] == hashlib.sha256(SECRET.encode()).hexdigest()[:8]:
+            conn.send(f"ACCESS GRANTED. {FLAG}\\n".encode())
+        else:
+            conn.send(b"ACCESS DENIED.\\n")
+    except:
+        pass
+    conn.close()
+"""
+
+_STEALTH_VICTIM = """import socket
+import random
+import time
+
+REAL_PORT = %(port)s
+DECOY_PORTS = [p for p in range(REAL_PORT-10, REAL_PORT+10) if p != REAL_PORT]
+FLAG = "FLAG{TRAUMA_STEALTH_HEALED}"
+
+# Main service - only responds after specific knock sequence
+%(socket_setup)ssock.listen(1)
+print(f"[VICTIM] Stealth server on {REAL_PORT}...")
+
+while True:
+    conn, addr = sock.accept()
+    conn.send(f"KNOCK KNOCK. {FLAG}\\n".encode())
+    conn.close()
+"""
+
+_GENERIC_VICTIM = """import socket
+
+PORT = %(port)s
+FLAG = "FLAG{TRAUMA_GENERIC_HEALED}"
+
+%(socket_setup)s%(listen)s
+print(f"[VICTIM] Generic server on {PORT}...")
+
+while True:
+    %(loop_body)s
+"""
+_GENERIC_LOOP_TCP = "conn, addr = sock.accept(); conn.send(FLAG.encode() + b'\\n'); conn.close()"
+_GENERIC_LOOP_UDP = "data, addr = sock.recvfrom(1024); sock.sendto(FLAG.encode(), addr)"
+
+
+def _socket_setup(udp: bool, port_var: str) -> str:
+    """Shared socket/bind preamble for victim scripts."""
+    return (_SOCKET_SETUP_UDP if udp else _SOCKET_SETUP_TCP) % port_var
+
 
 class DreamSession:
     """Active training session state."""
@@ -37,6 +129,12 @@ class DreamSession:
         self.start_time = datetime.now()
         self.end_time: Optional[datetime] = None
         self.success = False
+        # Set by stop_session: the worker checks it between phases and rounds
+        self.stop_event = threading.Event()
+    
+    @property
+    def stopped(self) -> bool:
+        return self.stop_event.is_set()
     
     def log(self, message: str, level: str = "INFO"):
         """Add log entry to queue for SSE streaming."""
@@ -74,7 +172,9 @@ class DreamArchitect:
     def __init__(self):
         self._current_session: Optional[DreamSession] = None
         self._running = False
-        self._thread: Optional[threading.Thread] = None
+        self._future: Optional[Future] = None
+        # Guards _running/_current_session against the worker's finally block
+        self._state_lock = threading.Lock()
     
     @property
     def is_running(self) -> bool:
@@ -153,97 +253,41 @@ class DreamArchitect:
     
     def _gen_timeout_victim(self, port: int, protocol: str) -> str:
         """Generate a victim that times out / is unresponsive."""
-        return f'''import socket
-import time
-
-PORT = {port}
-sock = socket.socket(socket.AF_INET, socket.SOCK_{"DGRAM" if protocol == "UDP" else "STREAM"})
-sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-sock.bind(("0.0.0.0", PORT))
-{"sock.listen(1)" if protocol == "TCP" else ""}
-print(f"[VICTIM] Silent listener on {PORT}...")
-
-while True:
-    {"conn, addr = sock.accept(); time.sleep(30); conn.close()" if protocol == "TCP" else "data, addr = sock.recvfrom(1024); time.sleep(30)"}
-'''
+        udp = protocol == "UDP"
+        return _TIMEOUT_VICTIM % {
+            "port": port,
+            "socket_setup": _socket_setup(udp, "PORT"),
+            "listen": "" if udp else "sock.listen(1)",
+            "loop_body": _TIMEOUT_LOOP_UDP if udp else _TIMEOUT_LOOP_TCP,
+        }
     
     def _gen_auth_victim(self, port: int) -> str:
         """Generate a victim requiring authentication."""
-        return f'''import socket
-import hashlib
-
-PORT = {port}
-SECRET = "KALI_MASTER"
-FLAG = "FLAG{{TRAUMA_AUTH_HEALED}}"
-
-sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-sock.bind(("0.0.0.0", PORT))
-sock.listen(5)
-print(f"[VICTIM] Auth server on {{PORT}}...")
-
-while True:
-    conn, addr = sock.accept()
-    conn.send(b"AUTH REQUIRED. SEND PASSWORD:\\n")
-    try:
-        pwd = conn.recv(1024).decode().strip()
-        if hashlib.sha256(pwd.encode()).hexdigest()[:8] == hashlib.sha256(SECRET.encode()).hexdigest()[:8]:
-            conn.send(f"ACCESS GRANTED. {{FLAG}}\\n".encode())
-        else:
-            conn.send(b"ACCESS DENIED.\\n")
-    except:
-        pass
-    conn.close()
-'''
+        return _AUTH_VICTIM % {
+            "port": port,
+            "socket_setup": _socket_setup(False, "PORT"),
+        }
     
     def _gen_stealth_victim(self, port: int) -> str:
         """Generate a victim with stealth/closed port behavior."""
-        return f'''import socket
-import random
-import time
-
-REAL_PORT = {port}
-DECOY_PORTS = [p for p in range({port}-10, {port}+10) if p != REAL_PORT]
-FLAG = "FLAG{{TRAUMA_STEALTH_HEALED}}"
-
-# Main service - only responds after specific knock sequence
-sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-sock.bind(("0.0.0.0", REAL_PORT))
-sock.listen(1)
-print(f"[VICTIM] Stealth server on {{REAL_PORT}}...")
-
-while True:
-    conn, addr = sock.accept()
-    conn.send(f"KNOCK KNOCK. {{FLAG}}\\n".encode())
-    conn.close()
-'''
+        return _STEALTH_VICTIM % {
+            "port": port,
+            "socket_setup": _socket_setup(False, "REAL_PORT"),
+        }
     
     def _gen_generic_victim(self, port: int, protocol: str) -> str:
         """Generate a generic challenge victim."""
-        return f'''import socket
-
-PORT = {port}
-FLAG = "FLAG{{TRAUMA_GENERIC_HEALED}}"
-
-sock = socket.socket(socket.AF_INET, socket.SOCK_{"DGRAM" if protocol == "UDP" else "STREAM"})
-sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-sock.bind(("0.0.0.0", PORT))
-{"sock.listen(5)" if protocol == "TCP" else ""}
-print(f"[VICTIM] Generic server on {{PORT}}...")
-
-while True:
-    {"conn, addr = sock.accept(); conn.send(FLAG.encode() + b'\\n'); conn.close()" if protocol == "TCP" else "data, addr = sock.recvfrom(1024); sock.sendto(FLAG.encode(), addr)"}
-'''
+        udp = protocol == "UDP"
+        return _GENERIC_VICTIM % {
+            "port": port,
+            "socket_setup": _socket_setup(udp, "PORT"),
+            "listen": "" if udp else "sock.listen(5)",
+            "loop_body": _GENERIC_LOOP_UDP if udp else _GENERIC_LOOP_TCP,
+        }
     
     def _gen_dockerfile(self) -> str:
         """Generate Dockerfile for victim container."""
-        return '''FROM python:3.11-slim
-WORKDIR /app
-COPY victim.py .
-EXPOSE 8000-9000
-CMD ["python", "-u", "victim.py"]
-'''
+        return _DOCKERFILE
     
     def start_therapy_session(
         self, 
@@ -260,26 +304,25 @@ CMD ["python", "-u", "victim.py"]
         Returns:
             DreamSession object
         """
-        if self._running:
-            raise RuntimeError("Session already running")
-        
-        self._current_session = DreamSession(trauma_id)
-        self._running = True
-        
-        # Start in background thread
-        self._thread = threading.Thread(
-            target=self._run_therapy,
-            args=(trauma_id,),
-            daemon=True
-        )
-        self._thread.start()
+        with self._state_lock:
+            if self._running:
+                raise RuntimeError("Session already running")
+            
+            session = DreamSession(trauma_id)
+            self._current_session = session
+            self._running = True
+            
+            # Run on the shared session worker; the session object is the
+            # token that ties the run to this start call
+            self._future = _session_pool.submit(self._run_therapy, session)
         
-        return self._current_session
+        return session
     
-    def _run_therapy(self, trauma_id: str):
+    def _run_therapy(self, session: DreamSession):
         """Execute therapy session (runs in thread)."""
-        session = self._current_session
-        if not session:
+        trauma_id = session.trauma_id
+        if session.stopped:
+            # Stopped while still queued behind a previous session
             return
         
         try:
@@ -309,12 +352,19 @@ CMD ["python", "-u", "victim.py"]
                 session.status = "FAILED"
                 registry.fail_therapy(trauma_id)
                 return
+            if session.stopped:
+                session.status = "STOPPED"
+                return
             
             session.status = "FIGHTING"
             session.log("⚔️ ARENA COMBAT INITIATED", "SYSTEM")
             
             # Run Red vs Blue combat
             success = self._run_combat(session, scenario)
+            if session.stopped:
+                # stop_session already cleaned up the containers
+                session.status = "STOPPED"
+                return
             
             # Cleanup
             session.status = "CLEANUP"
@@ -337,7 +387,10 @@ CMD ["python", "-u", "victim.py"]
             session.status = "ERROR"
         finally:
             session.end_time = datetime.now()
-            self._running = False
+            with self._state_lock:
+                # Only the current session may clear the flag
+                if self._current_session is session:
+                    self._running = False
     
     def _deploy_containers(self, session: DreamSession, scenario: Dict) -> bool:
         """Deploy Docker containers for training."""
@@ -360,7 +413,7 @@ CMD ["python", "-u", "victim.py"]
                 return False
             
             session.log("Containers deployed, waiting for boot...", "SYSTEM")
-            time.sleep(5)
+            session.stop_event.wait(5)
             return True
             
         except Exception as e:
@@ -380,6 +433,8 @@ CMD ["python", "-u", "victim.py"]
         blue_score = 0
         
         for i in range(rounds):
+            if session.stopped:
+                return False
             session.log(f"--- Round {i+1}/{rounds} ---", "SYSTEM")
             
             # Simulate Red Team action
@@ -395,7 +450,7 @@ CMD ["python", "-u", "victim.py"]
                 session.log("Togusa detecting anomalies...", "BLUE")
                 blue_score += 1
             
-            time.sleep(1)
+            session.stop_event.wait(1)
         
         # Determine victory
         session.log(f"Final: Red {red_score} - Blue {blue_score}", "SYSTEM")
@@ -440,20 +495,30 @@ CMD ["python", "-u", "victim.py"]
     
     def stop_session(self):
         """Force stop current session."""
-        if self._running:
+        with self._state_lock:
+            if not self._running:
+                return
             self._running = False
-            if self._current_session:
-                self._current_session.log("⚠️ Session force stopped", "SYSTEM")
-                self._cleanup_containers(self._current_session)
+            session = self._current_session
+            if self._future:
+                self._future.cancel()  # Only effective while still queued
+        if session:
+            # The running worker notices the event between phases and rounds
+            session.stop_event.set()
+            session.log("⚠️ Session force stopped", "SYSTEM")
+            self._cleanup_containers(session)
 
 
 # Singleton
 _architect: Optional[DreamArchitect] = None
+_architect_lock = threading.Lock()
 
 
 def get_architect() -> DreamArchitect:
-    """Get or create DreamArchitect singleton."""
+    """Get or create DreamArchitect singleton (double-checked locking)."""
     global _architect
     if _architect is None:
-        _architect = DreamArchitect()
+        with _architect_lock:
+            if _architect is None:
+                _architect = DreamArchitect()
     return _architect
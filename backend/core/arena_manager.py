@@ -2,16 +2,20 @@ import os
 import time
 import subprocess
 import autogen
-from typing import Dict
+from typing import Dict, List, Union
 from dotenv import load_dotenv
 import threading
 import queue
 import sys
+from concurrent.futures import ThreadPoolExecutor
+
+from backend.core.execution.process_utils import split_simple_command
 
 # Global state for API
 ARENA_STATUS = "IDLE" # IDLE, RUNNING, STOPPING
 ARENA_LOG_QUEUE = queue.Queue()
-ARENA_THREAD = None
+ARENA_THREAD = None  # Future del match corrente
+ARENA_POOL = ThreadPoolExecutor(max_workers=1, thread_name_prefix="arena")
 STOP_EVENT = threading.Event()
 
 def log_arena(msg):
@@ -31,15 +35,30 @@ llm_config = {"config_list": config_list}
 
 # --- TOOL PER L'ARENA ---
 
-def execute_red_command(command: str) -> str:
-    """Esegue comandi dal container dell'attaccante"""
-def execute_red_command(command: str) -> str:
+def _container_exec_argv(container: str, command: Union[str, List[str]]) -> List[str]:
+    """
+    Costruisce l'argv per 'podman exec'.
+    
+    Le liste vengono eseguite direttamente; le stringhe senza metacaratteri
+    né builtin vengono splittate con shlex, evitando l'avvio di una shell nel
+    container. Solo i comandi che usano feature di shell passano da 'sh -c'.
+    """
+    prefix = ["podman", "exec", container]
+    if isinstance(command, list):
+        return prefix + command
+    argv = split_simple_command(command)
+    if argv is not None:
+        return prefix + argv
+    return prefix + ["sh", "-c", command]
+
+
+def execute_red_command(command: Union[str, List[str]]) -> str:
     """Esegue comandi dal container dell'attaccante"""
     log_arena(f"[RED TEAM ACTION] {command}")
     try:
         # Esegue dentro il container arena_attacker
         res = subprocess.run(
-            ["podman", "exec", "arena_attacker", "bash", "-c", command],
+            _container_exec_argv("arena_attacker", command),
             capture_output=True, text=True, timeout=30
         )
         return f"STDOUT:\n{res.stdout}\nSTDERR:\n{res.stderr}"
@@ -70,8 +89,8 @@ def read_blue_logs() -> str:
             capture_output=True, text=True
         )
         return f"LOG SISTEMA:\n{res.stdout}"
-    except:
-        return "Log non accessibili."
+    except (subprocess.SubprocessError, OSError) as e:
+        return f"Log non accessibili: {e}"
 
 # --- AGENTI DELL'ARENA ---
 
@@ -192,11 +211,9 @@ def stop_match():
 
 def start_match_thread():
     global ARENA_THREAD
-    if ARENA_THREAD and ARENA_THREAD.is_alive():
+    if ARENA_THREAD and not ARENA_THREAD.done():
         return False
-    ARENA_THREAD = threading.Thread(target=start_match_logic)
-    ARENA_THREAD.daemon = True
-    ARENA_THREAD.start()
+    ARENA_THREAD = ARENA_POOL.submit(start_match_logic)
     return True
 
 if __name__ == "__main__":
@@ -11,16 +11,156 @@ Funzionalità:
 """
 
 import os
+import re
 import json
+import time
+import heapq
+import atexit
+import queue
 import logging
+import itertools
+import threading
+import weakref
+from collections import defaultdict, deque
 from datetime import datetime
+from functools import cache, lru_cache
 from enum import Enum
-from typing import Dict, List, Optional, Tuple
-from dataclasses import dataclass, field, asdict
+from typing import Deque, Dict, List, Optional, Set, Tuple, Union
+from dataclasses import dataclass, field
 from pathlib import Path
 
 logger = logging.getLogger('GoalTracker')
 
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+
+def _dumps(obj) -> bytes:
+    """Serializza in JSON compatto (bytes UTF-8), orjson se disponibile"""
+    if ORJSON_AVAILABLE:
+        return orjson.dumps(obj)
+    return json.dumps(obj, separators=(',', ':'), ensure_ascii=False).encode()
+
+
+def _loads(data: bytes):
+    """Deserializza JSON da bytes, orjson se disponibile"""
+    if ORJSON_AVAILABLE:
+        return orjson.loads(data)
+    return json.loads(data)
+
+try:
+    import msgpack
+    MSGPACK_AVAILABLE = True
+except ImportError:
+    MSGPACK_AVAILABLE = False
+
+# Formato dei checkpoint: msgpack (binario, compatto) se disponibile, altrimenti JSON.
+# load_mission prova i formati in quest'ordine.
+_CHECKPOINT_SUFFIXES = (".msgpack", ".json") if MSGPACK_AVAILABLE else (".json",)
+
+try:
+    import zstandard as zstd
+    ZSTD_AVAILABLE = True
+    _zctx = zstd.ZstdCompressor(level=3)
+    _dctx = zstd.ZstdDecompressor()
+except ImportError:
+    ZSTD_AVAILABLE = False
+
+# Oltre questa soglia il checkpoint viene compresso (<mission_id><suffix>.zst)
+ZSTD_THRESHOLD = 4096
+_ZST = ".zst"
+
+
+def _encode_goal_fragment(goal_id: str, goal_dict: dict) -> bytes:
+    """Coppia chiave/valore di un goal, già serializzata nel formato del checkpoint"""
+    if MSGPACK_AVAILABLE:
+        return msgpack.packb(goal_id, use_bin_type=True) + msgpack.packb(goal_dict, use_bin_type=True)
+    return _dumps(goal_id) + b':' + _dumps(goal_dict)
+
+
+# Separatore tra coppie chiave/valore già serializzate
+_PAIR_SEP = b'' if MSGPACK_AVAILABLE else b','
+
+
+def _encode_pairs(fields: dict) -> bytes:
+    """Coppie chiave/valore di un dict, serializzate senza l'involucro della mappa"""
+    if MSGPACK_AVAILABLE:
+        return b''.join(
+            msgpack.packb(key, use_bin_type=True) + msgpack.packb(value, use_bin_type=True)
+            for key, value in fields.items()
+        )
+    return _dumps(fields)[1:-1]
+
+
+def _assemble_checkpoint(header_chunks: List[bytes], header_len: int, fragments: List[bytes]) -> bytes:
+    """
+    Compone il checkpoint da coppie di header e frammenti dei goal già serializzati.
+    
+    Args:
+        header_chunks: Blocchi di coppie dell'header (vedi _encode_pairs)
+        header_len: Numero totale di chiavi nell'header
+        fragments: Frammenti dei goal (vedi _encode_goal_fragment)
+    """
+    header = _PAIR_SEP.join(chunk for chunk in header_chunks if chunk)
+    if MSGPACK_AVAILABLE:
+        packer = msgpack.Packer(use_bin_type=True)
+        return b''.join((
+            packer.pack_map_header(header_len + 1),
+            header,
+            packer.pack("goals"),
+            packer.pack_map_header(len(fragments)),
+            *fragments,
+        ))
+    return b'{' + header + b',"goals":{' + b','.join(fragments) + b'}}'
+
+
+def _decode_checkpoint(data: bytes, suffix: str) -> dict:
+    """Decodifica un checkpoint in base all'estensione del file"""
+    if suffix.endswith(_ZST):
+        data = _dctx.decompress(data)
+        suffix = suffix[:-len(_ZST)]
+    if suffix == ".msgpack":
+        return msgpack.unpackb(data, raw=False)
+    return _loads(data)
+
+
+# Evidence: (epoch_seconds, messaggio); le stringhe sono voci legacy già formattate
+EvidenceEntry = Union[Tuple[int, str], str]
+
+# Storico limitato: il report usa solo le ultime voci, il resto gonfierebbe ogni checkpoint
+EVIDENCE_MAXLEN = 64
+BLOCKED_PATHS_MAXLEN = 32
+
+
+def _iso() -> str:
+    """Timestamp ISO al secondo per created_at/completed_at/start_time"""
+    return datetime.now().isoformat(timespec='seconds')
+
+
+@lru_cache(maxsize=1024)
+def _hms(ts: int) -> str:
+    """HH:MM:SS di un epoch, memoizzato (molte evidence cadono nello stesso secondo)"""
+    return time.strftime('%H:%M:%S', time.localtime(ts))
+
+
+def _format_evidence(entry: EvidenceEntry) -> str:
+    """Rende una voce di evidence come '[HH:MM:SS] messaggio'"""
+    if isinstance(entry, str):
+        return entry
+    ts, message = entry
+    return f"[{_hms(ts)}] {message}"
+
+
+def _load_evidence(entries: list) -> Deque[EvidenceEntry]:
+    """Normalizza le evidence lette da disco (liste -> tuple)"""
+    return deque(
+        (e if isinstance(e, str) else (int(e[0]), e[1]) for e in entries),
+        maxlen=EVIDENCE_MAXLEN
+    )
+
 class GoalStatus(Enum):
     """Stato di un obiettivo"""
     PENDING = "pending"      # Non ancora iniziato
@@ -30,6 +170,21 @@ class GoalStatus(Enum):
     FAILED = "failed"        # Fallito definitivamente
     SKIPPED = "skipped"      # Saltato (non più rilevante)
 
+# Mission ID univoci per costruzione: pid + contatore di processo + time_ns
+_mission_counter = itertools.count()
+_PID = os.getpid()
+
+_OPEN_STATUSES = frozenset((GoalStatus.PENDING, GoalStatus.IN_PROGRESS))
+
+_STATUS_EMOJI = {
+    GoalStatus.PENDING: "⚪",
+    GoalStatus.IN_PROGRESS: "🔵",
+    GoalStatus.BLOCKED: "🟠",
+    GoalStatus.ACHIEVED: "✅",
+    GoalStatus.FAILED: "❌",
+    GoalStatus.SKIPPED: "⏭️"
+}
+
 class GoalPriority(Enum):
     """Priorità obiettivo"""
     CRITICAL = 1    # Missione fallisce senza questo
@@ -37,7 +192,24 @@ class GoalPriority(Enum):
     MEDIUM = 3      # Nice to have
     LOW = 4         # Opportunistico
 
-@dataclass
+# Classificatore dei goal: un gruppo per categoria, in ordine di precedenza
+_CATEGORY_RE = re.compile(r'(enum|recon)|(exploit)|(priv|root)', re.IGNORECASE)
+_CATEGORIES = ("enumerate", "exploit", "privesc")
+
+# categoria -> (action_type, template del suggerimento)
+_SUGGESTION_TEMPLATES: Dict[str, Tuple[str, str]] = {
+    "enumerate": ("enumerate", "Procedi con: {description}\nSuggerimento: nmap, gobuster, nikto, whatweb"),
+    "exploit": ("exploit", "Procedi con: {description}\nSuggerimento: searchsploit, metasploit, manual exploit"),
+    "privesc": ("privesc", "Procedi con: {description}\nSuggerimento: linpeas, winpeas, sudo -l, SUID"),
+    "proceed": ("proceed", "Prossimo obiettivo: {name}\n{description}"),
+}
+
+def _classify_goal(name: str) -> str:
+    """Categoria di suggerimento di un goal, calcolata una volta dal nome"""
+    group = min((m.lastindex for m in _CATEGORY_RE.finditer(name)), default=None)
+    return _CATEGORIES[group - 1] if group else "proceed"
+
+@dataclass(slots=True)
 class Goal:
     """Rappresenta un obiettivo"""
     id: str
@@ -46,22 +218,34 @@ class Goal:
     status: GoalStatus = GoalStatus.PENDING
     priority: GoalPriority = GoalPriority.MEDIUM
     parent_id: Optional[str] = None
-    evidence: List[str] = field(default_factory=list)
+    evidence: Deque[EvidenceEntry] = field(default_factory=lambda: deque(maxlen=EVIDENCE_MAXLEN))
     attempts: int = 0
     max_attempts: int = 5
-    created_at: str = field(default_factory=lambda: datetime.now().isoformat())
+    created_at: str = field(default_factory=_iso)
     completed_at: Optional[str] = None
+    category: str = "proceed"  # Tipo di suggerimento, calcolato dal nome
     
     def add_evidence(self, evidence: str):
-        self.evidence.append(f"[{datetime.now().strftime('%H:%M:%S')}] {evidence}")
+        self.evidence.append((int(time.time()), evidence))
     
     def to_dict(self) -> dict:
-        d = asdict(self)
-        d['status'] = self.status.value
-        d['priority'] = self.priority.value
-        return d
+        # Dict esplicito: asdict() fa deepcopy di ogni campo
+        return {
+            'id': self.id,
+            'name': self.name,
+            'description': self.description,
+            'status': self.status.value,
+            'priority': self.priority.value,
+            'parent_id': self.parent_id,
+            'evidence': list(self.evidence),
+            'attempts': self.attempts,
+            'max_attempts': self.max_attempts,
+            'created_at': self.created_at,
+            'completed_at': self.completed_at,
+            'category': self.category,
+        }
 
-@dataclass
+@dataclass(slots=True)
 class MissionState:
     """Stato complessivo della missione"""
     mission_id: str
@@ -69,14 +253,78 @@ class MissionState:
     start_time: str
     goals: Dict[str, Goal] = field(default_factory=dict)
     current_focus: Optional[str] = None
-    blocked_paths: List[str] = field(default_factory=list)
+    blocked_paths: Deque[str] = field(default_factory=lambda: deque(maxlen=BLOCKED_PATHS_MAXLEN))
+    # Indice goal_id per stato, aggiornato da add_goal e GoalTracker._transition
+    by_status: Dict[GoalStatus, Set[str]] = field(default_factory=lambda: defaultdict(set), repr=False, compare=False)
+    # Coda di priorità dei goal aperti: (priority, ordine di inserimento, goal_id), cancellazione lazy.
+    # L'ordine di inserimento sostituisce created_at (al secondo) come tie-break stabile.
+    _pending_heap: List[Tuple[int, int, str]] = field(default_factory=list, repr=False, compare=False)
+    _pending_seq: "itertools.count" = field(default_factory=itertools.count, repr=False, compare=False)
+    # Campi immutabili già serializzati, calcolati al primo checkpoint
+    _header_cache: Optional[bytes] = field(default=None, repr=False, compare=False)
+    
+    def to_dict(self) -> dict:
+        """Struttura canonica della missione (formato dei checkpoint)"""
+        return {
+            "mission_id": self.mission_id,
+            "primary_goal": self.primary_goal,
+            "start_time": self.start_time,
+            "current_focus": self.current_focus,
+            "blocked_paths": list(self.blocked_paths),
+            "goals": {k: v.to_dict() for k, v in self.goals.items()}
+        }
+    
+    def static_header(self) -> bytes:
+        """Coppie serializzate di mission_id/primary_goal/start_time (costanti)"""
+        if self._header_cache is None:
+            self._header_cache = _encode_pairs({
+                "mission_id": self.mission_id,
+                "primary_goal": self.primary_goal,
+                "start_time": self.start_time,
+            })
+        return self._header_cache
+    
+    def dynamic_header(self) -> dict:
+        """Campi dell'header che cambiano durante la missione"""
+        return {
+            "current_focus": self.current_focus,
+            "blocked_paths": list(self.blocked_paths),
+        }
+    
+    def add_goal(self, goal: "Goal"):
+        """Registra un goal (o ne sostituisce uno con lo stesso id)"""
+        previous = self.goals.get(goal.id)
+        if previous is not None:
+            self.by_status[previous.status].discard(goal.id)
+        self.by_status[goal.status].add(goal.id)
+        self.goals[goal.id] = goal
+        if goal.status in _OPEN_STATUSES:
+            self.push_pending(goal)
+    
+    def push_pending(self, goal: "Goal"):
+        """Inserisce un goal nella coda di priorità"""
+        heapq.heappush(self._pending_heap, (goal.priority.value, next(self._pending_seq), goal.id))
+    
+    def peek_pending(self) -> Optional["Goal"]:
+        """
+        Restituisce il goal aperto a priorità più alta senza rimuoverlo.
+        
+        Le voci obsolete (goal chiusi o sovrascritti) vengono scartate qui.
+        """
+        heap = self._pending_heap
+        while heap:
+            priority, _, goal_id = heap[0]
+            goal = self.goals.get(goal_id)
+            if goal is not None and goal.status in _OPEN_STATUSES and goal.priority.value == priority:
+                return goal
+            heapq.heappop(heap)
+        return None
     
     def get_progress(self) -> float:
         """Calcola progresso 0-100%"""
         if not self.goals:
             return 0.0
-        achieved = sum(1 for g in self.goals.values() if g.status == GoalStatus.ACHIEVED)
-        return (achieved / len(self.goals)) * 100
+        return (len(self.by_status[GoalStatus.ACHIEVED]) / len(self.goals)) * 100
 
 class GoalTracker:
     """
@@ -90,10 +338,38 @@ class GoalTracker:
         tracker.get_next_action()  # Suggerisce prossimo passo
     """
     
+    # Scritture su disco raggruppate: flush ogni N mutazioni o ogni T secondi
+    FLUSH_INTERVAL = 2.0
+    FLUSH_THRESHOLD = 16
+    
+    # Directory già create in questo processo (mkdir solo alla prima scrittura)
+    _ensured: Set[Path] = set()
+    
     def __init__(self, persistence_dir: str = None):
         self.state: Optional[MissionState] = None
         self.persistence_dir = Path(persistence_dir or "/tmp/kali_goals")
-        self.persistence_dir.mkdir(parents=True, exist_ok=True)
+        
+        self._dirty = False
+        self._pending_mutations = 0
+        self._last_flush = time.monotonic()
+        self._flush_interval = self.FLUSH_INTERVAL
+        self._flush_threshold = self.FLUSH_THRESHOLD
+        self._serialized_cache: Dict[str, bytes] = {}
+        # Contatore di mutazioni: invalida il report memoizzato
+        self._mutation_seq = 0
+        self._report_cache: Optional[Tuple[int, str]] = None
+        
+        # Writer in background: tiene solo l'ultimo snapshot, quelli intermedi vengono scartati
+        self._latest_snapshot: Optional[Tuple[Path, bytes, int]] = None
+        self._snapshot_lock = threading.Lock()
+        # Notificata quando il writer termina una scrittura (vedi flush)
+        self._snapshot_cond = threading.Condition(self._snapshot_lock)
+        self._writing = False
+        self._snapshot_seq = 0
+        self._written_seq = 0
+        self._last_written: Optional[Path] = None
+        self._write_lock = threading.Lock()
+        _TRACKERS.add(self)
     
     def set_mission(self, primary_goal: str, mission_id: str = None) -> str:
         """
@@ -106,12 +382,15 @@ class GoalTracker:
         Returns:
             mission_id
         """
-        mission_id = mission_id or f"mission_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+        # Non perdere mutazioni in sospeso della missione precedente
+        self.flush()
+        self._serialized_cache.clear()
+        mission_id = mission_id or f"m_{_PID}_{next(_mission_counter)}_{time.time_ns():x}"
         
         self.state = MissionState(
             mission_id=mission_id,
             primary_goal=primary_goal,
-            start_time=datetime.now().isoformat()
+            start_time=_iso()
         )
         
         # Crea goal primario
@@ -121,7 +400,8 @@ class GoalTracker:
             description=primary_goal,
             priority=GoalPriority.CRITICAL
         )
-        self.state.goals["primary"] = primary
+        primary.category = _classify_goal(primary.name)
+        self.state.add_goal(primary)
         self.state.current_focus = "primary"
         
         logger.info(f"[GoalTracker] Mission started: {primary_goal}")
@@ -155,10 +435,12 @@ class GoalTracker:
             name=name,
             description=description,
             parent_id=parent_id,
-            priority=priority
+            priority=priority,
+            category=_classify_goal(name)
         )
         
-        self.state.goals[goal_id] = goal
+        self.state.add_goal(goal)
+        self._touch(goal_id)
         logger.debug(f"[GoalTracker] Subgoal added: {goal_id} -> {name}")
         self._persist()
         
@@ -166,9 +448,10 @@ class GoalTracker:
     
     def start_goal(self, goal_id: str):
         """Marca un goal come in corso"""
-        if goal_id in self.state.goals:
-            self.state.goals[goal_id].status = GoalStatus.IN_PROGRESS
-            self.state.goals[goal_id].attempts += 1
+        if self.state and goal_id in self.state.goals:
+            goal = self.state.goals[goal_id]
+            self._transition(goal, GoalStatus.IN_PROGRESS)
+            goal.attempts += 1
             self.state.current_focus = goal_id
             self._persist()
     
@@ -185,14 +468,17 @@ class GoalTracker:
             return
         
         goal = self.state.goals[goal_id]
-        goal.status = GoalStatus.ACHIEVED
-        goal.completed_at = datetime.now().isoformat()
+        if goal.status == GoalStatus.ACHIEVED:
+            return  # Già raggiunto: nessuna riscrittura
+        self._transition(goal, GoalStatus.ACHIEVED)
+        goal.completed_at = _iso()
         
         if evidence:
             goal.add_evidence(f"ACHIEVED: {evidence}")
         
         logger.info(f"[GoalTracker] ✅ Goal achieved: {goal.name}")
-        self._persist()
+        # Il completamento del goal primario chiude la missione: scrittura immediata
+        self._persist(force=goal_id == "primary")
     
     def mark_blocked(self, goal_id: str, reason: str):
         """
@@ -206,7 +492,9 @@ class GoalTracker:
             return
         
         goal = self.state.goals[goal_id]
-        goal.status = GoalStatus.BLOCKED
+        if goal.status == GoalStatus.BLOCKED:
+            return  # Già bloccato: nessuna riscrittura
+        self._transition(goal, GoalStatus.BLOCKED)
         goal.add_evidence(f"BLOCKED: {reason}")
         
         self.state.blocked_paths.append(f"{goal_id}: {reason}")
@@ -220,11 +508,34 @@ class GoalTracker:
             return
         
         goal = self.state.goals[goal_id]
-        goal.status = GoalStatus.FAILED
+        if goal.status == GoalStatus.FAILED:
+            return  # Già fallito: nessuna riscrittura
+        self._transition(goal, GoalStatus.FAILED)
         goal.add_evidence(f"FAILED: {reason}")
         
         logger.error(f"[GoalTracker] ❌ Goal failed: {goal.name}")
-        self._persist()
+        self._persist(force=True)
+    
+    def _transition(self, goal: Goal, new_status: GoalStatus) -> GoalStatus:
+        """
+        Unico punto in cui cambia lo stato di un goal.
+        
+        Mantiene coerenti l'indice per stato, la coda di priorità e la cache
+        di serializzazione.
+        
+        Returns:
+            Lo stato precedente
+        """
+        old_status = goal.status
+        by_status = self.state.by_status
+        by_status[old_status].discard(goal.id)
+        by_status[new_status].add(goal.id)
+        goal.status = new_status
+        # Un goal riaperto (es. BLOCKED -> IN_PROGRESS) potrebbe essere già uscito dall'heap
+        if new_status in _OPEN_STATUSES and old_status not in _OPEN_STATUSES:
+            self.state.push_pending(goal)
+        self._touch(goal.id)
+        return old_status
     
     def get_next_action(self) -> Tuple[str, str]:
         """
@@ -236,62 +547,41 @@ class GoalTracker:
         if not self.state:
             return ("error", "No mission active")
         
-        # Trova goal non completati ordinati per priorità
-        pending = [
-            g for g in self.state.goals.values() 
-            if g.status in [GoalStatus.PENDING, GoalStatus.IN_PROGRESS]
-        ]
+        # Goal aperto a priorità più alta (heap, O(log N))
+        next_goal = self.state.peek_pending()
         
-        if not pending:
+        if next_goal is None:
             # Tutti completati?
-            achieved = sum(1 for g in self.state.goals.values() if g.status == GoalStatus.ACHIEVED)
-            if achieved == len(self.state.goals):
+            if len(self.state.by_status[GoalStatus.ACHIEVED]) == len(self.state.goals):
                 return ("complete", "🎉 Tutti gli obiettivi raggiunti! MISSION CLOSED.")
             else:
                 return ("stuck", "Tutti i path sono bloccati. Serve nuovo vettore d'attacco.")
         
-        # Ordina per priorità
-        pending.sort(key=lambda g: g.priority.value)
-        next_goal = pending[0]
-        
         # Check se bloccato troppe volte
         if next_goal.attempts >= next_goal.max_attempts:
             return (
                 "change_vector", 
                 f"Goal '{next_goal.name}' ha fallito {next_goal.attempts} volte. "
-                f"Cerca un vettore alternativo. Path bloccati: {self.state.blocked_paths[-3:]}"
+                f"Cerca un vettore alternativo. Path bloccati: {list(self.state.blocked_paths)[-3:]}"
             )
         
-        # Suggerimenti basati sul tipo di goal
-        if "enum" in next_goal.name.lower() or "recon" in next_goal.name.lower():
-            return (
-                "enumerate",
-                f"Procedi con: {next_goal.description}\n"
-                f"Suggerimento: nmap, gobuster, nikto, whatweb"
-            )
-        elif "exploit" in next_goal.name.lower():
-            return (
-                "exploit",
-                f"Procedi con: {next_goal.description}\n"
-                f"Suggerimento: searchsploit, metasploit, manual exploit"
-            )
-        elif "priv" in next_goal.name.lower() or "root" in next_goal.name.lower():
-            return (
-                "privesc",
-                f"Procedi con: {next_goal.description}\n"
-                f"Suggerimento: linpeas, winpeas, sudo -l, SUID"
-            )
-        else:
-            return (
-                "proceed",
-                f"Prossimo obiettivo: {next_goal.name}\n{next_goal.description}"
-            )
+        # Suggerimento in base alla categoria (precalcolata in add_subgoal)
+        action_type, template = _SUGGESTION_TEMPLATES.get(
+            next_goal.category, _SUGGESTION_TEMPLATES["proceed"]
+        )
+        return (
+            action_type,
+            template.format(name=next_goal.name, description=next_goal.description)
+        )
     
     def get_status_report(self) -> str:
-        """Genera report leggibile dello stato"""
+        """Genera report leggibile dello stato (memoizzato finché lo stato non cambia)"""
         if not self.state:
             return "No mission active."
         
+        if self._report_cache and self._report_cache[0] == self._mutation_seq:
+            return self._report_cache[1]
+        
         lines = [
             f"## Mission Status: {self.state.mission_id}",
             f"**Primary Goal:** {self.state.primary_goal}",
@@ -300,78 +590,231 @@ class GoalTracker:
             "### Goals:"
         ]
         
-        for goal_id, goal in self.state.goals.items():
-            status_emoji = {
-                GoalStatus.PENDING: "⚪",
-                GoalStatus.IN_PROGRESS: "🔵",
-                GoalStatus.BLOCKED: "🟠",
-                GoalStatus.ACHIEVED: "✅",
-                GoalStatus.FAILED: "❌",
-                GoalStatus.SKIPPED: "⏭️"
-            }.get(goal.status, "❓")
-            
-            lines.append(f"- {status_emoji} **{goal.name}** [{goal.status.value}]")
+        for goal in self.state.goals.values():
+            lines.append(f"- {_STATUS_EMOJI.get(goal.status, '❓')} **{goal.name}** [{goal.status.value}]")
             if goal.evidence:
-                lines.append(f"  - Last: {goal.evidence[-1]}")
+                lines.append(f"  - Last: {_format_evidence(goal.evidence[-1])}")
         
         if self.state.blocked_paths:
             lines.append("")
             lines.append("### Blocked Paths:")
-            for path in self.state.blocked_paths[-5:]:
-                lines.append(f"- {path}")
+            lines.extend(f"- {path}" for path in list(self.state.blocked_paths)[-5:])
+        
+        report = "\n".join(lines)
+        self._report_cache = (self._mutation_seq, report)
+        return report
+    
+    def _persist(self, force: bool = False):
+        """
+        Registra una mutazione e salva su disco solo quando serve.
+        
+        Le mutazioni vengono accumulate (dirty flag) e scritte in un'unica
+        riscrittura dopo FLUSH_THRESHOLD mutazioni o FLUSH_INTERVAL secondi.
+        
+        Args:
+            force: Scrive subito e in modo sincrono (transizioni critiche)
+        """
+        if not self.state:
+            return
         
-        return "\n".join(lines)
+        # Ogni mutazione passa da qui
+        self._mutation_seq += 1
+        self._dirty = True
+        self._pending_mutations += 1
+        
+        if force:
+            self._persist_now(sync=True)
+        elif (
+            self._pending_mutations >= self._flush_threshold
+            or time.monotonic() - self._last_flush > self._flush_interval
+        ):
+            self._persist_now()
+    
+    def flush(self):
+        """Scrive su disco eventuali mutazioni in sospeso e attende il writer"""
+        if self._dirty:
+            self._persist_now(sync=True)
+        else:
+            with self._snapshot_lock:
+                snapshot, self._latest_snapshot = self._latest_snapshot, None
+            if snapshot:
+                self._write_checkpoint(*snapshot)
+        # Attende un'eventuale scrittura in corso nel writer (snapshot già prelevato)
+        with self._snapshot_cond:
+            self._snapshot_cond.wait_for(lambda: not self._writing)
     
-    def _persist(self):
-        """Salva stato su disco"""
+    def _persist_now(self, sync: bool = False):
+        """
+        Serializza lo stato e lo salva su disco.
+        
+        La serializzazione avviene nel thread chiamante (in memoria, veloce);
+        la scrittura è delegata al writer in background, salvo sync=True.
+        I goal non modificati riusano il frammento serializzato in cache.
+        
+        Args:
+            sync: Scrive nel thread chiamante prima di tornare
+        """
         if not self.state:
             return
         
-        filepath = self.persistence_dir / f"{self.state.mission_id}.json"
+        suffix = _CHECKPOINT_SUFFIXES[0]
+        filepath = self.persistence_dir / f"{self.state.mission_id}{suffix}"
+        
+        dynamic = self.state.dynamic_header()
+        payload = _assemble_checkpoint(
+            [self.state.static_header(), _encode_pairs(dynamic)],
+            3 + len(dynamic),
+            [
+                self._goal_fragment(goal_id, goal)
+                for goal_id, goal in self.state.goals.items()
+            ]
+        )
         
-        data = {
-            "mission_id": self.state.mission_id,
-            "primary_goal": self.state.primary_goal,
-            "start_time": self.state.start_time,
-            "current_focus": self.state.current_focus,
-            "blocked_paths": self.state.blocked_paths,
-            "goals": {k: v.to_dict() for k, v in self.state.goals.items()}
-        }
+        self._dirty = False
+        self._pending_mutations = 0
+        self._last_flush = time.monotonic()
+        self._snapshot_seq += 1
+        snapshot = (filepath, payload, self._snapshot_seq)
         
-        with open(filepath, 'w') as f:
-            json.dump(data, f, indent=2)
+        if sync:
+            with self._snapshot_lock:
+                self._latest_snapshot = None
+            self._write_checkpoint(*snapshot)
+            return
+        
+        with self._snapshot_lock:
+            self._latest_snapshot = snapshot
+        _schedule_write(self)
+    
+    def _write_pending(self):
+        """Chiamata dal writer condiviso: scrive lo snapshot più recente, se c'è"""
+        with self._snapshot_lock:
+            snapshot, self._latest_snapshot = self._latest_snapshot, None
+            self._writing = snapshot is not None
+        if snapshot is None:
+            return
+        try:
+            self._write_checkpoint(*snapshot)
+        except OSError as e:
+            logger.error(f"[GoalTracker] Checkpoint write failed: {e}")
+        finally:
+            with self._snapshot_cond:
+                self._writing = False
+                self._snapshot_cond.notify_all()
+    
+    def _write_checkpoint(self, filepath: Path, payload: bytes, seq: int):
+        """
+        Scrittura atomica di uno snapshot.
+        
+        Il payload viene scritto in un unico write() su un file temporaneo e
+        poi rinominato con os.replace, così un crash non lascia mai un file
+        troncato. Uno snapshot più vecchio di quello già su disco viene ignorato.
+        Oltre ZSTD_THRESHOLD il payload viene compresso (nel thread writer)
+        e salvato con suffisso .zst; la variante non più valida viene rimossa.
+        """
+        with self._write_lock:
+            if seq <= self._written_seq:
+                return
+            if ZSTD_AVAILABLE and len(payload) > ZSTD_THRESHOLD:
+                stale = filepath
+                filepath = filepath.with_name(filepath.name + _ZST)
+                payload = _zctx.compress(payload)
+            else:
+                stale = filepath.with_name(filepath.name + _ZST)
+            self._ensure_dir()
+            tmp_path = filepath.with_name(filepath.name + '.tmp')
+            with open(tmp_path, 'wb') as f:
+                f.write(payload)
+            os.replace(tmp_path, filepath)
+            if filepath != self._last_written:
+                # Primo snapshot o cambio di formato: evita che load_mission
+                # trovi una variante vecchia
+                stale.unlink(missing_ok=True)
+                self._last_written = filepath
+            self._written_seq = seq
+    
+    def _ensure_dir(self):
+        """Crea persistence_dir una sola volta per processo"""
+        if self.persistence_dir not in GoalTracker._ensured:
+            self.persistence_dir.mkdir(parents=True, exist_ok=True)
+            GoalTracker._ensured.add(self.persistence_dir)
+    
+    def _goal_fragment(self, goal_id: str, goal: Goal) -> bytes:
+        """Frammento serializzato di un goal, ricalcolato solo se modificato"""
+        fragment = self._serialized_cache.get(goal_id)
+        if fragment is None:
+            fragment = _encode_goal_fragment(goal_id, goal.to_dict())
+            self._serialized_cache[goal_id] = fragment
+        return fragment
+    
+    def _touch(self, goal_id: str):
+        """Invalida il frammento serializzato di un goal modificato"""
+        self._serialized_cache.pop(goal_id, None)
+    
+    def export_report(self, filepath: Optional[str] = None) -> Optional[Path]:
+        """
+        Esporta la missione in JSON indentato, leggibile dall'operatore.
+        
+        Args:
+            filepath: Destinazione (default: <mission_id>.report.json)
+            
+        Returns:
+            Path del file scritto, None se nessuna missione attiva
+        """
+        if not self.state:
+            return None
+        
+        if filepath:
+            target = Path(filepath)
+        else:
+            self._ensure_dir()
+            target = self.persistence_dir / f"{self.state.mission_id}.report.json"
+        data = self.state.to_dict()
+        for goal_data in data["goals"].values():
+            goal_data["evidence"] = [_format_evidence(e) for e in goal_data["evidence"]]
+        with open(target, 'w') as f:
+            json.dump(data, f, indent=2, ensure_ascii=False)
+        return target
     
     def load_mission(self, mission_id: str) -> bool:
         """Carica una missione salvata"""
-        filepath = self.persistence_dir / f"{mission_id}.json"
-        
-        if not filepath.exists():
+        self.flush()
+        candidates = [s + _ZST for s in _CHECKPOINT_SUFFIXES] if ZSTD_AVAILABLE else []
+        for suffix in candidates + list(_CHECKPOINT_SUFFIXES):
+            filepath = self.persistence_dir / f"{mission_id}{suffix}"
+            if filepath.exists():
+                break
+        else:
             return False
         
-        with open(filepath, 'r') as f:
-            data = json.load(f)
+        with open(filepath, 'rb') as f:
+            data = _decode_checkpoint(f.read(), suffix)
+        
+        self._serialized_cache.clear()
+        self._mutation_seq += 1
         
         self.state = MissionState(
             mission_id=data["mission_id"],
             primary_goal=data["primary_goal"],
             start_time=data["start_time"],
             current_focus=data.get("current_focus"),
-            blocked_paths=data.get("blocked_paths", [])
+            blocked_paths=deque(data.get("blocked_paths", []), maxlen=BLOCKED_PATHS_MAXLEN)
         )
         
         for goal_id, goal_data in data.get("goals", {}).items():
-            self.state.goals[goal_id] = Goal(
+            self.state.add_goal(Goal(
                 id=goal_data["id"],
                 name=goal_data["name"],
                 description=goal_data["description"],
                 status=GoalStatus(goal_data["status"]),
                 priority=GoalPriority(goal_data["priority"]),
                 parent_id=goal_data.get("parent_id"),
-                evidence=goal_data.get("evidence", []),
+                evidence=_load_evidence(goal_data.get("evidence", [])),
                 attempts=goal_data.get("attempts", 0),
                 created_at=goal_data.get("created_at", ""),
-                completed_at=goal_data.get("completed_at")
-            )
+                completed_at=goal_data.get("completed_at"),
+                category=goal_data.get("category") or _classify_goal(goal_data["name"])
+            ))
         
         logger.info(f"[GoalTracker] Mission loaded: {mission_id}")
         return True
@@ -380,11 +823,51 @@ class GoalTracker:
 # SINGLETON INSTANCE
 # ============================================================================
 
-_tracker_instance: Optional[GoalTracker] = None
+# Tracker vivi da salvare all'uscita (riferimenti deboli: quelli scartati
+# da reset_goal_tracker possono essere raccolti dal GC)
+_TRACKERS: "weakref.WeakSet[GoalTracker]" = weakref.WeakSet()
+
+# Un solo thread writer per tutti i tracker. La coda tiene il tracker solo
+# finché il suo snapshot non è scritto: dopo può essere raccolto dal GC
+_WRITE_QUEUE: "queue.SimpleQueue[GoalTracker]" = queue.SimpleQueue()
+_writer_thread: Optional[threading.Thread] = None
+_writer_lock = threading.Lock()
+
+def _schedule_write(tracker: "GoalTracker"):
+    """Accoda il tracker al writer condiviso, avviandolo alla prima richiesta"""
+    global _writer_thread
+    _WRITE_QUEUE.put(tracker)
+    with _writer_lock:
+        if _writer_thread is None:
+            _writer_thread = threading.Thread(target=_writer_loop, name="goal-writer", daemon=True)
+            _writer_thread.start()
 
+def _writer_loop():
+    """Thread writer: per ogni tracker accodato scrive lo snapshot più recente"""
+    while True:
+        tracker = _WRITE_QUEUE.get()
+        try:
+            tracker._write_pending()
+        except Exception as e:
+            logger.error(f"[GoalTracker] Writer error: {e}")
+        # Nessun riferimento residuo mentre il thread è in attesa sulla coda
+        del tracker
+
+def _flush_all_trackers():
+    """Salva i checkpoint in sospeso di tutti i tracker (registrata con atexit)"""
+    for tracker in list(_TRACKERS):
+        try:
+            tracker.flush()
+        except Exception as e:
+            logger.error(f"[GoalTracker] Flush at exit failed: {e}")
+
+atexit.register(_flush_all_trackers)
+
+@cache
 def get_goal_tracker() -> GoalTracker:
     """Restituisce l'istanza singleton del GoalTracker"""
-    global _tracker_instance
-    if _tracker_instance is None:
-        _tracker_instance = GoalTracker()
-    return _tracker_instance
+    return GoalTracker()
+
+def reset_goal_tracker():
+    """Scarta il singleton (per i test): la prossima get_goal_tracker ne crea uno nuovo"""
+    get_goal_tracker.cache_clear()
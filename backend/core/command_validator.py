@@ -7,33 +7,585 @@ Soluzione: Chiedi all'LLM se il comando è sensato per l'obiettivo.
 """
 import logging
 import json
+import math
+import os
 import re
-from typing import Dict, Optional, Callable
+import sys
+import threading
+from collections import Counter, OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from functools import lru_cache
+from typing import Collection, Dict, List, Optional, Callable, Tuple, Any
 
 logger = logging.getLogger('CMD-VALIDATOR')
 
+# Pool per validazioni/suggerimenti concorrenti (chiamate LLM, I/O bound)
+VALIDATOR_POOL = ThreadPoolExecutor(max_workers=8, thread_name_prefix="validator")
+
+try:
+    import re2
+    RE2_AVAILABLE = True
+except ImportError:
+    RE2_AVAILABLE = False
+
+try:
+    from numba import njit
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
+
+try:
+    import ahocorasick
+    AHOCORASICK_AVAILABLE = True
+except ImportError:
+    AHOCORASICK_AVAILABLE = False
+
+
+def _compile_fast(pattern: str):
+    """
+    Compila con RE2 (DFA, tempo lineare) se disponibile, altrimenti con re.
+    
+    Solo per pattern senza backreference/lookaround; i flag vanno espressi
+    inline (es. '(?i)') perché comuni ai due motori.
+    """
+    if RE2_AVAILABLE:
+        try:
+            return re2.compile(pattern)
+        except Exception as e:
+            logger.debug(f"[VALIDATOR] Pattern non supportato da re2, uso re: {e}")
+    return re.compile(pattern)
+
+
+# Pattern precompilati (usati a ogni validazione)
+_RE_IPV4 = _compile_fast(r'\b(?:\d{1,3}\.){3}\d{1,3}\b')
+_RE_PY_SCRIPT = _compile_fast(r'python3?\s+(\S+\.py)')
+_RE_MD_FENCE = re.compile(r'```(?:bash)?\n?')
+
+# I nomi dei tool sono internati: i lookup con un token a sua volta internato
+# (vedi _first_token) si risolvono per identità, senza confronto di stringhe
+_INTERN = sys.intern
+
+
+def _names(*names: str) -> frozenset:
+    """frozenset di nomi di tool internati"""
+    return frozenset(map(_INTERN, names))
+
+
+# Comandi validi riconosciuti nelle risposte LLM
+_KNOWN_CMDS = tuple(map(_INTERN, (
+    'nmap', 'curl', 'wget', 'nc', 'ncat', 'echo', 'cat', 'grep', 'find', 'ping',
+    'telnet', 'ssh', 'host', 'dig', 'nslookup',
+    'searchsploit', 'python', 'python3',
+    'ffmpeg', 'ffplay', 'vlc', 'cvlc'
+)))
+# "tool " / "tool\t": su una riga già strippata il separatore garantisce
+# anche un secondo token (e non matcha parole più lunghe, es. pythonista)
+_KNOWN_CMD_PREFIXES = tuple(f"{cmd}{sep}" for cmd in _KNOWN_CMDS for sep in (' ', '\t'))
+
+# Placeholder che indicano comando INCOMPLETO (<IP>, <indirizzo>, [ip, ...)
+# in un'unica alternanza: una sola scansione della riga
+_PLACEHOLDER_ANY = _compile_fast(
+    r'(?i)<[^>]+>|\[indirizzo|\[ip|\[porta|IP_CAMERA|TARGET_IP|HOST_IP'
+)
+
+# Fallback "tool arg" per i primi 10 comandi noti, fusi in un'unica alternanza:
+# una sola scansione del testo, vince il match più a sinistra
+_FALLBACK_CMD_RE = _compile_fast(
+    r'\b(?:' + '|'.join(re.escape(cmd) for cmd in _KNOWN_CMDS[:10]) + r')\s+[^\n<\[]+?(?:\n|$)'
+)
+
+
+def _first_token(command: str) -> str:
+    """Primo token (internato) del comando, senza splittare tutta la stringa"""
+    tokens = command.split(None, 1)
+    return _INTERN(tokens[0]) if tokens else ""
+
+
+@lru_cache(maxsize=1024)
+def _script_exists(path: str) -> bool:
+    """
+    os.path.exists memoizzato: i piani ripropongono spesso gli stessi script.
+    
+    Usare _script_exists.cache_clear() se gli script vengono creati a runtime.
+    """
+    return os.path.exists(path)
+
+
+def _unique_ips(text: str, limit: int) -> List[str]:
+    """
+    Primi `limit` IP distinti nel testo, in ordine di apparizione.
+    
+    L'ordine stabile rende il prompt deterministico (prefix cache dell'LLM)
+    e la scansione si ferma appena trovati abbastanza IP.
+    """
+    seen: Dict[str, None] = {}
+    for match in _RE_IPV4.finditer(text):
+        seen[match.group(0)] = None
+        if len(seen) >= limit:
+            break
+    return list(seen)
+
+
+def _tool_counts(commands: Collection[str]) -> Counter:
+    """Quante volte è stato usato ogni tool (primo token) nei comandi dati"""
+    return Counter(_first_token(c) for c in commands)
+
+
+class CommandHistory:
+    """
+    Indice incrementale dello storico comandi.
+    
+    Mantiene un set (duplicati in O(1)) e un Counter dei tool (primo token).
+    sync() riceve lo storico completo: se estende quello già indicizzato
+    vengono indicizzati solo i comandi nuovi, altrimenti l'indice è ricostruito.
+    """
+    
+    def __init__(self):
+        self._commands: List[str] = []
+        self.commands: set = set()
+        self.tool_counts: Counter = Counter()
+        self._lock = threading.Lock()
+    
+    def sync(self, commands: List[str]) -> Tuple[set, Counter]:
+        """Allinea l'indice a commands e ritorna (set, conteggio tool), senza copie"""
+        if not isinstance(commands, list):
+            commands = list(commands)
+        with self._lock:
+            indexed = len(self._commands)
+            # Confronto del prefisso in C (identità degli oggetti str): molto più
+            # economico che ri-hashare e splittare tutto lo storico
+            if len(commands) >= indexed and commands[:indexed] == self._commands:
+                new = commands[indexed:]
+            else:
+                self._commands = []
+                self.commands = set()
+                self.tool_counts = Counter()
+                new = commands
+            if new:
+                self._commands.extend(new)
+                self.commands.update(new)
+                self.tool_counts.update(_first_token(c) for c in new)
+            return self.commands, self.tool_counts
+
+
+class KeywordMatcher:
+    """
+    Riconosce in una sola passata tutte le keyword presenti in un testo.
+    
+    Ogni keyword (sottostringa) porta un bit di categoria; mask() ritorna
+    l'OR dei bit delle keyword trovate. Con pyahocorasick usa un automa
+    Aho-Corasick (O(n) sul testo, indipendente dal numero di keyword),
+    altrimenti ripiega sui test di sottostringa.
+    """
+    
+    def __init__(self, keywords_by_bit: Dict[int, Tuple[str, ...]]):
+        self._bits_by_kw: Dict[str, int] = {}
+        for bit, keywords in keywords_by_bit.items():
+            for kw in keywords:
+                self._bits_by_kw[kw] = self._bits_by_kw.get(kw, 0) | bit
+        self._automaton = None
+        if AHOCORASICK_AVAILABLE and self._bits_by_kw:
+            self._automaton = ahocorasick.Automaton()
+            for kw, bits in self._bits_by_kw.items():
+                self._automaton.add_word(kw, bits)
+            self._automaton.make_automaton()
+    
+    def mask(self, text: str) -> int:
+        """OR dei bit di tutte le keyword contenute in text"""
+        found = 0
+        if self._automaton is not None:
+            for _, bits in self._automaton.iter(text):
+                found |= bits
+        else:
+            for kw, bits in self._bits_by_kw.items():
+                if kw in text:
+                    found |= bits
+        return found
+
+
+# Bit delle categorie di step
+STEP_INTENT_SCAN = 1 << 0
+STEP_INTENT_HTTP = 1 << 1
+STEP_INTENT_EXPLOIT_DB = 1 << 2
+STEP_INTENT_CONNECTION = 1 << 3
+STEP_LOCAL_SETUP = 1 << 4     # setup locale legittimo (listener, etc)
+STEP_EXPLOIT = 1 << 5         # ricerca exploit (NON è scansione!)
+STEP_SCAN = 1 << 6
+STEP_DATA = 1 << 7
+STEP_EXPLOIT_GOAL = 1 << 8    # step che richiede exploitation vera
+STEP_ANALYSIS = 1 << 9
+
+# Bit delle categorie di tool (primo token del comando)
+TOOL_SCAN = 1 << 0
+TOOL_EXPLOIT = 1 << 1
+TOOL_DATA = 1 << 2
+TOOL_SCAN_ONLY = 1 << 3       # tool che fanno solo scan, niente exploitation
+TOOL_EXPLOIT_SCRIPT = 1 << 4  # nmap --script con script di exploit
+
+_TOOL_BITS: Dict[str, int] = {}
+for _bit, _tools in (
+    (TOOL_SCAN, ('nmap', 'masscan', 'ping', 'arping')),
+    (TOOL_EXPLOIT, ('searchsploit', 'msfconsole')),
+    (TOOL_DATA, ('curl', 'wget', 'python')),
+    (TOOL_SCAN_ONLY, ('nmap', 'masscan', 'ping', 'traceroute')),
+):
+    for _tool in _tools:
+        _TOOL_BITS[_INTERN(_tool)] = _TOOL_BITS.get(_tool, 0) | _bit
+
+# Mapping intento → tool ACCETTABILI (non obbligatori)
+# Permette alternative semanticamente valide. Tabelle parallele (una colonna
+# per campo), immutabili e costruite una volta
+_INTENTS = ('scan/discovery', 'http_request', 'exploit_db', 'connection')
+_INTENT_BITS = (STEP_INTENT_SCAN, STEP_INTENT_HTTP, STEP_INTENT_EXPLOIT_DB, STEP_INTENT_CONNECTION)
+_INTENT_KWS = (
+    ('scansiona', 'identifica servizi', 'enumera porte', 'trova dispositivi'),
+    ('richiesta http', 'endpoint', 'api call', 'get data', 'post data'),
+    ('cerca exploit', 'vulnerability database', 'exploit-db'),
+    ('connessione tcp', 'porta udp', 'listener', 'netcat'),
+)
+_INTENT_TOOLS = (
+    _names('nmap', 'masscan', 'nc', 'ping'),
+    _names('curl', 'wget', 'nc', 'python'),
+    _names('searchsploit', 'curl'),
+    _names('nc', 'ncat', 'socat', 'telnet'),
+)
+
+# Keyword dello step, riconosciute tutte con una sola passata
+_STEP_MATCHER = KeywordMatcher({
+    **dict(zip(_INTENT_BITS, _INTENT_KWS)),
+    STEP_LOCAL_SETUP: ('listener', 'ricevi', 'prepara locale', 'setup attaccante'),
+    STEP_EXPLOIT: ('cerca exploit', 'analizza vulnerabilità', 'vulnerabilità', 'cve',
+                   'exploit', 'searchsploit', 'metasploit'),
+    STEP_SCAN: ('scansiona', 'enumera porte', 'identifica servizi', 'trova dispositivi'),
+    STEP_DATA: ('verifica servizi', 'raccogliere info', 'dati', 'informazioni'),
+    STEP_EXPLOIT_GOAL: ('sfruttare', 'payload', 'rce', 'shell remota', 'backdoor'),
+    STEP_ANALYSIS: ('analizza', 'verifica'),
+})
+
+# Esiti della tabella di mismatch step/tool
+MISMATCH_NONE = 0
+MISMATCH_SCAN = 1       # step di scansione, tool di exploit
+MISMATCH_DATA = 2       # step di raccolta dati, tool di exploit
+MISMATCH_EXPLOIT = 3    # step di exploitation, tool di solo scan
+
+_MISMATCH_VERDICTS = {
+    MISMATCH_SCAN: (
+        "Step di scansione/discovery ma comando usa {tool}",
+        "Per scansioni usa: nmap, nc, ping"
+    ),
+    MISMATCH_DATA: (
+        "Step richiede raccolta dati ma comando usa {tool}",
+        "Per raccogliere dati usa: curl, wget, nc"
+    ),
+    MISMATCH_EXPLOIT: (
+        "Step richiede exploitation ma comando fa solo scan ({tool})",
+        "Usa tool di exploitation: curl con payload, nc, python, o nmap --script exploit"
+    ),
+}
+
+
+def _mismatch_code(step_bits: int, tool_bits: int) -> int:
+    """
+    Tabella di decisione step/tool, solo operazioni sui bit.
+    
+    Blocca solo i mismatch CHIARI: tool di exploit in step di scansione o
+    raccolta dati (ma non se lo step è ricerca exploit), e tool di solo scan
+    in step di exploitation (salvo nmap --script exploit o step di analisi).
+    """
+    if tool_bits & TOOL_EXPLOIT and not step_bits & STEP_EXPLOIT:
+        if step_bits & STEP_SCAN:
+            return MISMATCH_SCAN
+        if step_bits & STEP_DATA:
+            return MISMATCH_DATA
+    if (step_bits & STEP_EXPLOIT_GOAL and tool_bits & TOOL_SCAN_ONLY
+            and not tool_bits & TOOL_EXPLOIT_SCRIPT and not step_bits & STEP_ANALYSIS):
+        return MISMATCH_EXPLOIT
+    return MISMATCH_NONE
+
+
+# Versione nativa opzionale, per la validazione batch di piani lunghi: una
+# singola chiamata costa più del Python puro, conviene solo a volumi alti
+if NUMBA_AVAILABLE and os.getenv('KALIAI_VALIDATOR_JIT') == '1':
+    try:
+        _native = njit(cache=True, boundscheck=False)(_mismatch_code)
+        _native(0, 0)  # compila subito, non alla prima validazione
+        _mismatch_code = _native
+    except Exception as e:
+        logger.warning(f"[VALIDATOR] JIT numba non disponibile, uso Python: {e}")
+
+
+# Marker di script di exploit "inventati" dall'LLM
+_PY_EXPLOIT_MARKERS = frozenset(('exploit_', '_exploit.py', '_rce.py'))
+# Comandi che modificano il sistema locale
+_LOCAL_MOD = frozenset(('systemctl', 'crontab -e', 'service ', 'useradd', 'groupadd'))
+
+CMD_PYTHON = 1 << 0
+CMD_EXPLOIT_SCRIPT = 1 << 1
+CMD_LOCAL_MOD = 1 << 2
+
+# Keyword del comando (già in minuscolo), riconosciute con una sola passata
+_COMMAND_MATCHER = KeywordMatcher({
+    CMD_PYTHON: ('python',),
+    CMD_EXPLOIT_SCRIPT: tuple(_PY_EXPLOIT_MARKERS),
+    CMD_LOCAL_MOD: tuple(_LOCAL_MOD),
+})
+
+# Script nmap che fanno exploitation
+_EXPLOIT_SCRIPT_MARKERS = frozenset(('vuln', 'exploit', 'shellshock'))
+
+# Reality check: obiettivi impossibili noti (il primo match dà il motivo)
+_KNOWN_IMPOSSIBLE_GOALS = (
+    "shell su google home",
+    "backdoor persistente su iot",
+    "reverse shell su chromecast",
+    "shell bash su dispositivi cast"
+)
+_GOOGLE_CAST_DEVICES = frozenset(('google home', 'chromecast', 'nest mini', 'google mini'))
+_SHELL_VERBS = frozenset(('shell', 'bash', 'backdoor', 'ssh', 'reverse shell', 'netcat shell', 'shell remota'))
+_IOT_TOKENS = frozenset(('iot', 'smart'))
+_PERSISTENCE_VERBS = frozenset(('reverse shell', 'backdoor'))
+
+REALITY_CAST_DEVICE = 1 << 0
+REALITY_SHELL_VERB = 1 << 1
+REALITY_IOT = 1 << 2
+REALITY_PERSISTENCE = 1 << 3
+_REALITY_GOAL_SHIFT = 4  # un bit per obiettivo impossibile, nell'ordine della tupla
+_REALITY_GOALS_MASK = ((1 << len(_KNOWN_IMPOSSIBLE_GOALS)) - 1) << _REALITY_GOAL_SHIFT
+
+# Tutte le condizioni del reality check in una sola passata
+_REALITY_MATCHER = KeywordMatcher({
+    **{1 << (_REALITY_GOAL_SHIFT + i): (goal,) for i, goal in enumerate(_KNOWN_IMPOSSIBLE_GOALS)},
+    REALITY_CAST_DEVICE: tuple(_GOOGLE_CAST_DEVICES),
+    REALITY_SHELL_VERB: tuple(_SHELL_VERBS),
+    REALITY_IOT: tuple(_IOT_TOKENS),
+    REALITY_PERSISTENCE: tuple(_PERSISTENCE_VERBS),
+})
+
+# Tool obbligatorio dedotto dallo step (in ordine di priorità: bit più basso vince)
+_PRIORITY_KEYWORDS = {
+    'adb': ('connessione adb', 'android debug bridge', 'adb connect', 'tentare connessione adb',
+            'tenta connessione adb', 'connessione adb su porta', 'comandi adb', 'enumerazione dati'),
+    'nmap': ('scansione nmap', 'scansiona con nmap', 'esegui scansione nmap'),
+    'curl': ('interroga servizi web', 'testare servizi web', 'verifica servizi', 'identifica interfacce')
+}
+_PRIORITY_TOOLS = tuple(map(_INTERN, _PRIORITY_KEYWORDS))
+_PRIORITY_MATCHER = KeywordMatcher({
+    1 << i: keywords for i, keywords in enumerate(_PRIORITY_KEYWORDS.values())
+})
+
+
+class SemanticCache:
+    """
+    Cache dei verdetti per coppie (step, comando).
+    
+    Lookup in due livelli: chiave lessicale esatta (step normalizzato), poi
+    similarità coseno sugli embedding dello step, se il modello è disponibile.
+    Così parafrasi dello stesso step ("shell su Google Home" / "reverse shell
+    su dispositivo cast Google") riusano il verdetto senza richiamare l'LLM.
+    
+    Le entry sono raggruppate per (tool, IP del comando): il match semantico
+    vale solo a parità di tool e target, mai tra comandi diversi.
+    """
+    
+    def __init__(self, threshold: float = 0.92, max_entries: int = 512, semantic: bool = True):
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.semantic = semantic
+        self.hits = 0
+        self.misses = 0
+        self._exact: "OrderedDict[Tuple, Any]" = OrderedDict()
+        self._vectors: Dict[Tuple, List[Tuple[List[float], Tuple]]] = {}
+        self._embedder = None
+        self._last_embedding: Tuple[Optional[str], Optional[List[float]]] = (None, None)
+        self._lock = threading.Lock()
+    
+    @staticmethod
+    def _gate(command: str) -> Tuple[str, frozenset]:
+        """Parte lessicale della chiave: primo token + IP presenti nel comando"""
+        tokens = command.split(None, 1)
+        return (tokens[0] if tokens else "", frozenset(_RE_IPV4.findall(command)))
+    
+    @staticmethod
+    def _normalize(step_description: str) -> str:
+        return " ".join(step_description.lower().split())
+    
+    def _embed(self, text: str) -> Optional[List[float]]:
+        """Embedding normalizzato dello step, None se il modello non è disponibile"""
+        if not self.semantic:
+            return None
+        if self._embedder is None:
+            try:
+                from knowledge.embedding_manager import EmbeddingManager
+                self._embedder = EmbeddingManager()
+                if self._embedder._model is None:
+                    raise RuntimeError("modello embeddings non disponibile")
+            except Exception as e:
+                logger.debug(f"[VALIDATOR] Cache semantica disattivata: {e}")
+                self.semantic = False
+                return None
+        # get() seguito da put() sullo stesso step: un solo encode
+        if self._last_embedding[0] == text:
+            return self._last_embedding[1]
+        vec = self._embedder.encode([text])[0]
+        self._last_embedding = (text, vec)
+        return vec
+    
+    def get(self, step_description: str, command: str) -> Optional[Any]:
+        """Ritorna il valore in cache per (step, comando) o None"""
+        gate = self._gate(command)
+        step_norm = self._normalize(step_description)
+        key = (gate, step_norm, command)
+        with self._lock:
+            if key in self._exact:
+                self._exact.move_to_end(key)
+                self.hits += 1
+                return self._exact[key]
+            candidates = list(self._vectors.get(gate, ()))
+        
+        if candidates:
+            vec = self._embed(step_norm)
+            if vec is not None:
+                best_key, best_score = None, self.threshold
+                for other, other_key in candidates:
+                    score = math.fsum(a * b for a, b in zip(vec, other))
+                    if score >= best_score:
+                        best_key, best_score = other_key, score
+                with self._lock:
+                    if best_key in self._exact:
+                        self.hits += 1
+                        return self._exact[best_key]
+        
+        self.misses += 1
+        return None
+    
+    def put(self, step_description: str, command: str, value: Any):
+        """Salva il valore per (step, comando)"""
+        gate = self._gate(command)
+        step_norm = self._normalize(step_description)
+        key = (gate, step_norm, command)
+        vec = self._embed(step_norm)
+        with self._lock:
+            self._exact[key] = value
+            self._exact.move_to_end(key)
+            if vec is not None:
+                self._vectors.setdefault(gate, []).append((vec, key))
+            while len(self._exact) > self.max_entries:
+                old_key, _ = self._exact.popitem(last=False)
+                bucket = self._vectors.get(old_key[0])
+                if bucket:
+                    bucket[:] = [entry for entry in bucket if entry[1] != old_key]
+
+# Intento dello step → tool da suggerire all'LLM (in ordine di priorità)
+_SUGGEST_TABLE = (
+    ('rtsp', ('rtsp', 'stream', 'video', 'ffmpeg', 'vlc'),
+     "Usa: ffplay, vlc, o ffmpeg per stream video"),
+    ('http', ('http', 'api', 'endpoint', 'web', 'onvif', 'curl'),
+     "Usa: curl con argomenti appropriati (es. curl -v http://IP:PORT/path)"),
+    ('dns', ('nslookup', 'dns', 'hostname', 'reverse'),
+     "Usa: host, dig, o nslookup per DNS"),
+    ('connection', ('porta', 'connection', 'tcp', 'udp'),
+     "Usa: nc (netcat) per connessioni dirette"),
+    ('scan', ('scan', 'nmap', 'porte'),
+     "Usa: nmap con porte specifiche"),
+    ('exploit', ('exploit', 'cve', 'vulnerability'),
+     "Usa: searchsploit per cercare exploit"),
+)
+_SUGGEST_MATCHER = KeywordMatcher({
+    1 << i: keywords for i, (_, keywords, _) in enumerate(_SUGGEST_TABLE)
+})
+
+
+def _suggest_tool_hint(step_lower: str) -> str:
+    """Suggerimento tool per lo step: vince la prima riga della tabella che matcha"""
+    bits = _SUGGEST_MATCHER.mask(step_lower)
+    if not bits:
+        return ""
+    return _SUGGEST_TABLE[(bits & -bits).bit_length() - 1][2]
+
+
+# Prompt per il comando alternativo: scheletro statico costruito una volta,
+# solo le parti dinamiche vengono inserite con format_map
+_SUGGEST_PROMPT_TMPL = """══════════════════════════════════════════════════
+⚠️ COMANDO RIGETTATO - GENERA ALTERNATIVA VALIDA
+══════════════════════════════════════════════════
+
+OBIETTIVO DELLO STEP:
+{step_description}
+
+COMANDO RIGETTATO:
+{failed_command}
+
+PROBLEMA: Comando non appropriato per lo step.
+{ip_hint}
+{mandatory_tool_hint}
+TOOL SUGGERITO:
+{tool_suggestion}
+{previous_hint}
+══════════════════════════════════════════════════
+REGOLE INVIOLABILI PER IL NUOVO COMANDO:
+══════════════════════════════════════════════════
+1. Genera ESATTAMENTE UN comando bash valido ed eseguibile
+2. USA SOLO IP/dati reali dal contesto sopra
+3. NO placeholder come <IP>, [indirizzo], IP_CAMERA
+4. NO frasi italiane (es. 'Analizza', 'Verifica')
+5. NO comandi già rigettati o simili a quello sopra
+6. NO comandi già eseguiti (vedi lista sopra)
+7. Comando MAX 200 caratteri
+8. Deve essere DIVERSO dal comando rigettato
+9. Formato: tool argomento1 argomento2 ...
+
+ESEMPI VALIDI:
+- curl -v http://192.168.1.6:80/onvif/device_service
+- nmap -p 554,8554 -sV 192.168.1.6
+- host 192.168.1.6
+- nc -zv 192.168.1.6 554
+
+GENERA SOLO IL COMANDO (NO SPIEGAZIONI):"""
+
+
+@lru_cache(maxsize=32)
+def _mandatory_tool_hint(mandatory_tool: str) -> str:
+    """Blocco del prompt che impone il tool obbligatorio"""
+    return (
+        f"\n🚨 TOOL OBBLIGATORIO: {mandatory_tool.upper()}\n"
+        f"⚠️ DEVI usare SOLO '{mandatory_tool}' - NON 'nc', 'curl', 'host' o altri tool!\n"
+        f"ESEMPIO CORRETTO: {mandatory_tool} <argomenti>\n"
+        "ESEMPIO SBAGLIATO: nc <argomenti> ❌\n"
+        "ESEMPIO SBAGLIATO: curl <argomenti> ❌\n"
+    )
+
+
 class CommandValidator:
     """Valida che il comando sia appropriato per lo step"""
     
+    # Obiettivi impossibili noti (tupla: il primo match dà il motivo, in ordine stabile)
+    KNOWN_IMPOSSIBLE_GOALS = _KNOWN_IMPOSSIBLE_GOALS
+    
     def __init__(self, llm_call_fn: Callable):
         self.llm_call = llm_call_fn
-        self.command_history = []  # Traccia comandi già usati
-        self.known_impossible_goals = [
-            "shell su google home",
-            "backdoor persistente su iot",
-            "reverse shell su chromecast",
-            "shell bash su dispositivi cast"
-        ]
+        self.command_history = CommandHistory()  # Traccia comandi già usati
+        # Verdetti di realtà: check locale, basta il livello lessicale
+        self._reality_cache = SemanticCache(semantic=False)
+        # Suggerimenti LLM: il costo dominante, vale la pena il match semantico
+        self._suggest_cache = SemanticCache()
     
     def is_command_appropriate(
         self, 
         command: str, 
         step_description: str,
-        previous_commands: list = None
+        previous_commands: Collection[str] = None,
+        previous_tool_counts: Counter = None
     ) -> Dict:
         """
         Valida se il comando è appropriato per lo step.
         
+        Args:
+            command: Comando da validare
+            step_description: Descrizione dello step
+            previous_commands: Comandi già eseguiti (meglio un set/frozenset)
+            previous_tool_counts: Conteggio dei tool già usati; se manca
+                viene calcolato da previous_commands
+        
         Returns:
             {
                 "appropriate": bool,
@@ -42,30 +594,34 @@ class CommandValidator:
             }
         """
         
+        # Derivati calcolati una volta sola
+        cmd_bits = _COMMAND_MATCHER.mask(command.lower())
+        cmd_first = _first_token(command)
+        step_lower = step_description.lower()
+        
         # === REALITY CHECKS ===
         
         # 0. Comandi irrealistici/inesistenti
-        cmd_lower = command.lower()
         
         # Script Python che non esistono
-        if 'python' in cmd_lower and any(pattern in cmd_lower for pattern in ['exploit_', '_exploit.py', '_rce.py']):
+        if cmd_bits & CMD_PYTHON and cmd_bits & CMD_EXPLOIT_SCRIPT:
             # Verifica se file esiste
-            import os
-            script_match = re.search(r'python3?\s+(\S+\.py)', command)
+            script_match = _RE_PY_SCRIPT.search(command)
             if script_match:
                 script_path = script_match.group(1)
-                if not os.path.exists(script_path) and not script_path.startswith('/'):
+                if not script_path.startswith('/') and not _script_exists(script_path):
                     return {
                         "appropriate": False,
                         "reason": f"Script {script_path} non esiste sul sistema",
                         "suggestion": "Usa comandi nativi (curl, nc, nmap --script) invece di script inesistenti"
                     }
         
+        step_bits = _STEP_MATCHER.mask(step_lower)
+        
         # Comandi che modificano sistema locale invece che target remoto
-        local_modifications = ['systemctl', 'crontab -e', 'service ', 'useradd', 'groupadd']
-        if any(mod in cmd_lower for mod in local_modifications):
+        if cmd_bits & CMD_LOCAL_MOD:
             # OK solo se chiaramente per setup locale (listener, etc)
-            if not any(safe in step_description.lower() for safe in ['listener', 'ricevi', 'prepara locale', 'setup attaccante']):
+            if not step_bits & STEP_LOCAL_SETUP:
                 return {
                     "appropriate": False,
                     "reason": "Comando modifica sistema locale invece di attaccare target remoto",
@@ -82,121 +638,52 @@ class CommandValidator:
                 "suggestion": "Usa approccio diverso o tool alternativo"
             }
         
-        # 2. Validazione tool semantica (più permissiva)
-        step_lower = step_description.lower()
-        cmd_first = command.split()[0] if command.split() else ""
-        
-        # Mapping intento → tool ACCETTABILI (non obbligatori)
-        # Permette alternative semanticamente valide
-        acceptable_tools = {
-            'scan/discovery': {
-                'keywords': ['scansiona', 'identifica servizi', 'enumera porte', 'trova dispositivi'],
-                'tools': ['nmap', 'masscan', 'nc', 'ping']
-            },
-            'http_request': {
-                'keywords': ['richiesta http', 'endpoint', 'api call', 'get data', 'post data'],
-                'tools': ['curl', 'wget', 'nc', 'python']
-            },
-            'exploit_db': {
-                'keywords': ['cerca exploit', 'vulnerability database', 'exploit-db'],
-                'tools': ['searchsploit', 'curl']
-            },
-            'connection': {
-                'keywords': ['connessione tcp', 'porta udp', 'listener', 'netcat'],
-                'tools': ['nc', 'ncat', 'socat', 'telnet']
-            }
-        }
+        # 2. Se è lo stesso tool ripetuto 3+ volte (MA: se comando è diverso, permetti)
+        if previous_commands:
+            # Se è lo stesso tool ma comando diverso, potrebbe essere necessario (es. adb connect a IP diversi)
+            # Permetti se il comando è diverso
+            if previous_tool_counts is None:
+                previous_tool_counts = _tool_counts(previous_commands)
+            same_tool_count = previous_tool_counts[cmd_first]
+            if same_tool_count >= 2:  # 3° volta con stesso tool
+                # Solo log, non bloccare
+                logger.debug(f"[VALIDATOR] Tool '{cmd_first}' usato {same_tool_count + 1} volte, ma comando è diverso - permesso")
         
+        # 3. Validazione tool semantica (più permissiva)
         # Verifica solo se c'è un FORTE mismatch semantico
         # (es. step dice "connessione TCP" ma comando usa "searchsploit")
         step_intent = None
-        for intent, config in acceptable_tools.items():
-            if any(kw in step_lower for kw in config['keywords']):
+        for intent, bit, tools in zip(_INTENTS, _INTENT_BITS, _INTENT_TOOLS):
+            if step_bits & bit:
                 step_intent = intent
                 # Se comando usa tool accettabile per questo intento, OK
-                if cmd_first in config['tools'] or any(tool in command for tool in config['tools']):
+                if cmd_first in tools or any(tool in command for tool in tools):
                     break  # Tool appropriato trovato
-                # Se non usa nessun tool dell'intent, potrebbe essere problematico
-                # Ma solo se usa tool COMPLETAMENTE sbagliato
         else:
             # Nessun intent specifico o tool appropriato già trovato
             step_intent = None
         
-        # Verifica mismatch GRAVI (es. searchsploit per fare scansione rete)
-        scan_tools = ['nmap', 'masscan', 'ping', 'arping']
-        exploit_tools = ['searchsploit', 'msfconsole']
-        data_tools = ['curl', 'wget', 'python']
-        
-        # Riconosci step di ricerca exploit (NON è scansione!)
-        is_exploit_step = any(kw in step_lower for kw in [
-            'cerca exploit', 'analizza vulnerabilità', 'vulnerabilità', 'cve', 
-            'exploit', 'searchsploit', 'metasploit'
-        ])
-        
-        is_scan_step = any(kw in step_lower for kw in ['scansiona', 'enumera porte', 'identifica servizi', 'trova dispositivi'])
-        is_data_step = any(kw in step_lower for kw in ['verifica servizi', 'raccogliere info', 'dati', 'informazioni'])
-        
-        # Se step è ricerca exploit, searchsploit è CORRETTO
-        if is_exploit_step and cmd_first in exploit_tools:
-            # searchsploit è appropriato per step di ricerca exploit
-            pass  # Non bloccare
-        # SOLO blocca se c'è CHIARO mismatch (scansione rete con exploit tool)
-        elif is_scan_step and cmd_first in exploit_tools:
-            return {
-                "appropriate": False,
-                "reason": f"Step di scansione/discovery ma comando usa {cmd_first}",
-                "suggestion": f"Per scansioni usa: nmap, nc, ping"
-            }
-        elif is_data_step and cmd_first in exploit_tools and not is_exploit_step:
+        # 4. Mismatch GRAVI step/tool (es. searchsploit per fare scansione rete)
+        tool_bits = _TOOL_BITS.get(cmd_first, 0)
+        # Permetti nmap con --script (può eseguire exploit)
+        if '--script' in command and any(ex in command for ex in _EXPLOIT_SCRIPT_MARKERS):
+            tool_bits |= TOOL_EXPLOIT_SCRIPT
+        
+        mismatch = _mismatch_code(step_bits, tool_bits)
+        if mismatch:
+            reason, suggestion = _MISMATCH_VERDICTS[mismatch]
             return {
                 "appropriate": False,
-                "reason": f"Step richiede raccolta dati ma comando usa {cmd_first}",
-                "suggestion": f"Per raccogliere dati usa: curl, wget, nc"
+                "reason": reason.format(tool=cmd_first),
+                "suggestion": suggestion
             }
         
-        # 3. Se è lo stesso tool ripetuto 3+ volte (MA: se comando è diverso, permetti)
-        cmd_tool = command.split()[0] if command.split() else ""
-        if previous_commands:
-            # ECCEZIONE: Se il comando è IDENTICO a uno già eseguito, rigetta
-            if command in previous_commands:
-                return {
-                    "appropriate": False,
-                    "reason": "Comando già eseguito in precedenza",
-                    "suggestion": f"Genera comando diverso (varia argomenti o IP)"
-                }
-            # Se è lo stesso tool ma comando diverso, potrebbe essere necessario (es. adb connect a IP diversi)
-            # Permetti se il comando è diverso
-            same_tool_count = sum(1 for c in previous_commands if c.split()[0] == cmd_tool)
-            if same_tool_count >= 2:  # 3° volta con stesso tool
-                # Se comando è diverso, permetti (es. adb connect IP1, adb connect IP2)
-                # Solo log warning, non bloccare
-                logger.debug(f"[VALIDATOR] Tool '{cmd_tool}' usato {same_tool_count + 1} volte, ma comando è diverso - permesso")
-        
-        # 4. Validazione mismatch exploit vs scan (più permissiva)
-        exploit_keywords = ['sfruttare', 'payload', 'rce', 'shell remota', 'backdoor']
-        
-        step_is_exploit = any(kw in step_lower for kw in exploit_keywords)
-        
-        cmd_is_scan = cmd_first in ['nmap', 'masscan', 'ping', 'traceroute']
-        
-        # Mismatch critico SOLO se step CHIARAMENTE richiede exploit
-        # e comando fa SOLO scan senza nessun script exploit
-        if step_is_exploit and cmd_is_scan:
-            # Permetti nmap con --script (può eseguire exploit)
-            if '--script' in command and any(ex in command for ex in ['vuln', 'exploit', 'shellshock']):
-                pass  # nmap con script exploit è ok
-            elif 'analizza' in step_lower or 'verifica' in step_lower:
-                pass  # Step di analisi può usare scan
-            else:
-                return {
-                    "appropriate": False,
-                    "reason": f"Step richiede exploitation ma comando fa solo scan ({cmd_first})",
-                    "suggestion": "Usa tool di exploitation: curl con payload, nc, python, o nmap --script exploit"
-                }
-        
         # === REALITY CHECK FINALE ===
         # Verifica se obiettivo è realistico con LLM
-        reality_check = self._check_goal_reality(step_description, command)
+        reality_check = self._reality_cache.get(step_description, command)
+        if reality_check is None:
+            reality_check = self._check_goal_reality(step_description, command)
+            self._reality_cache.put(step_description, command, reality_check)
         if not reality_check['realistic']:
             return {
                 "appropriate": False,
@@ -213,37 +700,89 @@ class CommandValidator:
     def _check_goal_reality(self, step_description: str, command: str) -> Dict:
         """Verifica se obiettivo è realistico (es. shell su Google Home = impossibile)"""
         
-        step_lower = step_description.lower()
+        hits = _REALITY_MATCHER.mask(step_description.lower())
+        if not hits:
+            return {"realistic": True}
         
-        # Check obiettivi impossibili noti
-        for impossible in self.known_impossible_goals:
-            if impossible in step_lower:
-                return {
-                    "realistic": False,
-                    "reason": f"Obiettivo impossibile: {impossible}",
-                    "alternative": "Google Home non ha shell. Obiettivo realistico: controllo Cast protocol, info disclosure"
-                }
+        # Check obiettivi impossibili noti (bit più basso = primo della lista)
+        goal_bits = hits & _REALITY_GOALS_MASK
+        if goal_bits:
+            impossible = _KNOWN_IMPOSSIBLE_GOALS[(goal_bits & -goal_bits).bit_length() - 1 - _REALITY_GOAL_SHIFT]
+            return {
+                "realistic": False,
+                "reason": f"Obiettivo impossibile: {impossible}",
+                "alternative": "Google Home non ha shell. Obiettivo realistico: controllo Cast protocol, info disclosure"
+            }
         
         # Google Home specific
-        if any(device in step_lower for device in ['google home', 'chromecast', 'nest mini', 'google mini']):
-            if any(impossible in step_lower for impossible in ['shell', 'bash', 'backdoor', 'ssh', 'reverse shell', 'netcat shell', 'shell remota']):
-                return {
-                    "realistic": False,
-                    "reason": "Dispositivi Google Cast/Home NON hanno shell accessibile - sono Android TV limitati",
-                    "alternative": "Obiettivo realistico: Interroga API Cast su porta 8008 con curl http://IP:8008/setup/eureka_info"
-                }
+        if hits & REALITY_CAST_DEVICE and hits & REALITY_SHELL_VERB:
+            return {
+                "realistic": False,
+                "reason": "Dispositivi Google Cast/Home NON hanno shell accessibile - sono Android TV limitati",
+                "alternative": "Obiettivo realistico: Interroga API Cast su porta 8008 con curl http://IP:8008/setup/eureka_info"
+            }
         
         # IoT devices in generale
-        if 'iot' in step_lower or 'smart' in step_lower:
-            if 'reverse shell' in step_lower or 'backdoor' in step_lower:
-                return {
-                    "realistic": False,
-                    "reason": "Shell persistente su IoT consumer è irrealistico senza exploit 0-day",
-                    "alternative": "Obiettivo realistico: DoS, information disclosure, command injection limitato"
-                }
+        if hits & REALITY_IOT and hits & REALITY_PERSISTENCE:
+            return {
+                "realistic": False,
+                "reason": "Shell persistente su IoT consumer è irrealistico senza exploit 0-day",
+                "alternative": "Obiettivo realistico: DoS, information disclosure, command injection limitato"
+            }
         
         return {"realistic": True}
     
+    def batch_validate(self, items: List[Tuple[str, str, Collection[str]]]) -> List[Dict]:
+        """
+        Valida più comandi in parallelo sul pool del validator.
+        
+        Args:
+            items: Tuple (command, step_description, previous_commands)
+            
+        Returns:
+            Verdetti di is_command_appropriate, nello stesso ordine di items
+        """
+        return list(VALIDATOR_POOL.map(lambda item: self.is_command_appropriate(*item), items))
+    
+    def _cached_suggestion(
+        self,
+        step_description: str,
+        failed_command: str,
+        previous_commands: list = None,
+        mandatory_tool: str = None
+    ) -> Optional[str]:
+        """Suggerimento in cache ancora utilizzabile (non già eseguito, tool giusto)"""
+        cached = self._suggest_cache.get(step_description, failed_command)
+        if cached and not (previous_commands and cached in previous_commands):
+            cached_tool = _first_token(cached)
+            if not mandatory_tool or cached_tool.lower() == mandatory_tool.lower():
+                logger.info(f"[VALIDATOR] Suggerito (cache): {cached}")
+                return cached
+        return None
+    
+    def suggest_better_command_async(
+        self,
+        step_description: str,
+        failed_command: str,
+        context: str = "",
+        previous_commands: list = None,
+        mandatory_tool: str = None
+    ) -> "Future[Optional[str]]":
+        """
+        Variante non bloccante di suggest_better_command.
+        
+        Un hit in cache ritorna un Future già completato, senza passare dal pool.
+        """
+        cached = self._cached_suggestion(step_description, failed_command, previous_commands, mandatory_tool)
+        if cached:
+            future: Future = Future()
+            future.set_result(cached)
+            return future
+        return VALIDATOR_POOL.submit(
+            self.suggest_better_command,
+            step_description, failed_command, context, previous_commands, mandatory_tool
+        )
+    
     def suggest_better_command(
         self, 
         step_description: str,
@@ -258,86 +797,40 @@ class CommandValidator:
         Usato quando comando è stato rigettato.
         """
         
+        # Suggerimento già ottenuto per uno step equivalente
+        cached = self._cached_suggestion(step_description, failed_command, previous_commands, mandatory_tool)
+        if cached:
+            return cached
+        
         # Estrai dati dal contesto
-        import re
-        context_ips = re.findall(r'\b(?:\d{1,3}\.){3}\d{1,3}\b', context)
-        unique_ips = list(set(context_ips))[:5]
+        unique_ips = _unique_ips(context, limit=5)
         
         ip_hint = ""
         if unique_ips:
             ip_hint = f"\n🎯 IP DISPONIBILI NEL CONTESTO (USA QUESTI):\n   {', '.join(unique_ips)}\n"
         
         # Analizza lo step per suggerire tool appropriato
-        step_lower = step_description.lower()
-        tool_suggestion = ""
-        
         # PRIORITÀ: Se c'è un tool obbligatorio, USA QUELLO
         if mandatory_tool:
             tool_suggestion = f"DEVI usare SOLO '{mandatory_tool}' - NON altri tool (nc, curl, host, etc)"
-        elif any(kw in step_lower for kw in ['rtsp', 'stream', 'video', 'ffmpeg', 'vlc']):
-            tool_suggestion = "Usa: ffplay, vlc, o ffmpeg per stream video"
-        elif any(kw in step_lower for kw in ['http', 'api', 'endpoint', 'web', 'onvif', 'curl']):
-            tool_suggestion = "Usa: curl con argomenti appropriati (es. curl -v http://IP:PORT/path)"
-        elif any(kw in step_lower for kw in ['nslookup', 'dns', 'hostname', 'reverse']):
-            tool_suggestion = "Usa: host, dig, o nslookup per DNS"
-        elif any(kw in step_lower for kw in ['porta', 'connection', 'tcp', 'udp']) and not mandatory_tool:
-            tool_suggestion = "Usa: nc (netcat) per connessioni dirette"
-        elif any(kw in step_lower for kw in ['scan', 'nmap', 'porte']):
-            tool_suggestion = "Usa: nmap con porte specifiche"
-        elif any(kw in step_lower for kw in ['exploit', 'cve', 'vulnerability']):
-            tool_suggestion = "Usa: searchsploit per cercare exploit"
+        else:
+            tool_suggestion = _suggest_tool_hint(step_description.lower())
         
         # Lista comandi già eseguiti da evitare
         previous_hint = ""
         if previous_commands:
-            previous_hint = "\n🚫 COMANDI GIÀ ESEGUITI (NON RIPETERE):\n"
-            for cmd in previous_commands[-5:]:  # Ultimi 5
-                previous_hint += f"   ✗ {cmd}\n"
-        
-        mandatory_tool_hint = ""
-        if mandatory_tool:
-            mandatory_tool_hint = f"\n🚨 TOOL OBBLIGATORIO: {mandatory_tool.upper()}\n"
-            mandatory_tool_hint += f"⚠️ DEVI usare SOLO '{mandatory_tool}' - NON 'nc', 'curl', 'host' o altri tool!\n"
-            mandatory_tool_hint += f"ESEMPIO CORRETTO: {mandatory_tool} <argomenti>\n"
-            mandatory_tool_hint += f"ESEMPIO SBAGLIATO: nc <argomenti> ❌\n"
-            mandatory_tool_hint += f"ESEMPIO SBAGLIATO: curl <argomenti> ❌\n"
-        
-        prompt = f"""══════════════════════════════════════════════════
-⚠️ COMANDO RIGETTATO - GENERA ALTERNATIVA VALIDA
-══════════════════════════════════════════════════
-
-OBIETTIVO DELLO STEP:
-{step_description}
-
-COMANDO RIGETTATO:
-{failed_command}
-
-PROBLEMA: Comando non appropriato per lo step.
-{ip_hint}
-{mandatory_tool_hint}
-TOOL SUGGERITO:
-{tool_suggestion}
-{previous_hint}
-══════════════════════════════════════════════════
-REGOLE INVIOLABILI PER IL NUOVO COMANDO:
-══════════════════════════════════════════════════
-1. Genera ESATTAMENTE UN comando bash valido ed eseguibile
-2. USA SOLO IP/dati reali dal contesto sopra
-3. NO placeholder come <IP>, [indirizzo], IP_CAMERA
-4. NO frasi italiane (es. 'Analizza', 'Verifica')
-5. NO comandi già rigettati o simili a quello sopra
-6. NO comandi già eseguiti (vedi lista sopra)
-7. Comando MAX 200 caratteri
-8. Deve essere DIVERSO dal comando rigettato
-9. Formato: tool argomento1 argomento2 ...
-
-ESEMPI VALIDI:
-- curl -v http://192.168.1.6:80/onvif/device_service
-- nmap -p 554,8554 -sV 192.168.1.6
-- host 192.168.1.6
-- nc -zv 192.168.1.6 554
-
-GENERA SOLO IL COMANDO (NO SPIEGAZIONI):"""
+            previous_hint = "\n🚫 COMANDI GIÀ ESEGUITI (NON RIPETERE):\n" + "".join(
+                f"   ✗ {cmd}\n" for cmd in previous_commands[-5:]  # Ultimi 5
+            )
+        
+        prompt = _SUGGEST_PROMPT_TMPL.format_map({
+            "step_description": step_description,
+            "failed_command": failed_command,
+            "ip_hint": ip_hint,
+            "mandatory_tool_hint": _mandatory_tool_hint(mandatory_tool) if mandatory_tool else "",
+            "tool_suggestion": tool_suggestion,
+            "previous_hint": previous_hint,
+        })
         
         try:
             response = self.llm_call(prompt)
@@ -353,12 +846,13 @@ GENERA SOLO IL COMANDO (NO SPIEGAZIONI):"""
                 
                 # Verifica che rispetti tool obbligatorio
                 if mandatory_tool:
-                    cmd_tool = cmd.split()[0] if cmd.split() else ""
+                    cmd_tool = _first_token(cmd)
                     if cmd_tool.lower() != mandatory_tool.lower():
                         logger.warning(f"[VALIDATOR] Comando suggerito usa tool sbagliato '{cmd_tool}' invece di '{mandatory_tool}'")
                         return None
                 
                 logger.info(f"[VALIDATOR] Suggerito: {cmd}")
+                self._suggest_cache.put(step_description, failed_command, cmd)
                 return cmd
             else:
                 logger.warning(f"[VALIDATOR] Comando suggerito identico o vuoto")
@@ -371,81 +865,72 @@ GENERA SOLO IL COMANDO (NO SPIEGAZIONI):"""
     def _extract_clean_command(self, text: str) -> Optional[str]:
         """Estrae comando pulito da testo LLM - RIGOROSO"""
         
-        # Lista estesa di comandi validi
-        known_cmds = [
-            'nmap', 'curl', 'wget', 'nc', 'ncat', 'echo', 'cat', 'grep', 'find', 'ping',
-            'telnet', 'ssh', 'host', 'dig', 'nslookup',
-            'searchsploit', 'python', 'python3',
-            'ffmpeg', 'ffplay', 'vlc', 'cvlc'
-        ]
-        
-        # Placeholder che indicano comando INCOMPLETO
-        placeholder_patterns = [
-            r'<[^>]+>',  # <IP>, <indirizzo>
-            r'\[indirizzo', r'\[ip', r'\[porta',
-            r'IP_CAMERA', r'TARGET_IP', r'HOST_IP',
-        ]
-        
         # Rimuovi markdown
-        text = re.sub(r'```(?:bash)?\n?', '', text)
-        text = re.sub(r'`', '', text)
+        text = _RE_MD_FENCE.sub('', text)
+        text = text.replace('`', '')
         
         # Prendi prima linea che sembra comando VALIDO
-        lines = [l.strip() for l in text.split('\n') if l.strip()]
-        
-        for line in lines:
-            # Skippa commenti
-            if line.startswith('#') or line.startswith('//'):
+        for line in text.split('\n'):
+            line = line.strip()
+            # Skippa righe vuote e commenti
+            if not line or line.startswith(('#', '//')):
                 continue
             
-            first_word = line.split()[0] if line.split() else ""
-            
-            # Deve essere comando noto
-            if first_word not in known_cmds:
-                continue
-            
-            # Deve avere almeno 2 parole
-            if len(line.split()) < 2:
+            # Deve essere comando noto, con almeno 2 parole
+            if not line.startswith(_KNOWN_CMD_PREFIXES):
                 continue
             
             # Non deve avere placeholder
-            has_placeholder = False
-            for pattern in placeholder_patterns:
-                if re.search(pattern, line, re.IGNORECASE):
-                    has_placeholder = True
-                    break
-            
-            if not has_placeholder:
+            if not _PLACEHOLDER_ANY.search(line):
                 logger.debug(f"[VALIDATOR] Comando estratto: {line}")
                 return line
         
         # Fallback: cerca pattern "tool arg" nel testo
-        for known_cmd in known_cmds[:10]:
-            pattern = rf'\b{re.escape(known_cmd)}\s+[^\n<\[]+?(?:\n|$)'
-            match = re.search(pattern, text)
-            if match:
-                cmd = match.group(0).strip()
-                # Verifica no placeholder
-                has_placeholder = any(re.search(p, cmd, re.IGNORECASE) for p in placeholder_patterns)
-                if not has_placeholder and len(cmd.split()) >= 2:
-                    logger.debug(f"[VALIDATOR] Comando estratto da pattern: {cmd}")
-                    return cmd
+        for match in _FALLBACK_CMD_RE.finditer(text):
+            cmd = match.group(0).strip()
+            # Verifica no placeholder
+            if not _PLACEHOLDER_ANY.search(cmd) and len(cmd.split(None, 1)) >= 2:
+                logger.debug(f"[VALIDATOR] Comando estratto da pattern: {cmd}")
+                return cmd
         
         logger.warning(f"[VALIDATOR] Nessun comando valido in: {text[:100]}")
         return None
 
 
+# Istanza condivisa: cache, storico e automi persistono tra le chiamate
+_default_validator: Optional[CommandValidator] = None
+_validator_lock = threading.Lock()
+
+
+def get_validator(llm_call_fn: Callable) -> CommandValidator:
+    """
+    Ritorna il validator condiviso, ricreato solo se cambia la funzione LLM.
+    
+    Il confronto è per uguaglianza: i bound method (es. self.llm_call) sono
+    oggetti nuovi a ogni accesso ma uguali se legati alla stessa istanza.
+    """
+    global _default_validator
+    with _validator_lock:
+        if _default_validator is None or _default_validator.llm_call != llm_call_fn:
+            _default_validator = CommandValidator(llm_call_fn)
+        return _default_validator
+
+
 # Helper per uso facile
 def validate_and_improve_command(
     command: str,
     step_description: str,
     previous_commands: list,
     llm_call_fn: Callable,
-    context: str = ""
+    context: str = "",
+    validator: CommandValidator = None
 ) -> Dict:
     """
     Valida comando e suggerisce miglioramento se necessario.
     
+    Args:
+        validator: Istanza da usare (default: quella condivisa per llm_call_fn)
+    
     Returns:
         {
             "valid": bool,
@@ -454,13 +939,18 @@ def validate_and_improve_command(
         }
     """
     
-    validator = CommandValidator(llm_call_fn)
+    if validator is None:
+        validator = get_validator(llm_call_fn)
+    
+    # Storico indicizzato (solo la parte nuova): membership e conteggio tool O(1)
+    prev_set, prev_tools = validator.command_history.sync(previous_commands or [])
     
     # Valida
     validation = validator.is_command_appropriate(
         command, 
         step_description,
-        previous_commands
+        prev_set,
+        prev_tools
     )
     
     # Se appropriato, ritorna comando originale
@@ -477,16 +967,10 @@ def validate_and_improve_command(
     # Estrai tool obbligatorio dallo step (se presente)
     step_lower = step_description.lower()
     mandatory_tool = None
-    priority_keywords = {
-        'adb': ['connessione adb', 'android debug bridge', 'adb connect', 'tentare connessione adb', 
-                'tenta connessione adb', 'connessione adb su porta', 'comandi adb', 'enumerazione dati'],
-        'nmap': ['scansione nmap', 'scansiona con nmap', 'esegui scansione nmap'],
-        'curl': ['interroga servizi web', 'testare servizi web', 'verifica servizi', 'identifica interfacce']
-    }
-    for tool, keywords in priority_keywords.items():
-        if any(kw in step_lower for kw in keywords):
-            mandatory_tool = tool
-            break
+    priority_bits = _PRIORITY_MATCHER.mask(step_lower)
+    if priority_bits:
+        # Bit più basso = tool con priorità più alta
+        mandatory_tool = _PRIORITY_TOOLS[(priority_bits & -priority_bits).bit_length() - 1]
     
     better_cmd = validator.suggest_better_command(
         step_description,
@@ -501,7 +985,8 @@ def validate_and_improve_command(
         new_validation = validator.is_command_appropriate(
             better_cmd,
             step_description,
-            previous_commands
+            prev_set,
+            prev_tools
         )
         
         return {
@@ -5,28 +5,235 @@ Command Executor - Esecuzione comandi bash con sandbox Docker o subprocess
 📝 Integrato con Execution Ledger per logging atomico.
 """
 import os
+import re
+import selectors
+import signal
+import shutil
+import asyncio
+import atexit
 import subprocess
 import logging
+import multiprocessing
+import threading
 import time
+import queue
+import uuid
 import docker
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from functools import cache, lru_cache
 from typing import List, Dict, Optional
 
 # Execution Ledger for audit trail
-from backend.core.ledger import record_tool_call, record_tool_output, record_error
+from backend.core.ledger import get_ledger, new_event_id, record_tool_call, record_tool_output, record_error
+from backend.core.execution.process_utils import run_killable, split_simple_command
+
+# Dipendenze del path di esecuzione, importate una volta sola (non per comando)
+try:
+    from backend.config.security import (
+        full_security_check,
+        log_security_event,
+        CURRENT_SECURITY_LEVEL,
+    )
+    SAFE_EXECUTOR_AVAILABLE = True
+except ImportError:
+    SAFE_EXECUTOR_AVAILABLE = False
+
+try:
+    from tools.security import SecurityValidator, auditor
+except ImportError:
+    SecurityValidator = None
+    auditor = None
+
+try:
+    from tools.monitoring import metrics_collector
+except ImportError:
+    metrics_collector = None
+
+try:
+    from backend.core.memory.strategic_memory import get_strategic_memory
+except ImportError:
+    get_strategic_memory = None
 
 logger = logging.getLogger('CommandExecutor')
 
 # Percorsi
 PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', '..'))
 BASE_TEST_DIR = os.path.join(PROJECT_ROOT, 'test_env')
-os.makedirs(BASE_TEST_DIR, exist_ok=True)
+
+
+@cache
+def _ensure_testdir_once() -> str:
+    """Crea test_env alla prima esecuzione (non a ogni import del modulo)"""
+    os.makedirs(BASE_TEST_DIR, exist_ok=True)
+    return BASE_TEST_DIR
 
 # Config da ENV
 USE_DOCKER_SANDBOX = os.getenv("USE_DOCKER_SANDBOX", "false").lower() == "true"
 
-def log_info(msg):
-    logger.info(msg)
+# Scritture Ledger / strategic memory fuori dal percorso caldo: un thread
+# dedicato consuma la coda in ordine FIFO (per processo: vedi _ledger_async)
+LEDGER_QUEUE_SIZE = 10_000
+_LEDGER_Q: Optional[queue.Queue] = None
+_ledger_pid: Optional[int] = None
+_ledger_q_lock = threading.Lock()
+
+# Pool persistente per l'esecuzione parallela: i thread vengono creati una
+# volta sola invece che a ogni batch di comandi
+MAX_WORKERS = int(os.getenv("KALIAI_MAX_WORKERS", min(32, (os.cpu_count() or 4) * 4)))
+_EXECUTOR = ThreadPoolExecutor(max_workers=MAX_WORKERS, thread_name_prefix="cmd-exec")
+atexit.register(_EXECUTOR.shutdown, wait=False)
+
+# Pool di processi (creato solo se richiesto) per batch in cui il lavoro
+# Python per comando (validazione, ledger, memory) domina sull'attesa I/O
+_process_pool = None
+_process_pool_lock = threading.Lock()
+
+# Nei worker del pool di processi gli eventi non vanno sulla coda locale (i
+# worker escono senza atexit): vengono raccolti e restituiti al processo padre
+_deferred_events: Optional[list] = None
+
+# Client Docker condiviso: una sola sessione HTTP verso dockerd per tutti i thread
+_docker_client = None
+_docker_lock = threading.Lock()
+
+# Container sandbox long-lived: i comandi vengono eseguiti con exec, senza
+# pagare create/start/remove di un container per ogni comando
+SANDBOX_IMAGE = "alpine"
+_sandbox = None
+_sandbox_lock = threading.Lock()
+
+# Tool comuni che potrebbero essere richiesti (installati automaticamente)
+TOOL_KEYWORDS: frozenset = frozenset({
+    "dirb", "gobuster", "whatweb", "nikto", "sqlmap",
+    "hydra", "wfuzz", "masscan", "ffmpeg", "sslscan",
+})
+
+# Tool confermati installati -> timestamp (monotonic) dell'ultimo check
+TOOL_INSTALLED_TTL = 300
+_tool_installed_cache: Dict[str, float] = {}
+
+# Limite per stream (stdout/stderr) letto da un comando: oltre si tronca
+MAX_OUTPUT_BYTES = 2 * 1024 * 1024
+_READ_CHUNK = 65536
+
+def log_info(msg, *args):
+    # Formattazione lazy: gli argomenti vengono interpolati solo se INFO è attivo
+    logger.info(msg, *args)
+
+def _ledger_worker(q: queue.Queue):
+    """Consuma la coda ed esegue le scritture (ledger, strategic memory)"""
+    while True:
+        fn, args, kwargs = q.get()
+        try:
+            fn(*args, **kwargs)
+        except Exception as e:
+            logger.debug(f"[Ledger] Scrittura in background fallita: {e}")
+        finally:
+            q.task_done()
+
+def _flush_ledger():
+    """Attende che tutte le scritture in coda siano completate"""
+    if _LEDGER_Q is not None and _ledger_pid == os.getpid():
+        _LEDGER_Q.join()
+
+def _ledger_async(fn, *args, **kwargs):
+    """
+    Accoda una scrittura senza bloccare il chiamante.
+    Se la coda è piena l'evento viene scartato con un warning.
+    """
+    global _LEDGER_Q, _ledger_pid
+    if _deferred_events is not None:
+        _deferred_events.append((fn, args, kwargs))
+        return
+    # Il thread writer non sopravvive a un fork (ProcessPool): uno per processo
+    if _ledger_pid != os.getpid():
+        with _ledger_q_lock:
+            if _ledger_pid != os.getpid():
+                _LEDGER_Q = queue.Queue(maxsize=LEDGER_QUEUE_SIZE)
+                threading.Thread(
+                    target=_ledger_worker, args=(_LEDGER_Q,),
+                    name="ledger-writer", daemon=True
+                ).start()
+                _ledger_pid = os.getpid()
+    try:
+        _LEDGER_Q.put_nowait((fn, args, kwargs))
+    except queue.Full:
+        logger.warning(f"[Ledger] Coda piena, evento scartato: {getattr(fn, '__name__', fn)}")
+
+atexit.register(_flush_ledger)
+
+def _ledger_event(fn, *args, **kwargs):
+    """
+    Accoda un evento del Ledger fissando timestamp e run_id adesso:
+    la scrittura può avvenire dopo RUN_END o durante la run successiva.
+    """
+    kwargs["timestamp"] = time.time()
+    kwargs["run_id"] = get_ledger().current_run_id
+    _ledger_async(fn, *args, **kwargs)
+
+def _ledger_tool_call(actor: str, command: str) -> str:
+    """Registra (in background) il TOOL_CALL e ritorna subito il suo ID"""
+    call_id = new_event_id()
+    _ledger_event(record_tool_call, actor, "bash", command, event_id=call_id)
+    return call_id
+
+def _get_docker_client():
+    """Ritorna il client Docker condiviso, creato alla prima chiamata"""
+    global _docker_client
+    if _docker_client is None:
+        with _docker_lock:
+            if _docker_client is None:
+                _docker_client = docker.from_env()
+    return _docker_client
+
+def _ensure_sandbox_container() -> str:
+    """Avvia (una volta) il container sandbox e ne ritorna l'ID"""
+    global _sandbox
+    if _sandbox is None:
+        with _sandbox_lock:
+            if _sandbox is None:
+                # API di basso livello: create + start, senza il wrapper Container
+                api = _get_docker_client().api
+                create_kwargs = dict(
+                    command=["sleep", "infinity"],
+                    user="nobody",
+                    working_dir="/tmp",
+                    labels={"kaliai.role": "sandbox"},
+                    host_config=api.create_host_config(
+                        auto_remove=True,
+                        network_mode="none",
+                        mem_limit="128m",
+                        cpu_period=100000, cpu_quota=50000
+                    )
+                )
+                try:
+                    container = api.create_container(SANDBOX_IMAGE, **create_kwargs)
+                except docker.errors.ImageNotFound:
+                    api.pull(SANDBOX_IMAGE, tag="latest")
+                    container = api.create_container(SANDBOX_IMAGE, **create_kwargs)
+                api.start(container["Id"])
+                _sandbox = container["Id"]
+    return _sandbox
+
+def _stop_sandbox_container():
+    """Termina il container sandbox (auto_remove lo elimina)"""
+    global _sandbox
+    with _sandbox_lock:
+        if _sandbox is not None:
+            try:
+                _get_docker_client().api.kill(_sandbox)
+            except docker.errors.DockerException:
+                pass
+            _sandbox = None
+
+atexit.register(_stop_sandbox_container)
+
+def _sandbox_exec(cmd: List[str]):
+    """exec nel container sandbox: (exit_code, output stdout+stderr)"""
+    api = _get_docker_client().api
+    exec_id = api.exec_create(_ensure_sandbox_container(), cmd, user="nobody", workdir="/tmp")["Id"]
+    output = api.exec_start(exec_id)
+    return api.exec_inspect(exec_id)["ExitCode"], output
 
 def execute_bash_command_docker(command: str, timeout: int = 8) -> str:
     """
@@ -39,77 +246,185 @@ def execute_bash_command_docker(command: str, timeout: int = 8) -> str:
     Returns:
         Output del comando o messaggio di errore
     """
+    # Il timeout è applicato dentro il container: il processo viene ucciso,
+    # non solo abbandonato lato Python
+    exec_cmd = ["timeout", "-s", "KILL", str(timeout), "sh", "-c", command]
     try:
-        client = docker.from_env()
-        output = client.containers.run(
-            "alpine",
-            command=["sh", "-c", command],
-            remove=True,
-            network_mode="none",
-            mem_limit="128m",
-            cpu_period=100000, cpu_quota=50000,
-            stdout=True,
-            stderr=True,
-            user="nobody",
-            working_dir="/tmp",
-            detach=False,
-            timeout=timeout
-        )
-        decoded = output.decode()[:2048]
-        log_info(f"[DOCKER][OUT] {decoded}")
+        try:
+            exit_code, output = _sandbox_exec(exec_cmd)
+        except docker.errors.NotFound:
+            # Container sparito (riavvio dockerd, kill esterno): ricrealo una volta
+            _stop_sandbox_container()
+            exit_code, output = _sandbox_exec(exec_cmd)
+        decoded = output.decode(errors="replace")[:2048]
+        if exit_code != 0:
+            log_info("[SANDBOX ERROR][DOCKER] exit %s: %s", exit_code, decoded)
+            return f"[SANDBOX ERROR] exit {exit_code}: {decoded}"
+        log_info("[DOCKER][OUT] %s", decoded)
         return decoded
     except Exception as e:
         log_info(f"[SANDBOX ERROR][DOCKER] {e}")
         return f"[SANDBOX ERROR] {e}"
 
-def execute_bash_command_subprocess(command: str) -> str:
+@lru_cache(maxsize=256)
+def _which_cached(name: str) -> Optional[str]:
+    """shutil.which memoizzato (svuotato dopo un'installazione)"""
+    return shutil.which(name)
+
+def _ensure_tool_installed(command: str) -> Optional[str]:
     """
-    Esegue comando con subprocess in test_env directory.
-    Include auto-installazione tool mancanti.
+    Installa automaticamente il tool richiesto dal comando se manca.
     
-    Args:
-        command: Comando bash da eseguire
-        
     Returns:
-        Output del comando o messaggio di errore
+        Messaggio di errore se l'installazione fallisce, altrimenti None
     """
-    # Log raw command with repr() to preserve special chars like *
-    logger.info(f"Tentativo di esecuzione comando Bash limitato: {command}")
-    logger.debug(f"[RAW_CMD] {repr(command)}")  # Debug level shows actual string with escapes
-    
-    # === AUTO-INSTALL TOOL MANCANTI ===
     try:
-        from tools.tool_manager import tool_manager
-        
-        # Identifica tool dal comando
-        first_word = command.strip().split()[0] if command.strip() else ""
-        
-        # Tool comuni che potrebbero essere richiesti
-        tool_keywords = {
-            'dirb': 'dirb',
-            'gobuster': 'gobuster',
-            'whatweb': 'whatweb',
-            'nikto': 'nikto',
-            'sqlmap': 'sqlmap',
-            'hydra': 'hydra',
-            'wfuzz': 'wfuzz',
-            'masscan': 'masscan',
-            'ffmpeg': 'ffmpeg',
-            'sslscan': 'sslscan'
-        }
+        # Identifica tool dal comando (solo il primo token, senza splittare tutto)
+        parts = command.split(maxsplit=1)
+        first_word = parts[0] if parts else ""
         
-        if first_word in tool_keywords:
-            tool_name = tool_keywords[first_word]
-            if not tool_manager.is_tool_installed(tool_name):
+        if first_word in TOOL_KEYWORDS:
+            tool_name = first_word
+            # Presenza confermata di recente: nessun check esterno
+            checked_at = _tool_installed_cache.get(tool_name)
+            if checked_at is not None and time.monotonic() - checked_at < TOOL_INSTALLED_TTL:
+                return None
+            
+            # Binario nel PATH: una stat per nome, senza passare dal tool_manager
+            if _which_cached(tool_name) is not None:
+                _tool_installed_cache[tool_name] = time.monotonic()
+            else:
+                from tools.tool_manager import tool_manager
                 log_info(f"[TOOL-MANAGER] {tool_name} mancante, installazione automatica...")
                 success = tool_manager.auto_install_if_missing(tool_name)
                 if success:
+                    _which_cached.cache_clear()
+                    _tool_installed_cache[tool_name] = time.monotonic()
                     log_info(f"[TOOL-MANAGER] ✅ {tool_name} installato con successo")
                 else:
+                    _tool_installed_cache.pop(tool_name, None)
                     log_info(f"[TOOL-MANAGER] ❌ Installazione {tool_name} fallita")
                     return f"[TOOLS][ERRORE] Tool {tool_name} non disponibile e installazione fallita. Installa manualmente: sudo apt install {tool_name}"
     except Exception as e:
         log_info(f"[TOOL-MANAGER] Errore auto-install: {e}")
+    return None
+
+def _split_if_simple(command: str) -> Optional[List[str]]:
+    """
+    Ritorna l'argv del comando se può essere eseguito senza shell.
+    
+    None se il comando usa feature di bash (pipe, redirect, glob, variabili,
+    assegnazioni, builtin come 'cd') o se l'eseguibile non è nel PATH,
+    e deve quindi passare da '/bin/bash -c'.
+    """
+    argv = split_simple_command(command)
+    if argv is None:
+        return None
+    if "/" not in argv[0] and _which_cached(argv[0]) is None:
+        # Alias, funzioni o tool assenti: lascia a bash la risoluzione e l'errore
+        return None
+    return argv
+
+def _kill_process_group(proc) -> None:
+    """
+    SIGKILL all'intero process group del figlio (bash + nmap, curl, ...).
+    Il figlio è avviato con start_new_session=True, quindi pgid == pid.
+    """
+    try:
+        os.killpg(proc.pid, signal.SIGKILL)
+    except (ProcessLookupError, PermissionError):
+        proc.kill()
+
+def _run_bounded(command: str, timeout: float):
+    """
+    Esegue il comando leggendo stdout/stderr a blocchi fissi, con un tetto
+    di MAX_OUTPUT_BYTES per stream: niente accumulo illimitato in memoria.
+    Se stdout supera il limite il processo viene terminato. In caso di
+    timeout o troncamento viene ucciso l'intero albero di processi.
+    I comandi senza feature di shell vengono eseguiti senza /bin/bash.
+    
+    Returns:
+        (returncode, stdout_bytes, stderr_bytes, truncated)
+        
+    Raises:
+        subprocess.TimeoutExpired: se il comando supera il timeout
+    """
+    deadline = time.monotonic() + timeout
+    argv = _split_if_simple(command)
+    if argv is not None:
+        # Nessuna feature di shell: exec diretto, senza il fork+exec di bash
+        proc = subprocess.Popen(
+            argv,
+            cwd=_ensure_testdir_once(),
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            start_new_session=True
+        )
+    else:
+        proc = subprocess.Popen(
+            command,
+            shell=True,
+            executable="/bin/bash",  # Use bash for brace expansion, arrays, etc.
+            cwd=_ensure_testdir_once(),
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            start_new_session=True
+        )
+    buffers = {proc.stdout: bytearray(), proc.stderr: bytearray()}
+    truncated = False
+    try:
+        with selectors.DefaultSelector() as sel:
+            for stream in buffers:
+                sel.register(stream, selectors.EVENT_READ)
+            while sel.get_map() and not truncated:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise subprocess.TimeoutExpired(command, timeout)
+                for key, _ in sel.select(remaining):
+                    chunk = os.read(key.fd, _READ_CHUNK)
+                    if not chunk:
+                        sel.unregister(key.fileobj)
+                        continue
+                    buf = buffers[key.fileobj]
+                    if len(buf) < MAX_OUTPUT_BYTES:
+                        buf.extend(chunk[:MAX_OUTPUT_BYTES - len(buf)])
+                    elif key.fileobj is proc.stdout:
+                        truncated = True
+                        break
+        if truncated:
+            _kill_process_group(proc)
+        proc.wait(timeout=max(0.0, deadline - time.monotonic()))
+    except subprocess.TimeoutExpired as e:
+        _kill_process_group(proc)
+        proc.wait()
+        # Output parziale disponibile al chiamante (es. batch)
+        e.output = bytes(buffers[proc.stdout])
+        e.stderr = bytes(buffers[proc.stderr])
+        raise
+    finally:
+        proc.stdout.close()
+        proc.stderr.close()
+    return proc.returncode, bytes(buffers[proc.stdout]), bytes(buffers[proc.stderr]), truncated
+
+def execute_bash_command_subprocess(command: str) -> str:
+    """
+    Esegue comando con subprocess in test_env directory.
+    Include auto-installazione tool mancanti.
+    
+    Args:
+        command: Comando bash da eseguire
+        
+    Returns:
+        Output del comando o messaggio di errore
+    """
+    # Log raw command with repr() to preserve special chars like *
+    logger.info("Tentativo di esecuzione comando Bash limitato: %s", command)
+    logger.debug("[RAW_CMD] %r", command)  # Debug level shows actual string with escapes
+    
+    # === AUTO-INSTALL TOOL MANCANTI ===
+    install_error = _ensure_tool_installed(command)
+    if install_error:
+        return install_error
     
     # 🔓 SECURITY CHECKS DISABILITATI - tutti i comandi permessi
     # blocked_patterns = [
@@ -123,22 +438,22 @@ def execute_bash_command_subprocess(command: str) -> str:
     #         return "[TOOLS] Comando bloccato per sicurezza."
     
     try:
-        result = subprocess.run(
+        returncode, stdout, stderr, truncated = _run_bounded(
             command,
-            shell=True,
-            executable="/bin/bash",  # Use bash for brace expansion, arrays, etc.
-            cwd=BASE_TEST_DIR,
-            capture_output=True,
-            text=True,
             timeout=120  # Timeout aumentato per scan complessi
         )
-        if result.returncode == 0:
-            output = result.stdout.strip()
-            log_info(f"[SUBPROCESS][OUT] {output}")
+        if truncated:
+            output = stdout.decode(errors="replace").strip()
+            if logger.isEnabledFor(logging.INFO):
+                log_info("[SUBPROCESS][OUT] %s... (troncato)", output[:2048])
+            return f"{output}\n[TOOLS] Output troncato a {MAX_OUTPUT_BYTES} byte."
+        if returncode == 0:
+            output = stdout.decode(errors="replace").strip()
+            log_info("[SUBPROCESS][OUT] %s", output)
             return output if output else "[TOOLS] Comando eseguito (nessun output)."
         else:
-            err = result.stderr.strip()
-            log_info(f"[SUBPROCESS][ERR] {err}")
+            err = stderr.decode(errors="replace").strip()
+            log_info("[SUBPROCESS][ERR] %s", err)
             return f"[TOOLS][ERRORE] {err}"
     except subprocess.TimeoutExpired:
         return "[TOOLS][ERRORE] Comando scaduto (timeout)."
@@ -148,7 +463,110 @@ def execute_bash_command_subprocess(command: str) -> str:
         return f"[TOOLS][ERRORE] Errore imprevisto: {e}"
 
 
-def execute_commands_parallel(commands: List[str], max_workers: int = 5) -> List[Dict[str, str]]:
+async def _aexec(command: str, timeout: int = 120) -> str:
+    """
+    Variante asyncio di execute_bash_command_subprocess.
+    
+    Un solo event loop gestisce N processi figli; bash viene avviato solo
+    quando il comando usa feature di shell.
+    """
+    install_error = await asyncio.to_thread(_ensure_tool_installed, command)
+    if install_error:
+        return install_error
+    
+    argv = _split_if_simple(command)
+    try:
+        if argv is not None:
+            proc = await asyncio.create_subprocess_exec(
+                *argv,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.PIPE,
+                cwd=_ensure_testdir_once(),
+                start_new_session=True
+            )
+        else:
+            proc = await asyncio.create_subprocess_exec(
+                "/bin/bash", "-c", command,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.PIPE,
+                cwd=_ensure_testdir_once(),
+                start_new_session=True
+            )
+        try:
+            stdout, stderr = await asyncio.wait_for(proc.communicate(), timeout=timeout)
+        except asyncio.TimeoutError:
+            _kill_process_group(proc)
+            await proc.wait()
+            return "[TOOLS][ERRORE] Comando scaduto (timeout)."
+    except FileNotFoundError:
+        return f"[TOOLS][ERRORE] Comando '{command}' non trovato nell'ambiente di test."
+    except Exception as e:
+        return f"[TOOLS][ERRORE] Errore imprevisto: {e}"
+    
+    if proc.returncode == 0:
+        output = stdout.decode(errors="replace").strip()
+        log_info("[SUBPROCESS][OUT] %s", output)
+        return output if output else "[TOOLS] Comando eseguito (nessun output)."
+    err = stderr.decode(errors="replace").strip()
+    log_info("[SUBPROCESS][ERR] %s", err)
+    return f"[TOOLS][ERRORE] {err}"
+
+
+def _get_process_pool() -> ProcessPoolExecutor:
+    """Ritorna il ProcessPoolExecutor condiviso, creato alla prima chiamata"""
+    global _process_pool
+    if _process_pool is None:
+        with _process_pool_lock:
+            if _process_pool is None:
+                # forkserver: niente fork di un processo con thread (writer
+                # Ledger, _EXECUTOR) e lock potenzialmente acquisiti
+                _process_pool = ProcessPoolExecutor(
+                    max_workers=os.cpu_count(),
+                    mp_context=multiprocessing.get_context("forkserver"),
+                    initializer=_init_pool_worker
+                )
+                atexit.register(_process_pool.shutdown, wait=False)
+    return _process_pool
+
+def _init_pool_worker():
+    """Initializer dei worker: eventi Ledger/memory raccolti invece che accodati"""
+    global _deferred_events
+    _deferred_events = []
+
+def _execute_single_in_worker(command: str):
+    """Come _execute_single, ma ritorna anche gli eventi da registrare nel padre"""
+    result = _execute_single(command)
+    events = list(_deferred_events)
+    _deferred_events.clear()
+    return result, events
+
+def _replay_worker_events(events, run_id: Optional[str]) -> None:
+    """Accoda nel processo padre gli eventi prodotti da un worker"""
+    for fn, args, kwargs in events:
+        if "run_id" in kwargs:
+            # Il worker non conosce la run corrente: vale quella della chiamata
+            kwargs["run_id"] = run_id
+        _ledger_async(fn, *args, **kwargs)
+
+def _execute_single(command: str) -> Dict[str, str]:
+    """Esegue un singolo comando e ritorna risultato (a livello modulo: picklable)"""
+    try:
+        output = execute_bash_command(command)
+        return {
+            'command': command,
+            'output': output,
+            'success': not output.startswith('[TOOLS][ERRORE]')
+        }
+    except Exception as e:
+        return {
+            'command': command,
+            'output': f"[TOOLS][ERRORE] {str(e)}",
+            'success': False
+        }
+
+def execute_commands_parallel(commands: List[str], max_workers: int = 5,
+                              use_asyncio: bool = False,
+                              use_processes: bool = False) -> List[Dict[str, str]]:
     """
     ⚡ ESECUZIONE PARALLELA: Esegue più comandi contemporaneamente.
     
@@ -157,192 +575,373 @@ def execute_commands_parallel(commands: List[str], max_workers: int = 5) -> List
     
     Args:
         commands: Lista di comandi da eseguire in parallelo
-        max_workers: Numero massimo di thread paralleli (default: 5)
+        max_workers: Numero massimo di comandi in volo per questa chiamata (default: 5).
+                     I thread sono quelli del pool condiviso (_EXECUTOR).
+        use_asyncio: Se True (e senza sandbox Docker) i comandi girano su un
+                     unico event loop invece che su un thread ciascuno
+        use_processes: Se True usa un pool di processi: utile per batch grandi
+                       dove domina il lavoro Python (aggira il GIL). Ignorato
+                       con la sandbox Docker
         
     Returns:
-        Lista di dict con 'command', 'output', 'success' per ogni comando
+        Lista di dict con 'command', 'output', 'success' per ogni comando,
+        nello stesso ordine di commands
     """
-    results = []
+    if use_asyncio and not USE_DOCKER_SANDBOX:
+        return asyncio.run(_execute_commands_async(commands, max_workers))
+    
+    # Con la sandbox Docker ogni worker creerebbe il proprio container
+    # long-lived, mai fermato (i worker escono senza atexit): si resta sui
+    # thread, che condividono quello del processo
+    if USE_DOCKER_SANDBOX:
+        use_processes = False
+    
+    # Un posto per comando: ordine di input preservato, anche con duplicati
+    results: List[Optional[Dict[str, str]]] = [None] * len(commands)
+    executor = _get_process_pool() if use_processes else _EXECUTOR
+    task = _execute_single_in_worker if use_processes else _execute_single
+    run_id = get_ledger().current_run_id if use_processes else None
     
-    def execute_single(command: str) -> Dict[str, str]:
-        """Esegue un singolo comando e ritorna risultato"""
+    # Limita il fan-out di questa chiamata senza creare un pool dedicato
+    slots = threading.BoundedSemaphore(max(1, max_workers))
+    
+    def release_slot(_future):
+        slots.release()
+    
+    # Sottometti tutti i comandi al pool condiviso
+    future_to_idx = {}
+    for i, cmd in enumerate(commands):
+        slots.acquire()
+        future = executor.submit(task, cmd)
+        future.add_done_callback(release_slot)
+        future_to_idx[future] = i
+    
+    # Raccogli risultati man mano che completano
+    for future in as_completed(future_to_idx):
+        i = future_to_idx[future]
         try:
-            output = execute_bash_command(command)
-            return {
-                'command': command,
-                'output': output,
-                'success': not output.startswith('[TOOLS][ERRORE]')
-            }
+            if use_processes:
+                results[i], events = future.result()
+                _replay_worker_events(events, run_id)
+            else:
+                results[i] = future.result()
         except Exception as e:
-            return {
-                'command': command,
+            results[i] = {
+                'command': commands[i],
                 'output': f"[TOOLS][ERRORE] {str(e)}",
                 'success': False
             }
     
-    # Esegui comandi in parallelo
-    with ThreadPoolExecutor(max_workers=max_workers) as executor:
-        # Sottometti tutti i comandi
-        future_to_command = {
-            executor.submit(execute_single, cmd): cmd 
-            for cmd in commands
-        }
-        
-        # Raccogli risultati man mano che completano
-        for future in as_completed(future_to_command):
-            try:
-                result = future.result()
-                results.append(result)
-            except Exception as e:
-                command = future_to_command[future]
-                results.append({
-                    'command': command,
-                    'output': f"[TOOLS][ERRORE] {str(e)}",
-                    'success': False
-                })
-    
-    # Ordina risultati per mantenere ordine originale (opzionale)
-    # results.sort(key=lambda x: commands.index(x['command']))
-    
     return results
 
-def execute_bash_command(command: str, actor: str = "Batou") -> str:
+def _security_gate(command: str, actor: str, call_id) -> Optional[str]:
     """
-    Esegue comando bash con validazione sicurezza, metriche e logging su Ledger.
-    Funzione unificata che usa Docker o subprocess in base a USE_DOCKER_SANDBOX.
+    Validazione di sicurezza (SafeExecutor, poi legacy come fallback).
     
-    Args:
-        command: Comando bash da eseguire
-        actor: Nome dell'agente che ha richiesto l'esecuzione (per Ledger)
-        
     Returns:
-        Output del comando o messaggio di errore
+        Messaggio di blocco se il comando è rifiutato, altrimenti None
     """
-    start_time = time.time()
-    
-    # 📝 LEDGER: Record TOOL_CALL before execution
-    call_id = record_tool_call(actor, "bash", command)
-    
     # 🔒 NEW SECURITY LAYER (SafeExecutor) - DENY-WINS
     new_security_validated = False
-    try:
-        from backend.config.security import (
-            full_security_check, 
-            log_security_event,
-            CURRENT_SECURITY_LEVEL,
-            SecurityLevel
-        )
-        
+    if SAFE_EXECUTOR_AVAILABLE:
         is_safe, reason = full_security_check(command)
         
         if not is_safe:
             log_security_event("VIOLATION", command, reason, blocked=True)
             error_msg = f"[SECURITY BLOCK] {reason}"
             logger.warning(f"[Security] 🚫 BLOCKED: {command[:50]}... - {reason}")
-            record_tool_output(call_id, error_msg, status="BLOCKED", return_code=-1)
+            _ledger_event(record_tool_output, call_id, error_msg, status="BLOCKED",
+                          return_code=-1)
             return error_msg
         
         # New security layer validated successfully
         new_security_validated = True
         log_security_event("EXECUTE", command, f"Approved ({actor})", blocked=False)
-        level_str = CURRENT_SECURITY_LEVEL.value.upper()
-        logger.info(f"[Security] ⚠️ SECURITY PROFILE: {level_str} for: {command[:50]}")
-        
-    except ImportError:
+        if logger.isEnabledFor(logging.INFO):
+            level_str = CURRENT_SECURITY_LEVEL.value.upper()
+            logger.info("[Security] ⚠️ SECURITY PROFILE: %s for: %s", level_str, command[:50])
+    else:
         # Fallback al vecchio sistema se nuovo non disponibile
         logger.warning("[Security] SafeExecutor not available, using legacy security")
     
     # 🔓 LEGACY SECURITY (skip if new system already validated)
-    if not new_security_validated:
-        from tools.security import SecurityValidator, auditor
+    if not new_security_validated and SecurityValidator is not None:
         bypass_enabled = True  # Bypass legacy - usiamo il nuovo sistema sopra
         is_valid, reason = SecurityValidator.validate_command(command, bypass=bypass_enabled)
         if not is_valid:
             auditor.log_blocked(command, reason)
             error_msg = f"[SECURITY] Comando bloccato: {reason}"
-            from tools.monitoring import metrics_collector
-            metrics_collector.track_security_block(command, reason)
-            record_tool_output(call_id, error_msg, status="BLOCKED", return_code=-1)
+            if metrics_collector is not None:
+                metrics_collector.track_security_block(command, reason)
+            _ledger_event(record_tool_output, call_id, error_msg, status="BLOCKED",
+                          return_code=-1)
             return error_msg
         
         # Log comando permesso (solo se legacy è attivo)
         auditor.log_allowed(command)
-    
-    # Esegui
+    return None
+
+def _remember_technique(command: str, actor: str, success: bool, output: str) -> None:
+    """Registra la tecnica usata nella strategic memory (cross-session learning)"""
     try:
-        if USE_DOCKER_SANDBOX:
-            output = execute_bash_command_docker(command)
-        else:
-            output = execute_bash_command_subprocess(command)
-        
-        # Track metrics
-        duration = time.time() - start_time
-        success = "[ERRORE]" not in output and "[ERROR]" not in output
-        from tools.monitoring import metrics_collector
+        memory = get_strategic_memory()
+    
+        # Extract technique info from command
+        first_word = command.split()[0].split('/')[-1] if command.strip() else "unknown"
+    
+        # Try to extract target service/port
+        target_service = "unknown"
+        target_port = 0
+    
+        # Common patterns
+        if "ssh" in command.lower():
+            target_service = "ssh"
+            target_port = 22
+        elif "http" in command.lower() or "curl" in command.lower() or "wget" in command.lower():
+            target_service = "http"
+            target_port = 80
+        elif "smb" in command.lower() or "445" in command:
+            target_service = "smb"
+            target_port = 445
+        elif "ftp" in command.lower():
+            target_service = "ftp"
+            target_port = 21
+        elif "nmap" in command.lower():
+            target_service = "recon"
+    
+        memory.remember_technique(
+            technique_id=first_word,
+            technique_name=first_word.capitalize(),
+            mitre_id="",  # Could be enhanced with mapping
+            target_service=target_service,
+            target_port=target_port,
+            success=success,
+            output_summary=output[:200] if success else "",
+            context={"actor": actor, "full_command": command[:100]}
+        )
+    except Exception as e:
+        logger.debug(f"[StrategicMemory] Could not record: {e}")
+
+def _record_execution(command: str, actor: str, call_id, output: str, duration_ns: int) -> None:
+    """Metriche, strategic memory e Ledger dopo l'esecuzione di un comando"""
+    duration_ms = duration_ns // 1_000_000
+    duration = duration_ms / 1000.0
+    # Track metrics
+    success = "[ERRORE]" not in output and "[ERROR]" not in output
+    if metrics_collector is not None:
         metrics_collector.track_command_execution(
             command, 
             duration, 
             success,
             len(output)
         )
+    
+    # 🧠 STRATEGIC MEMORY: Track technique for cross-session learning
+    if get_strategic_memory is not None:
+        _ledger_async(_remember_technique, command, actor, success, output)
+    
+    # 📝 LEDGER: Record TOOL_OUTPUT after execution
+    _ledger_event(
+        record_tool_output,
+        call_id, 
+        output, 
+        status="SUCCESS" if success else "ERROR",
+        return_code=0 if success else 1,
+        duration_ms=duration_ms
+    )
+
+def _record_failure(command: str, actor: str, call_id, error: Exception, duration_ns: int) -> None:
+    """Metriche e Ledger per un'esecuzione terminata con eccezione"""
+    duration = (duration_ns // 1_000_000) / 1000.0
+    if metrics_collector is not None:
+        metrics_collector.track_command_execution(command, duration, False)
+    # 📝 LEDGER: Record error
+    _ledger_event(record_error, actor, str(error), command=command,
+                  correlation_id=call_id)
+
+def execute_bash_command(command: str, actor: str = "Batou") -> str:
+    """
+    Esegue comando bash con validazione sicurezza, metriche e logging su Ledger.
+    Funzione unificata che usa Docker o subprocess in base a USE_DOCKER_SANDBOX.
+    
+    Args:
+        command: Comando bash da eseguire
+        actor: Nome dell'agente che ha richiesto l'esecuzione (per Ledger)
         
-        # 🧠 STRATEGIC MEMORY: Track technique for cross-session learning
-        try:
-            from backend.core.memory.strategic_memory import get_strategic_memory
-            memory = get_strategic_memory()
-            
-            # Extract technique info from command
-            first_word = command.split()[0].split('/')[-1] if command.strip() else "unknown"
-            
-            # Try to extract target service/port
-            target_service = "unknown"
-            target_port = 0
-            
-            # Common patterns
-            if "ssh" in command.lower():
-                target_service = "ssh"
-                target_port = 22
-            elif "http" in command.lower() or "curl" in command.lower() or "wget" in command.lower():
-                target_service = "http"
-                target_port = 80
-            elif "smb" in command.lower() or "445" in command:
-                target_service = "smb"
-                target_port = 445
-            elif "ftp" in command.lower():
-                target_service = "ftp"
-                target_port = 21
-            elif "nmap" in command.lower():
-                target_service = "recon"
-            
-            memory.remember_technique(
-                technique_id=first_word,
-                technique_name=first_word.capitalize(),
-                mitre_id="",  # Could be enhanced with mapping
-                target_service=target_service,
-                target_port=target_port,
-                success=success,
-                output_summary=output[:200] if success else "",
-                context={"actor": actor, "full_command": command[:100]}
-            )
-        except Exception as e:
-            logger.debug(f"[StrategicMemory] Could not record: {e}")
-        
-        # 📝 LEDGER: Record TOOL_OUTPUT after execution
-        record_tool_output(
-            call_id, 
-            output, 
-            status="SUCCESS" if success else "ERROR",
-            return_code=0 if success else 1,
-            duration_ms=int(duration * 1000)
-        )
+    Returns:
+        Output del comando o messaggio di errore
+    """
+    start_ns = time.perf_counter_ns()
+    
+    # 📝 LEDGER: Record TOOL_CALL before execution
+    call_id = _ledger_tool_call(actor, command)
+    
+    blocked = _security_gate(command, actor, call_id)
+    if blocked:
+        return blocked
+    
+    # Esegui
+    try:
+        if USE_DOCKER_SANDBOX:
+            output = execute_bash_command_docker(command)
+        else:
+            output = execute_bash_command_subprocess(command)
         
+        _record_execution(command, actor, call_id, output, time.perf_counter_ns() - start_ns)
         return output
         
     except Exception as e:
-        duration = time.time() - start_time
-        from tools.monitoring import metrics_collector
-        metrics_collector.track_command_execution(command, duration, False)
-        # 📝 LEDGER: Record error
-        record_error(actor, str(e), command=command, correlation_id=call_id)
+        _record_failure(command, actor, call_id, e, time.perf_counter_ns() - start_ns)
         return f"[TOOLS][ERRORE] {str(e)}"
 
+async def execute_bash_command_async(command: str, actor: str = "Batou") -> str:
+    """
+    Come execute_bash_command, ma il processo figlio è gestito dall'event loop.
+    Stessa validazione di sicurezza e stesso logging su Ledger.
+    """
+    start_ns = time.perf_counter_ns()
+    call_id = _ledger_tool_call(actor, command)
+    
+    blocked = _security_gate(command, actor, call_id)
+    if blocked:
+        return blocked
+    
+    try:
+        output = await _aexec(command)
+        _record_execution(command, actor, call_id, output, time.perf_counter_ns() - start_ns)
+        return output
+    except Exception as e:
+        _record_failure(command, actor, call_id, e, time.perf_counter_ns() - start_ns)
+        return f"[TOOLS][ERRORE] {str(e)}"
+
+async def _execute_commands_async(commands: List[str], max_concurrency: int) -> List[Dict[str, str]]:
+    """Esegue i comandi su un unico event loop, al massimo max_concurrency alla volta"""
+    slots = asyncio.Semaphore(max(1, max_concurrency))
+    
+    async def execute_single(command: str) -> Dict[str, str]:
+        async with slots:
+            try:
+                output = await execute_bash_command_async(command)
+            except Exception as e:
+                output = f"[TOOLS][ERRORE] {str(e)}"
+        return {
+            'command': command,
+            'output': output,
+            'success': not output.startswith('[TOOLS][ERRORE]')
+        }
+    
+    return list(await asyncio.gather(*(execute_single(c) for c in commands)))
+
+def _bash_syntax_ok(script: str) -> bool:
+    """Controllo sintattico dello script con 'bash -n' (nessun comando eseguito)"""
+    try:
+        return run_killable(["/bin/bash", "-n"], input=script.encode(), timeout=10).returncode == 0
+    except (OSError, subprocess.SubprocessError):
+        return False
+
+def _run_batch_script(script: str, timeout: int):
+    """
+    Esegue lo script del batch con _run_bounded (nuova sessione, output
+    limitato a MAX_OUTPUT_BYTES, albero di processi ucciso al timeout).
+    
+    Returns:
+        (stdout, failure): failure è None se lo script è terminato, altrimenti
+        il messaggio per i comandi rimasti senza sentinella di fine
+    """
+    try:
+        _, stdout, _, truncated = _run_bounded(script, timeout)
+    except subprocess.TimeoutExpired as e:
+        return (e.output or b"").decode(errors="replace"), "[TOOLS][ERRORE] Comando scaduto (timeout)."
+    failure = f"[TOOLS][ERRORE] Output del batch troncato a {MAX_OUTPUT_BYTES} byte." if truncated else None
+    return stdout.decode(errors="replace"), failure
+
+def execute_bash_commands_batched(commands: List[str], actor: str = "Batou",
+                                  timeout: int = 120) -> List[Dict[str, str]]:
+    """
+    Esegue una lista di comandi indipendenti in un solo processo bash.
+    
+    Ogni comando gira in una subshell delimitata da sentinelle univoche
+    (fork senza exec), così N comandi costano un solo avvio di bash invece
+    di N. Sicurezza, auto-install e Ledger restano per singolo comando.
+    Solo per il path subprocess: stessa cwd (test_env) e stesso ambiente.
+    Se lo script non supera 'bash -n' i comandi vengono eseguiti uno alla volta.
+    
+    Args:
+        commands: Comandi da eseguire in sequenza
+        actor: Nome dell'agente (per Ledger)
+        timeout: Timeout in secondi per l'intero batch
+        
+    Returns:
+        Lista di dict con 'command', 'output', 'success', nell'ordine di input
+    """
+    results: List[Optional[Dict[str, str]]] = [None] * len(commands)
+    runnable = []  # (indice, comando, call_id)
+    
+    for i, command in enumerate(commands):
+        call_id = _ledger_tool_call(actor, command)
+        output = _security_gate(command, actor, call_id) or _ensure_tool_installed(command)
+        if output:
+            results[i] = {'command': command, 'output': output, 'success': False}
+        else:
+            runnable.append((i, command, call_id))
+    
+    if runnable:
+        tag = uuid.uuid4().hex
+        script = "".join(
+            f"printf '\\n<<SEP {tag} {i} %s>>\\n' \"$EPOCHREALTIME\"\n"
+            f"( {command}\n) 2>&1\n"
+            f"printf '\\n<<END {tag} {i} %d %s>>\\n' $? \"$EPOCHREALTIME\"\n"
+            for i, command, _ in runnable
+        )
+        end_re = re.compile(
+            rf"\n<<SEP {tag} (\d+) ([\d.,]*)>>\n(.*?)\n<<END {tag} \1 (\d+) ([\d.,]*)>>\n",
+            re.DOTALL
+        )
+        start_ns = time.perf_counter_ns()
+        if _bash_syntax_ok(script):
+            stdout, failure = _run_batch_script(script, timeout)
+        else:
+            # Errore di sintassi in uno dei comandi: bash abortirebbe l'intero
+            # script, quindi si ripiega sull'esecuzione uno alla volta
+            log_info("[SUBPROCESS][BATCH] Errore di sintassi nel batch, esecuzione singola")
+            stdout, failure = "", None
+        batch_duration_ns = time.perf_counter_ns() - start_ns
+        
+        parsed = {}
+        for m in end_re.finditer(stdout):
+            try:
+                duration_ns = int((float(m.group(5).replace(",", ".")) - float(m.group(2).replace(",", "."))) * 1e9)
+            except ValueError:
+                # bash < 5 non ha $EPOCHREALTIME: durata del batch intero
+                duration_ns = batch_duration_ns
+            parsed[int(m.group(1))] = (int(m.group(4)), m.group(3).strip(), duration_ns)
+        
+        for i, command, call_id in runnable:
+            if i not in parsed:
+                if failure:
+                    # Timeout o output troncato: il comando non è arrivato alla fine
+                    output = failure
+                    duration_ns = batch_duration_ns
+                else:
+                    single_start = time.perf_counter_ns()
+                    output = execute_bash_command_subprocess(command)
+                    duration_ns = time.perf_counter_ns() - single_start
+            else:
+                returncode, text, duration_ns = parsed[i]
+                if returncode == 0:
+                    output = text if text else "[TOOLS] Comando eseguito (nessun output)."
+                else:
+                    output = f"[TOOLS][ERRORE] {text}"
+            if logger.isEnabledFor(logging.INFO):
+                log_info("[SUBPROCESS][BATCH] %s -> %s", command, output[:200])
+            try:
+                _record_execution(command, actor, call_id, output, duration_ns)
+            except Exception as e:
+                _record_failure(command, actor, call_id, e, duration_ns)
+            results[i] = {
+                'command': command,
+                'output': output,
+                'success': not output.startswith('[TOOLS][ERRORE]')
+            }
+    
+    return results
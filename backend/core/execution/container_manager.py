@@ -3,23 +3,138 @@ import logging
 import os
 import uuid
 import time
-from typing import Dict, Any, Optional
+import atexit
+import threading
+from typing import Dict, Any, List, Optional, Tuple
 
 logger = logging.getLogger('ContainerManager')
 
+# Container pre-avviati (e messi in pausa) riusati per gli script senza rete
+POOL_SIZE = int(os.getenv("KALIAI_CONTAINER_POOL", "2"))
+
 class ContainerManager:
     """
     Gestisce l'esecuzione di container effimeri tramite Podman (Rootless).
+
+    Gli script senza accesso rete girano in container long-lived tenuti in
+    pausa (unpause -> exec -> pause), evitando il cold start di 'podman run'.
     """
-    def __init__(self, image_name: str = "kali-executor"):
+    def __init__(self, image_name: str = "kali-executor", pool_size: int = POOL_SIZE):
         self.image_name = image_name
         self.base_cmd = ["podman", "run", "--rm", "--network", "none"] # Default: NO NET
         # Per scenari con rete, aggiungere flag specifici nel metodo run
+        
+        # Pool di container in pausa (ID), riempito al primo utilizzo
+        self._pool: List[str] = []
+        self._pool_size = pool_size
+        self._pool_lock = threading.Lock()
+        atexit.register(self.shutdown_pool)
+
+    def _start_pool_container(self) -> Optional[str]:
+        """Avvia un container long-lived senza rete; ritorna l'ID o None"""
+        try:
+            result = subprocess.run(
+                ["podman", "run", "-d", "--network", "none",
+                 "--memory", "256m", "--cpus", "0.5",
+                 self.image_name, "sleep", "infinity"],
+                capture_output=True, text=True, timeout=60
+            )
+        except (OSError, subprocess.SubprocessError) as e:
+            logger.warning(f"[ContainerManager] Pool container non avviato: {e}")
+            return None
+        if result.returncode != 0:
+            logger.warning(f"[ContainerManager] Pool container non avviato: {result.stderr.strip()}")
+            return None
+        return result.stdout.strip()
+
+    def _acquire(self) -> Tuple[Optional[str], bool]:
+        """Ritorna (container_id, in_pausa) dal pool, o un container nuovo"""
+        with self._pool_lock:
+            if self._pool:
+                return self._pool.pop(), True
+        return self._start_pool_container(), False
+
+    def _podman_ok(self, *args: str) -> bool:
+        """Esegue un comando podman breve; False su errore o timeout (mai eccezioni)"""
+        try:
+            return subprocess.run(["podman", *args], capture_output=True, timeout=10).returncode == 0
+        except (OSError, subprocess.SubprocessError) as e:
+            logger.debug(f"[ContainerManager] podman {' '.join(args)} fallito: {e}")
+            return False
+
+    def _release(self, container_id: str) -> None:
+        """Rimette in pausa il container e lo restituisce al pool (o lo rimuove)"""
+        paused = self._podman_ok("pause", container_id)
+        with self._pool_lock:
+            if paused and len(self._pool) < self._pool_size:
+                self._pool.append(container_id)
+                return
+        self._discard(container_id)
+
+    def _discard(self, container_id: str) -> None:
+        """Rimuove un container (es. dopo un timeout: stato non affidabile)"""
+        try:
+            subprocess.run(["podman", "rm", "-f", container_id], capture_output=True, timeout=30)
+        except (OSError, subprocess.SubprocessError) as e:
+            logger.debug(f"[ContainerManager] rm -f {container_id} fallito: {e}")
+
+    def shutdown_pool(self) -> None:
+        """Rimuove tutti i container del pool (registrato con atexit)"""
+        with self._pool_lock:
+            pool, self._pool = self._pool, []
+        for container_id in pool:
+            self._discard(container_id)
+
+    def _run_pooled(self, script_content: str, timeout: int) -> Optional[Dict[str, Any]]:
+        """Esegue lo script in un container del pool; None se il pool non è disponibile"""
+        container_id, paused = self._acquire()
+        if not container_id:
+            return None
+        start_time = time.time()
+        # Il container è fuori dal pool: su qualsiasi uscita anomala va rimosso,
+        # altrimenti resta un 'sleep infinity' che shutdown_pool non vede
+        released = False
+        try:
+            if paused and not self._podman_ok("unpause", container_id):
+                return None
+            try:
+                result = subprocess.run(
+                    ["podman", "exec", "-i", container_id, "python3", "-c", script_content],
+                    capture_output=True,
+                    text=True,
+                    timeout=timeout
+                )
+            except subprocess.TimeoutExpired:
+                return {"status": "timeout", "error": f"Execution exceeded {timeout}s"}
+            duration = time.time() - start_time
+            # Un fallimento del pause non cambia l'esito dello script
+            self._release(container_id)
+            released = True
+        finally:
+            if not released:
+                self._discard(container_id)
+        
+        return {
+            "status": "success" if result.returncode == 0 else "error",
+            "output": result.stdout,
+            "error": result.stderr,
+            "duration": duration,
+            "exit_code": result.returncode
+        }
 
     def run_python_script(self, script_content: str, network_access: bool = False, specific_target_ip: str = None, timeout: int = 60) -> Dict[str, Any]:
         """
         Esegue uno script Python nel container.
         """
+        # Senza rete: container dal pool (fallback a 'podman run' se non disponibile)
+        if not network_access and self._pool_size > 0:
+            try:
+                pooled = self._run_pooled(script_content, timeout)
+                if pooled is not None:
+                    return pooled
+            except Exception as e:
+                return {"status": "system_error", "error": str(e)}
+        
         # Creazione script temporaneo locale (che verrà montato o passato)
         # Podman permette di passare script via stdin o mount.
         # Per sicurezza, usiamo stdin o un file temporaneo passato come volume read-only?
@@ -37,13 +152,13 @@ class ContainerManager:
                 # Meglio bridge standard
             else:
                  cmd = [c for c in cmd if c != "--network" and c != "none"]
-
+        
         # Memory/CPU limits
         cmd.extend(["--memory", "256m", "--cpus", "0.5"])
         
         # Entrypoint
         cmd.extend(["-i", self.image_name, "python3", "-c", script_content])
-
+        
         try:
             start_time = time.time()
             result = subprocess.run(
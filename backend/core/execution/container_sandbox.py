@@ -11,11 +11,20 @@ Funzionalità:
 """
 
 import os
+import asyncio
+import re
+import shlex
+import atexit
 import subprocess
-import tempfile
 import logging
-import uuid
-from typing import Optional, Tuple
+import threading
+import time
+import secrets
+from concurrent.futures import Future
+from functools import cache, lru_cache
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple, Union
+
+from backend.core.execution.process_utils import run_capped, run_capped_async, run_killable
 
 logger = logging.getLogger('ContainerSandbox')
 
@@ -29,23 +38,55 @@ FALLBACK_IMAGE = "alpine:latest"
 
 # Directory condivisa per output/script
 SHARED_DIR = "/tmp/kali_sandbox"
-os.makedirs(SHARED_DIR, exist_ok=True)
 
 # Limiti risorse container
 CONTAINER_LIMITS = {
     "memory": "512m",
     "cpus": "1.0",
     "timeout": 120,
+    "pids_limit": 256,        # Niente fork bomb
+    "read_only": True,        # Rootfs read-only: niente copy-on-write sull'overlay
+    "tmpfs_size": "64m",      # Scratch su /tmp e sulla workdir quando read_only
+    "cap_drop_all": True,
+    "cap_add": ("NET_RAW",),  # Solo con rete: raw socket per nmap -sS / ping
 }
 
+# Immagini già verificate presenti in questo processo: (runtime, image).
+# Invalidate solo se il runtime risponde "no such image".
+_IMAGE_CACHE: Set[Tuple[str, str]] = set()
+_image_cache_lock = threading.Lock()
+# Container long-lived per (runtime, image, network_mode): i comandi con rete
+# girano con 'exec' invece di un 'run --rm' per comando
+_pool_containers: Dict[Tuple[str, str, str], str] = {}
+_pool_lock = threading.Lock()
+
+# Pull falliti di recente: (runtime, image) -> timestamp (niente retry immediati)
+PULL_RETRY_DELAY = 60
+_failed_pulls: Dict[Tuple[str, str], float] = {}
+
+# Operazioni in corso (pull, comandi con dedupe_key): i chiamanti concorrenti
+# con la stessa chiave attendono il risultato del primo invece di ripeterle
+_inflight: Dict[Tuple, Future] = {}
+_inflight_lock = threading.Lock()
+
 # ============================================================================
 # HELPER FUNCTIONS
 # ============================================================================
 
+@cache
+def _ensure_shared_dir() -> str:
+    """Crea la directory condivisa al primo utilizzo (non all'import)."""
+    os.makedirs(SHARED_DIR, exist_ok=True)
+    return SHARED_DIR
+
+@cache
 def _get_container_runtime() -> str:
     """
     Determina se usare podman o docker.
     Preferisce podman (rootless).
+    
+    Il risultato è memorizzato per tutta la vita del processo:
+    usare _get_container_runtime.cache_clear() per forzare un nuovo rilevamento.
     """
     # Check podman
     try:
@@ -75,19 +116,65 @@ def _get_container_runtime() -> str:
     return None
 
 def _check_image_exists(runtime: str, image: str) -> bool:
-    """Verifica se l'immagine esiste localmente."""
+    """Verifica se l'immagine esiste localmente (gli esiti positivi restano in cache)."""
+    key = (runtime, image)
+    with _image_cache_lock:
+        if key in _IMAGE_CACHE:
+            return True
     try:
         result = subprocess.run(
             [runtime, "image", "exists", image],
             capture_output=True,
             timeout=10
         )
-        return result.returncode == 0
+        exists = result.returncode == 0
     except:
         return False
+    if exists:
+        with _image_cache_lock:
+            _IMAGE_CACHE.add(key)
+    return exists
+
+def _forget_image(runtime: str, image: str) -> None:
+    """Rimuove l'immagine dalla cache (es. cancellata fuori dal processo)."""
+    with _image_cache_lock:
+        _IMAGE_CACHE.discard((runtime, image))
+
+def _singleflight(key: Tuple, fn: Callable[[], Any]) -> Any:
+    """Esegue fn una sola volta per chiave tra chiamate concorrenti e ne condivide l'esito."""
+    with _inflight_lock:
+        future = _inflight.get(key)
+        leader = future is None
+        if leader:
+            future = _inflight[key] = Future()
+    if not leader:
+        return future.result()
+    try:
+        result = fn()
+    except BaseException as e:
+        future.set_exception(e)
+        raise
+    else:
+        future.set_result(result)
+        return result
+    finally:
+        with _inflight_lock:
+            _inflight.pop(key, None)
 
 def _pull_image(runtime: str, image: str) -> bool:
-    """Scarica l'immagine se non presente."""
+    """Scarica l'immagine (pull concorrenti della stessa immagine vengono unificati)."""
+    return _singleflight(("pull", runtime, image), lambda: _pull_image_once(runtime, image))
+
+def _pull_image_once(runtime: str, image: str) -> bool:
+    """Scarica l'immagine se non presente (un pull fallito non viene ritentato per PULL_RETRY_DELAY s)."""
+    key = (runtime, image)
+    with _image_cache_lock:
+        if key in _IMAGE_CACHE:
+            return True  # Scaricata da un pull appena concluso
+
+    failed_at = _failed_pulls.get(key)
+    if failed_at is not None and time.monotonic() - failed_at < PULL_RETRY_DELAY:
+        return False
     logger.info(f"[ContainerSandbox] Pulling image: {image}")
     try:
         result = subprocess.run(
@@ -96,35 +183,226 @@ def _pull_image(runtime: str, image: str) -> bool:
             text=True,
             timeout=300  # 5 minuti per il pull
         )
-        return result.returncode == 0
+        success = result.returncode == 0
     except Exception as e:
         logger.error(f"[ContainerSandbox] Pull failed: {e}")
-        return False
+        success = False
+    if success:
+        _failed_pulls.pop(key, None)
+        with _image_cache_lock:
+            _IMAGE_CACHE.add(key)
+    else:
+        _failed_pulls[key] = time.monotonic()
+    return success
+
+def _ensure_pool_container(runtime: str, image: str, network: bool) -> Optional[str]:
+    """
+    Avvia (una volta) un container detached per (image, network) e ne ritorna il nome.
+    None se l'avvio fallisce: il chiamante usa il classico 'run --rm'.
+    """
+    network_mode = "host" if network else "none"
+    key = (runtime, image, network_mode)
+    with _pool_lock:
+        name = _pool_containers.get(key)
+        if name:
+            return name
+        name = f"sandbox_pool_{secrets.token_hex(4)}"
+        cmd = [
+            runtime, "run", "-d",
+            "--name", name,
+            "--memory", CONTAINER_LIMITS["memory"],
+            "--cpus", CONTAINER_LIMITS["cpus"],
+            *_hardening_args(network, "/workspace"),
+            "-w", "/workspace",
+            "--network", network_mode,
+            "-v", f"{_ensure_shared_dir()}:/shared:ro",
+            image, "sleep", "infinity"
+        ]
+        try:
+            result = subprocess.run(cmd, capture_output=True, text=True, timeout=60)
+        except (OSError, subprocess.SubprocessError) as e:
+            logger.warning(f"[ContainerSandbox] Pool container not started: {e}")
+            return None
+        if result.returncode != 0:
+            logger.warning(f"[ContainerSandbox] Pool container not started: {result.stderr.strip()}")
+            return None
+        _pool_containers[key] = name
+        logger.info(f"[ContainerSandbox] Pool container {name} ready ({image}, network={network_mode})")
+        return name
+
+def _drop_pool_container(name: str) -> None:
+    """Dimentica un container del pool (sparito o non più affidabile)."""
+    with _pool_lock:
+        for key, value in list(_pool_containers.items()):
+            if value == name:
+                del _pool_containers[key]
+
+def _cleanup_pool() -> None:
+    """Rimuove i container del pool all'uscita del processo."""
+    with _pool_lock:
+        pool = list(_pool_containers.items())
+        _pool_containers.clear()
+    for (runtime, _image, _network), name in pool:
+        try:
+            subprocess.run([runtime, "rm", "-f", name], capture_output=True, timeout=30)
+        except (OSError, subprocess.SubprocessError):
+            pass
+
+atexit.register(_cleanup_pool)
+
+@lru_cache(maxsize=32)
+def _hardening_args(network: bool, workdir: str) -> Tuple[str, ...]:
+    """Flag di contenimento da CONTAINER_LIMITS (pids, rootfs read-only, capability)."""
+    args: List[str] = []
+    if CONTAINER_LIMITS.get("pids_limit"):
+        args += ["--pids-limit", str(CONTAINER_LIMITS["pids_limit"])]
+    if CONTAINER_LIMITS.get("read_only"):
+        # Rootfs read-only: lo scratch resta disponibile su tmpfs
+        tmpfs_size = CONTAINER_LIMITS.get("tmpfs_size", "64m")
+        args += ["--read-only", "--tmpfs", f"/tmp:size={tmpfs_size}"]
+        if workdir != "/tmp":
+            args += ["--tmpfs", f"{workdir}:size={tmpfs_size}"]
+    if CONTAINER_LIMITS.get("cap_drop_all"):
+        args.append("--cap-drop=ALL")
+        if network:
+            args += [f"--cap-add={cap}" for cap in CONTAINER_LIMITS.get("cap_add", ())]
+    args += ["--security-opt", "no-new-privileges"]
+    return tuple(args)
+
+@lru_cache(maxsize=32)
+def _run_cmd_prefix(runtime: str, network: bool, workdir: str) -> Tuple[str, ...]:
+    """Argomenti fissi di 'run --rm' per (runtime, network, workdir), senza nome container."""
+    return (
+        runtime, "run",
+        "--rm",                                    # Rimuovi dopo esecuzione
+        "--memory", CONTAINER_LIMITS["memory"],
+        "--cpus", CONTAINER_LIMITS["cpus"],
+        *_hardening_args(network, workdir),
+        "-w", workdir,
+        # Network mode: host per gli scan, none per isolamento totale
+        "--network", "host" if network else "none",
+        # Mount shared directory (read-only per sicurezza)
+        "-v", f"{_ensure_shared_dir()}:/shared:ro",
+    )
 
 # ============================================================================
 # MAIN FUNCTIONS
 # ============================================================================
 
 def run_command_in_sandbox(
-    command: str,
+    command: Optional[str] = None,
     image: str = None,
     network: bool = True,
     timeout: int = None,
-    workdir: str = "/workspace"
+    workdir: str = "/workspace",
+    stdin_data: Optional[str] = None,
+    argv: Optional[List[str]] = None,
+    dedupe_key: Optional[str] = None
 ) -> str:
     """
     Esegue un comando bash in un container isolato.
     
     Args:
-        command: Comando bash da eseguire
+        command: Comando bash da eseguire (ignorato se argv è dato)
         image: Immagine container (default: kali-rolling)
         network: Abilita accesso rete (True/False)
         timeout: Timeout in secondi
         workdir: Directory di lavoro nel container
+        stdin_data: Dati da passare sullo stdin del comando (es. script per 'python3 -')
+        argv: Comando strutturato, eseguito senza /bin/bash (niente parsing
+              di shell sugli argomenti, es. target forniti dall'agente)
+        dedupe_key: Opt-in per comandi idempotenti (es. scan read-only):
+                    chiamate concorrenti con stessa chiave, immagine e rete
+                    condividono un'unica esecuzione e il suo output
         
     Returns:
         Output del comando (stdout + stderr)
     """
+    if argv is None and command is None:
+        raise ValueError("run_command_in_sandbox requires command or argv")
+    if dedupe_key is not None:
+        return _singleflight(
+            ("run", image or DEFAULT_IMAGE, network, workdir, dedupe_key),
+            lambda: run_command_in_sandbox(command, image, network, timeout, workdir, stdin_data, argv)
+        )
+    
+    call = _prepare_sandbox_call(command, image, network, timeout, workdir, stdin_data, argv)
+    if isinstance(call, str):
+        return call
+    runtime, image, cmd, pool_id, container_id, timeout = call
+    
+    try:
+        # Nuovo process group: al timeout SIGTERM → grace → SIGKILL sull'albero.
+        # Output letto a blocchi in un buffer limitato (niente scan da centinaia di MB in RAM)
+        result = run_capped(
+            cmd,
+            input=stdin_data.encode() if stdin_data is not None else None,
+            timeout=timeout
+        )
+        return _format_sandbox_result(runtime, image, pool_id, result)
+    except subprocess.TimeoutExpired:
+        return _sandbox_timeout(runtime, container_id, pool_id, timeout)
+    except Exception as e:
+        logger.error(f"[ContainerSandbox] Execution error: {e}")
+        return f"[SANDBOX ERROR] {str(e)}"
+
+async def run_command_in_sandbox_async(
+    command: Optional[str] = None,
+    image: str = None,
+    network: bool = True,
+    timeout: int = None,
+    workdir: str = "/workspace",
+    stdin_data: Optional[str] = None,
+    argv: Optional[List[str]] = None
+) -> str:
+    """
+    Come run_command_in_sandbox, ma il processo del runtime è gestito
+    dall'event loop: N comandi concorrenti con asyncio.gather non occupano
+    N thread. Le parti bloccanti (pull immagine, stop del container) girano
+    in asyncio.to_thread.
+    
+    Returns:
+        Output del comando (stdout + stderr)
+    """
+    if argv is None and command is None:
+        raise ValueError("run_command_in_sandbox_async requires command or argv")
+    
+    call = await asyncio.to_thread(
+        _prepare_sandbox_call, command, image, network, timeout, workdir, stdin_data, argv
+    )
+    if isinstance(call, str):
+        return call
+    runtime, image, cmd, pool_id, container_id, timeout = call
+    
+    try:
+        result = await run_capped_async(
+            cmd,
+            input=stdin_data.encode() if stdin_data is not None else None,
+            timeout=timeout
+        )
+        return _format_sandbox_result(runtime, image, pool_id, result)
+    except subprocess.TimeoutExpired:
+        return await asyncio.to_thread(_sandbox_timeout, runtime, container_id, pool_id, timeout)
+    except Exception as e:
+        logger.error(f"[ContainerSandbox] Execution error: {e}")
+        return f"[SANDBOX ERROR] {str(e)}"
+
+def _prepare_sandbox_call(
+    command: Optional[str],
+    image: Optional[str],
+    network: bool,
+    timeout: Optional[int],
+    workdir: str,
+    stdin_data: Optional[str],
+    argv: Optional[List[str]]
+) -> Union[str, Tuple[str, str, List[str], Optional[str], str, int]]:
+    """
+    Risolve runtime e immagine (pull se serve) e costruisce il comando del runtime.
+    
+    Returns:
+        (runtime, image, cmd, pool_id, container_id, timeout), oppure il
+        messaggio di errore se nessun runtime è disponibile
+    """
     runtime = _get_container_runtime()
     if not runtime:
         return "[SANDBOX ERROR] No container runtime (podman/docker) available"
@@ -141,63 +419,144 @@ def run_command_in_sandbox(
             if not _check_image_exists(runtime, image):
                 _pull_image(runtime, image)
     
-    # Costruisci comando container
-    container_id = f"sandbox_{uuid.uuid4().hex[:8]}"
-    
-    cmd = [
-        runtime, "run",
-        "--rm",                                    # Rimuovi dopo esecuzione
-        "--name", container_id,
-        "--memory", CONTAINER_LIMITS["memory"],
-        "--cpus", CONTAINER_LIMITS["cpus"],
-        "-w", workdir,
-    ]
+    # Con rete: exec nel container long-lived (niente create/cgroup/overlay
+    # per comando). Senza rete: container usa-e-getta, isolamento completo.
+    pool_id = _ensure_pool_container(runtime, image, network) if network else None
     
-    # Network mode
-    if network:
-        cmd.extend(["--network", "host"])  # Accesso rete host (per scan)
+    if pool_id:
+        container_id = pool_id
+        cmd = [
+            runtime, "exec",
+            "-w", workdir,
+        ]
+        if stdin_data is not None:
+            cmd.append("-i")
+        cmd.extend([
+            pool_id,
+            # Il timeout uccide il processo dentro il container, non il container
+            "timeout", "-s", "KILL", str(timeout),
+            *(argv if argv is not None else ["/bin/bash", "-c", command])
+        ])
     else:
-        cmd.extend(["--network", "none"])  # Isolamento totale
-    
-    # Mount shared directory (read-only per sicurezza)
-    cmd.extend(["-v", f"{SHARED_DIR}:/shared:ro"])
-    
-    # Immagine e comando
-    cmd.extend([
-        image,
-        "/bin/bash", "-c", command
-    ])
+        # Costruisci comando container
+        container_id = f"sandbox_{secrets.token_hex(4)}"
+        
+        # Solo nome e comando variano: il resto è un prefisso precalcolato
+        prefix = _run_cmd_prefix(runtime, network, workdir)
+        cmd = [*prefix[:3], "--name", container_id, *prefix[3:]]
+        
+        if stdin_data is not None:
+            cmd.append("-i")  # Mantiene aperto lo stdin verso il container
+        
+        # Immagine e comando
+        if argv is not None:
+            cmd.extend(["--entrypoint", argv[0], image, *argv[1:]])
+        else:
+            cmd.extend([
+                image,
+                "/bin/bash", "-c", command
+            ])
     
+    if argv is not None:
+        command = shlex.join(argv)  # Solo per i log
     logger.info(f"[ContainerSandbox] Running in {image}: {command[:60]}...")
     logger.debug(f"[ContainerSandbox] Full command: {' '.join(cmd)}")
     
-    try:
-        result = subprocess.run(
-            cmd,
-            capture_output=True,
-            text=True,
-            timeout=timeout
-        )
-        
-        output = result.stdout.strip()
-        errors = result.stderr.strip()
-        
-        if result.returncode == 0:
-            return output if output else "[Container executed - no output]"
-        else:
-            combined = f"{output}\n{errors}".strip()
-            return f"[CONTAINER ERROR] {combined}" if combined else f"[CONTAINER ERROR] Exit code {result.returncode}"
-            
-    except subprocess.TimeoutExpired:
-        # Forza stop del container
+    return runtime, image, cmd, pool_id, container_id, timeout
+
+def _format_sandbox_result(runtime: str, image: str, pool_id: Optional[str],
+                           result: subprocess.CompletedProcess) -> str:
+    """Converte il risultato del runtime nel testo restituito all'agente"""
+    output = result.stdout.decode("utf-8", "replace").strip()
+    errors = result.stderr.decode("utf-8", "replace").strip()
+    
+    if result.returncode == 0:
+        return output if output else "[Container executed - no output]"
+    if "no such image" in errors.lower() or "image not known" in errors.lower():
+        _forget_image(runtime, image)
+    if pool_id and ("no such container" in errors.lower() or "no container with name" in errors.lower()):
+        _drop_pool_container(pool_id)
+    combined = f"{output}\n{errors}".strip()
+    return f"[CONTAINER ERROR] {combined}" if combined else f"[CONTAINER ERROR] Exit code {result.returncode}"
+
+def _sandbox_timeout(runtime: str, container_id: str, pool_id: Optional[str], timeout: int) -> str:
+    """Gestisce il timeout: ferma il container usa-e-getta (mai quello condiviso)"""
+    # Container condiviso: non fermarlo, il 'timeout' interno uccide il comando
+    if not pool_id:
         try:
             subprocess.run([runtime, "stop", container_id], timeout=5)
         except:
             pass
-        return f"[SANDBOX TIMEOUT] Command exceeded {timeout}s limit"
-    except Exception as e:
-        logger.error(f"[ContainerSandbox] Execution error: {e}")
-        return f"[SANDBOX ERROR] {str(e)}"
+    return f"[SANDBOX TIMEOUT] Command exceeded {timeout}s limit"
+
+def _bash_syntax_ok(script: str) -> bool:
+    """Controllo sintattico dello script con 'bash -n' sull'host (nulla viene eseguito)"""
+    try:
+        return run_killable(["/bin/bash", "-n"], input=script, text=True, timeout=10).returncode == 0
+    except (OSError, subprocess.SubprocessError):
+        return False
+
+def run_commands_in_sandbox(
+    commands: List[Union[str, List[str]]],
+    image: str = None,
+    network: bool = True,
+    timeout: int = None,
+    workdir: str = "/workspace"
+) -> List[str]:
+    """
+    Esegue più comandi in una sola invocazione del container.
+    
+    I comandi girano in sequenza nello stesso script bash, ognuno in una
+    subshell delimitata da marker univoci: l'avvio del container (o l'exec
+    nel container del pool) si paga una volta sola invece che N.
+    
+    Args:
+        commands: Comandi bash da eseguire in ordine; le liste sono argv
+                  strutturati e vengono quotati con shlex (nessuna espansione)
+        image, network, workdir: Come run_command_in_sandbox
+        timeout: Timeout in secondi per l'intero batch
+        
+    Returns:
+        Lista di output, uno per comando e nello stesso ordine
+        (stesso formato di run_command_in_sandbox)
+    """
+    if not commands:
+        return []
+    
+    commands = [shlex.join(c) if isinstance(c, list) else c for c in commands]
+    tag = secrets.token_hex(6)
+    script = "".join(
+        f"printf '__K_BEGIN_{tag}_{i}__\\n'\n"
+        f"( {command}\n) 2>&1\n"
+        f"printf '\\n__K_END_{tag}_{i}_%d__\\n' $?\n"
+        for i, command in enumerate(commands)
+    )
+    if not _bash_syntax_ok(script):
+        # Un errore di sintassi farebbe abortire l'intero script: un comando alla volta
+        logger.info("[ContainerSandbox] Batch with syntax errors, running commands one by one")
+        return [
+            run_command_in_sandbox(command, image=image, network=network, timeout=timeout, workdir=workdir)
+            for command in commands
+        ]
+    
+    output = run_command_in_sandbox(script, image=image, network=network, timeout=timeout, workdir=workdir)
+    
+    marker_re = re.compile(
+        rf"__K_BEGIN_{tag}_(\d+)__\n(.*?)\n__K_END_{tag}_\1_(\d+)__",
+        re.DOTALL
+    )
+    parsed = {}
+    for m in marker_re.finditer(output):
+        text = m.group(2).strip()
+        if m.group(3) == "0":
+            parsed[int(m.group(1))] = text if text else "[Container executed - no output]"
+        else:
+            parsed[int(m.group(1))] = f"[CONTAINER ERROR] {text}" if text else f"[CONTAINER ERROR] Exit code {m.group(3)}"
+    
+    # Comandi senza marker di fine: timeout o errore del container per il batch
+    failure = output if output.startswith("[SANDBOX") or output.startswith("[CONTAINER ERROR]") \
+        else "[SANDBOX ERROR] Command did not complete"
+    return [parsed.get(i, failure) for i in range(len(commands))]
 
 def run_python_in_sandbox(
     script_content: str,
@@ -217,29 +576,14 @@ def run_python_in_sandbox(
     Returns:
         Output dello script
     """
-    # Scrivi script in file temporaneo (nella shared dir)
-    script_id = uuid.uuid4().hex[:8]
-    script_path = os.path.join(SHARED_DIR, f"script_{script_id}.py")
-    
-    try:
-        with open(script_path, 'w') as f:
-            f.write(script_content)
-        
-        # Esegui lo script nel container
-        command = f"python3 /shared/script_{script_id}.py"
-        
-        return run_command_in_sandbox(
-            command=command,
-            image=image,
-            network=network,
-            timeout=timeout
-        )
-    finally:
-        # Cleanup script file
-        try:
-            os.remove(script_path)
-        except:
-            pass
+    # Lo script passa sullo stdin di 'python3 -': nessun file nella shared dir
+    return run_command_in_sandbox(
+        command="python3 -",
+        image=image,
+        network=network,
+        timeout=timeout,
+        stdin_data=script_content
+    )
 
 def run_nmap_in_sandbox(
     target: str,
@@ -257,10 +601,11 @@ def run_nmap_in_sandbox(
     Returns:
         Output nmap
     """
-    command = f"nmap {flags} -p {ports} {target}"
+    # argv diretto: niente bash, target e porte non passano da un parser di shell
+    argv = ["nmap", *shlex.split(flags), "-p", ports, target]
     
     return run_command_in_sandbox(
-        command=command,
+        argv=argv,
         image=DEFAULT_IMAGE,
         network=True,
         timeout=300  # 5 minuti per scan
@@ -279,11 +624,10 @@ def run_direct_fallback(command: str, timeout: int = 120) -> str:
     logger.warning(f"[ContainerSandbox] FALLBACK: Direct execution for: {command[:50]}...")
     
     try:
-        result = subprocess.run(
+        result = run_killable(
             command,
             shell=True,
             executable="/bin/bash",
-            capture_output=True,
             text=True,
             timeout=timeout
         )
@@ -324,9 +668,31 @@ def get_sandbox_status() -> dict:
     
     return status
 
+def warm_cache(images: Tuple[str, ...] = (DEFAULT_IMAGE, FALLBACK_IMAGE)) -> Dict[str, bool]:
+    """
+    Scarica in anticipo le immagini sandbox mancanti (sincrono).
+    
+    Pensato per installer/script di avvio: la prima richiesta dell'agente
+    non paga più il pull di kali-rolling (decine di secondi).
+    
+    Returns:
+        Dict immagine -> disponibile
+    """
+    runtime = _get_container_runtime()
+    if not runtime:
+        return {image: False for image in images}
+    ready = {}
+    for image in images:
+        ready[image] = _check_image_exists(runtime, image) or _pull_image(runtime, image)
+        logger.info(f"[ContainerSandbox] Warm cache {image}: {'ready' if ready[image] else 'unavailable'}")
+    return ready
+
 # Log inizializzazione
 _runtime = _get_container_runtime()
 if _runtime:
     logger.info(f"[ContainerSandbox] Initialized with {_runtime}")
+    # Pull in background fuori dal percorso della prima richiesta (opt-in)
+    if os.getenv("KALIAI_WARM_IMAGES", "0") == "1":
+        threading.Thread(target=warm_cache, name="sandbox-warm", daemon=True).start()
 else:
     logger.warning("[ContainerSandbox] No container runtime available - will use direct execution")
@@ -0,0 +1,263 @@
+"""
+Process Utils - Terminazione pulita di alberi di processi
+🧹 SIGTERM → grace period → SIGKILL sull'intero process group, così i figli
+(nmap, curl, ...) non restano orfani dopo un timeout.
+"""
+import os
+import re
+import asyncio
+import shlex
+import signal
+import selectors
+import subprocess
+import time
+from collections import deque
+from typing import Any, List, Optional
+
+# Output trattenuto per stream da run_capped: oltre si conserva solo la coda
+MAX_CAPTURE_BYTES = 4 * 1024 * 1024
+_READ_CHUNK = 1 << 16
+TRUNCATED_MARKER = b"[... output truncated ...]\n"
+
+# Caratteri che richiedono davvero una shell (pipe, redirect, espansioni, glob, commenti)
+SHELL_META_RE = re.compile(r"[|&;<>*?$`{}()\[\]~#\n]")
+
+# Builtin e parole chiave di bash: non esistono come eseguibili
+SHELL_BUILTINS = frozenset({
+    ".", ":", "[", "[[", "alias", "bg", "bind", "break", "builtin", "caller",
+    "case", "cd", "command", "compgen", "complete", "continue", "declare",
+    "dirs", "disown", "echo", "enable", "eval", "exec", "exit", "export",
+    "false", "fc", "fg", "for", "function", "getopts", "hash", "help",
+    "history", "if", "jobs", "kill", "let", "local", "logout", "popd",
+    "printf", "pushd", "pwd", "read", "readonly", "return", "select", "set",
+    "shift", "shopt", "source", "suspend", "test", "time", "times", "trap",
+    "true", "type", "typeset", "ulimit", "umask", "unalias", "unset",
+    "until", "wait", "while", "!", "{", "}",
+})
+
+
+def split_simple_command(command: str) -> Optional[List[str]]:
+    """
+    Ritorna l'argv del comando se può essere eseguito senza shell.
+
+    None se il comando usa feature di shell (pipe, redirect, glob, tilde,
+    variabili, commenti, assegnazioni) o inizia con un builtin/parola chiave
+    di bash: in quei casi deve passare da 'bash -c' / 'sh -c'.
+    """
+    if SHELL_META_RE.search(command):
+        return None
+    try:
+        argv = shlex.split(command)
+    except ValueError:
+        return None
+    if not argv or "=" in argv[0] or argv[0] in SHELL_BUILTINS:
+        return None
+    return argv
+
+
+def _tree_signaller(proc):
+    """
+    Ritorna una funzione sig -> None che segnala il process group del figlio
+    (solo il processo stesso se il figlio non ha un gruppo proprio).
+    """
+    try:
+        pgid = os.getpgid(proc.pid)
+    except ProcessLookupError:
+        pgid = None
+    own_group = pgid is not None and pgid != os.getpgrp()
+
+    def _signal(sig):
+        try:
+            if own_group:
+                os.killpg(pgid, sig)
+            elif proc.returncode is None:
+                proc.send_signal(sig)
+        except (ProcessLookupError, PermissionError):
+            pass
+
+    return _signal
+
+
+def terminate_tree(proc: subprocess.Popen, grace: float = 2.0) -> None:
+    """
+    Termina il processo e i suoi discendenti.
+
+    Invia SIGTERM al process group, attende fino a `grace` secondi e poi
+    invia SIGKILL. Il processo deve essere avviato con start_new_session=True,
+    altrimenti viene segnalato solo il processo stesso (mai il nostro gruppo).
+    """
+    _signal = _tree_signaller(proc)
+    proc.poll()
+    _signal(signal.SIGTERM)
+    try:
+        proc.wait(timeout=grace)
+    except subprocess.TimeoutExpired:
+        pass
+    # SIGKILL anche se il leader è uscito: i figli possono essere ancora vivi
+    _signal(signal.SIGKILL)
+    proc.wait()
+
+
+def run_killable(args: Any, timeout: Optional[float] = None, input: Optional[str] = None,
+                 grace: float = 2.0, **popen_kwargs) -> subprocess.CompletedProcess:
+    """
+    Come subprocess.run(..., capture_output=True), ma in un nuovo process group:
+    al timeout l'intero albero viene terminato con terminate_tree() prima di
+    rilanciare subprocess.TimeoutExpired.
+    """
+    popen_kwargs.setdefault("stdout", subprocess.PIPE)
+    popen_kwargs.setdefault("stderr", subprocess.PIPE)
+    if input is not None:
+        popen_kwargs["stdin"] = subprocess.PIPE
+    with subprocess.Popen(args, start_new_session=True, **popen_kwargs) as proc:
+        try:
+            stdout, stderr = proc.communicate(input=input, timeout=timeout)
+        except subprocess.TimeoutExpired:
+            terminate_tree(proc, grace)
+            proc.communicate()
+            raise
+    return subprocess.CompletedProcess(args, proc.returncode, stdout, stderr)
+
+
+class _TailBuffer:
+    """Chunk in una deque con dimensione totale limitata: scarta i più vecchi"""
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.chunks: deque = deque()
+        self.size = 0
+        self.truncated = False
+
+    def append(self, chunk: bytes) -> None:
+        self.chunks.append(chunk)
+        self.size += len(chunk)
+        while self.size > self.limit:
+            excess = self.size - self.limit
+            head = self.chunks[0]
+            if len(head) <= excess:
+                self.chunks.popleft()
+                self.size -= len(head)
+            else:
+                self.chunks[0] = head[excess:]
+                self.size -= excess
+            self.truncated = True
+
+    def getvalue(self) -> bytes:
+        data = b"".join(self.chunks)
+        return TRUNCATED_MARKER + data if self.truncated else data
+
+
+def run_capped(args: Any, timeout: Optional[float] = None, input: Optional[bytes] = None,
+               max_bytes: int = MAX_CAPTURE_BYTES, grace: float = 2.0,
+               **popen_kwargs) -> subprocess.CompletedProcess:
+    """
+    Come run_killable, ma stdout/stderr vengono letti a blocchi con un
+    selector e trattenuti in un buffer limitato a `max_bytes` per stream:
+    su output enormi resta solo la coda, preceduta da TRUNCATED_MARKER.
+    stdout/stderr del risultato sono bytes (decodifica a carico del chiamante).
+    """
+    deadline = None if timeout is None else time.monotonic() + timeout
+    stdin = subprocess.PIPE if input is not None else subprocess.DEVNULL
+    with subprocess.Popen(args, stdin=stdin, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                          bufsize=0, start_new_session=True, **popen_kwargs) as proc:
+        buffers = {proc.stdout: _TailBuffer(max_bytes), proc.stderr: _TailBuffer(max_bytes)}
+        pending = memoryview(input) if input is not None else None
+        try:
+            with selectors.DefaultSelector() as sel:
+                for stream in buffers:
+                    sel.register(stream, selectors.EVENT_READ)
+                if pending is not None:
+                    if pending:
+                        os.set_blocking(proc.stdin.fileno(), False)
+                        sel.register(proc.stdin, selectors.EVENT_WRITE)
+                    else:
+                        proc.stdin.close()
+                while len(sel.get_map()):
+                    remaining = None if deadline is None else deadline - time.monotonic()
+                    if remaining is not None and remaining <= 0:
+                        raise subprocess.TimeoutExpired(args, timeout)
+                    for key, _ in sel.select(remaining):
+                        if key.fileobj is proc.stdin:
+                            try:
+                                written = os.write(key.fd, pending[:_READ_CHUNK])
+                            except BrokenPipeError:
+                                written = len(pending)
+                            pending = pending[written:]
+                            if not pending:
+                                sel.unregister(proc.stdin)
+                                proc.stdin.close()
+                            continue
+                        chunk = os.read(key.fd, _READ_CHUNK)
+                        if not chunk:
+                            sel.unregister(key.fileobj)
+                        else:
+                            buffers[key.fileobj].append(chunk)
+            proc.wait(timeout=None if deadline is None else max(0.0, deadline - time.monotonic()))
+        except subprocess.TimeoutExpired:
+            terminate_tree(proc, grace)
+            raise subprocess.TimeoutExpired(args, timeout,
+                                            output=buffers[proc.stdout].getvalue(),
+                                            stderr=buffers[proc.stderr].getvalue())
+    return subprocess.CompletedProcess(args, proc.returncode,
+                                       buffers[proc.stdout].getvalue(),
+                                       buffers[proc.stderr].getvalue())
+
+
+async def _terminate_tree_async(proc: asyncio.subprocess.Process, grace: float = 2.0) -> None:
+    """Come terminate_tree, per processi asyncio"""
+    _signal = _tree_signaller(proc)
+    _signal(signal.SIGTERM)
+    try:
+        await asyncio.wait_for(proc.wait(), grace)
+    except asyncio.TimeoutError:
+        pass
+    _signal(signal.SIGKILL)
+    await proc.wait()
+
+
+async def run_capped_async(args: List[str], timeout: Optional[float] = None,
+                           input: Optional[bytes] = None, max_bytes: int = MAX_CAPTURE_BYTES,
+                           grace: float = 2.0, **kwargs) -> subprocess.CompletedProcess:
+    """
+    Variante asyncio di run_capped: N processi gestiti da un solo event loop
+    invece che da N thread bloccati. Stessi limiti di output e stessa
+    terminazione dell'albero al timeout (subprocess.TimeoutExpired con
+    l'output parziale).
+    """
+    proc = await asyncio.create_subprocess_exec(
+        *args,
+        stdin=subprocess.PIPE if input is not None else subprocess.DEVNULL,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        start_new_session=True,
+        **kwargs
+    )
+    out, err = _TailBuffer(max_bytes), _TailBuffer(max_bytes)
+
+    async def pump(stream, buffer):
+        while True:
+            chunk = await stream.read(_READ_CHUNK)
+            if not chunk:
+                return
+            buffer.append(chunk)
+
+    async def feed():
+        if input is None:
+            return
+        try:
+            proc.stdin.write(input)
+            await proc.stdin.drain()
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+        finally:
+            proc.stdin.close()
+
+    try:
+        await asyncio.wait_for(
+            asyncio.gather(feed(), pump(proc.stdout, out), pump(proc.stderr, err), proc.wait()),
+            timeout
+        )
+    except asyncio.TimeoutError:
+        await _terminate_tree_async(proc, grace)
+        raise subprocess.TimeoutExpired(args, timeout, output=out.getvalue(), stderr=err.getvalue())
+    return subprocess.CompletedProcess(args, proc.returncode, out.getvalue(), err.getvalue())
@@ -1,14 +1,23 @@
 import subprocess
+import selectors
 import threading
-import queue
 import uuid
 import time
 import os
+import re
 import logging
 from typing import Dict, Any, Optional
 
+from backend.core.execution.process_utils import terminate_tree
+
 logger = logging.getLogger('PythonPersistent')
 
+_READ_CHUNK = 65536
+# Import iniziali eseguiti con -c prima della modalità interattiva (nessun round-trip)
+_PRELUDE = "import sys, os, json, time"
+# Prompt interattivi ('>>> ', '... ') che python -i scrive su stderr
+_PROMPT_RE = re.compile(r"^(?:(?:>>>|\.\.\.) ?)+")
+
 class PythonPersistentExecutor:
     """
     Motore di esecuzione Python persistente (The Hand).
@@ -24,7 +33,7 @@ class PythonPersistentExecutor:
         self.process = None
         self.is_running = False
         self._sentinel = f"__GHOSTBRAIN_END_{uuid.uuid4().hex}__"
-        self._queue = queue.Queue()
+        self._sentinel_bytes = self._sentinel.encode()
         self._execution_lock = threading.Lock()
         
     def start(self):
@@ -32,39 +41,25 @@ class PythonPersistentExecutor:
         if self.is_running and self.process:
             return
 
-        # Avvia python con -i per modalità interattiva e -u per unbuffered I/O
+        # Avvia python con -i per modalità interattiva e -u per unbuffered I/O;
+        # -c esegue il prelude nel namespace __main__ prima del prompt
         self.process = subprocess.Popen(
-            ["python3", "-i", "-u"],
+            ["python3", "-i", "-u", "-c", _PRELUDE],
             stdin=subprocess.PIPE,
             stdout=subprocess.PIPE,
             stderr=subprocess.PIPE,
-            text=True,
             bufsize=0,
-            cwd=os.getcwd() # Esegue nella root del progetto
+            cwd=os.getcwd(), # Esegue nella root del progetto
+            start_new_session=True # Process group proprio: stop() raggiunge anche i figli
         )
         self.is_running = True
         
-        # Avvia thread per leggere stdout/stderr
-        self._start_reader_thread(self.process.stdout, "STDOUT")
-        self._start_reader_thread(self.process.stderr, "STDERR")
+        # Pipe non bloccanti: execute_code le legge a blocchi con un selector
+        os.set_blocking(self.process.stdout.fileno(), False)
+        os.set_blocking(self.process.stderr.fileno(), False)
         
-        # Inizializza l'ambiente
-        self.execute_code("import sys; import os; import json; import time", timeout=5)
         logger.info("Python Persistent Kernel avviato.")
 
-    def _start_reader_thread(self, pipe, name):
-        def reader():
-            while self.is_running:
-                try:
-                    line = pipe.readline()
-                    if not line:
-                        break
-                    self._queue.put((name, line))
-                except Exception:
-                    break
-        t = threading.Thread(target=reader, daemon=True, name=f"Reader-{name}")
-        t.start()
-
     def restart(self):
         """Riavvia il kernel (pulisce la memoria)."""
         self.stop()
@@ -74,13 +69,41 @@ class PythonPersistentExecutor:
         """Termina il processo."""
         self.is_running = False
         if self.process:
-            try:
-                self.process.terminate()
-                self.process.wait(timeout=2)
-            except subprocess.TimeoutExpired:
-                self.process.kill()
+            # SIGTERM → 2s → SIGKILL su kernel e processi lanciati dal codice eseguito
+            terminate_tree(self.process, grace=2)
             self.process = None
 
+    @staticmethod
+    def _read_available(pipe, buffer: bytearray) -> bool:
+        """Legge tutto ciò che è disponibile sulla pipe; False se EOF"""
+        while True:
+            try:
+                chunk = os.read(pipe.fileno(), _READ_CHUNK)
+            except BlockingIOError:
+                return True
+            if not chunk:
+                return False
+            buffer += chunk
+
+    @staticmethod
+    def _discard_available(pipe) -> None:
+        """Scarta in blocco i byte in attesa sulla pipe, senza accumularli"""
+        try:
+            while os.read(pipe.fileno(), _READ_CHUNK):
+                pass
+        except BlockingIOError:
+            pass
+
+    @staticmethod
+    def _clean_stderr(data: bytes) -> list:
+        """Righe di stderr senza i prompt dell'interprete"""
+        lines = []
+        for line in data.decode(errors="replace").splitlines():
+            line = _PROMPT_RE.sub("", line).rstrip()
+            if line:
+                lines.append(line)
+        return lines
+
     def execute_code(self, code: str, timeout: Optional[int] = None) -> Dict[str, Any]:
         """
         Esegue un blocco di codice e ritorna l'output.
@@ -89,71 +112,86 @@ class PythonPersistentExecutor:
             self.start()
 
         timeout = timeout or self.timeout
-        
-        # Pulisci la coda da output precedenti
-        while not self._queue.empty():
-            try:
-                self._queue.get_nowait()
-            except queue.Empty:
-                break
 
         with self._execution_lock:
-            try:
-                # Incapsula il codice per gestire errori e segnale di fine
-                # Usiamo print con flush per assicurare che il sentinel arrivi
-                wrapped_code = f"{code}\nprint('{self._sentinel}', flush=True)\n"
-                
-                self.process.stdin.write(wrapped_code)
-                self.process.stdin.flush()
-                
-                output = []
-                error_output = []
-                start_time = time.time()
-                finished = False
-                
-                while (time.time() - start_time) < timeout:
-                    try:
-                        # Leggi dalla coda con breve timeout
-                        name, line = self._queue.get(timeout=0.1)
-                        
-                        if name == "STDOUT":
-                            if self._sentinel in line:
-                                finished = True
-                                # Rimuovi sentinel dalla linea se presente parzialmente
-                                clean_line = line.replace(self._sentinel, "").strip()
-                                if clean_line:
-                                    output.append(clean_line)
-                                break
-                            output.append(line.rstrip())
-                        elif name == "STDERR":
-                            # Ignora il prompt interattivo '>>> ' se appare in stderr
-                            if line.strip() in ['>>>', '...']:
-                                continue
-                            error_output.append(line.rstrip())
-                            
-                    except queue.Empty:
-                        if not self.process or self.process.poll() is not None:
-                            return {"status": "crash", "output": "\n".join(output), "error": "Process crashed"}
-                        continue
-
-                if not finished:
-                    # Timeout
-                    self.restart() # Necessario riavviare se bloccato
-                    return {
-                        "status": "timeout",
-                        "output": "\n".join(output),
-                        "error": f"Execution timed out after {timeout}s"
-                    }
+            result = self._execute_locked(code, timeout)
 
+        if result["status"] == "timeout":
+            # Fuori dal lock: restart() non deve attendere la propria esecuzione
+            self.restart() # Necessario riavviare se bloccato
+        return result
+
+    def _execute_locked(self, code: str, timeout: int) -> Dict[str, Any]:
+        """Corpo di execute_code; da chiamare con _execution_lock acquisito"""
+        try:
+            stdout, stderr = self.process.stdout, self.process.stderr
+            
+            # Scarta output residuo di esecuzioni precedenti
+            self._discard_available(stdout)
+            self._discard_available(stderr)
+            
+            # Incapsula il codice per gestire errori e segnale di fine
+            # Usiamo print con flush per assicurare che il sentinel arrivi
+            wrapped_code = f"{code}\nprint('{self._sentinel}', flush=True)\n"
+            
+            self.process.stdin.write(wrapped_code.encode())
+            self.process.stdin.flush()
+            
+            out_buf = bytearray()
+            err_buf = bytearray()
+            deadline = time.monotonic() + timeout
+            end = -1
+            scanned = 0  # Byte di out_buf già esaminati alla ricerca del sentinel
+            finished = False
+            crashed = False
+            
+            with selectors.DefaultSelector() as selector:
+                selector.register(stdout, selectors.EVENT_READ, out_buf)
+                selector.register(stderr, selectors.EVENT_READ, err_buf)
+                while not finished and not crashed:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    for key, _ in selector.select(timeout=remaining):
+                        if not self._read_available(key.fileobj, key.data):
+                            crashed = True
+                    if end < 0:
+                        # Ricerca solo sui byte nuovi (più la coda che può contenere
+                        # un sentinel spezzato tra due read): niente rescan quadratico
+                        end = out_buf.find(self._sentinel_bytes, scanned)
+                        scanned = max(0, len(out_buf) - len(self._sentinel_bytes) + 1)
+                    # Attendi la riga del sentinel completa: il suo '\n' non deve
+                    # finire in testa all'output dell'esecuzione successiva
+                    finished = end >= 0 and out_buf.find(b"\n", end) >= 0
+            
+            # Il traceback precede il sentinel: raccogli lo stderr rimasto
+            self._read_available(stderr, err_buf)
+            output = "\n".join(
+                line.rstrip()
+                for line in out_buf[:end if end >= 0 else len(out_buf)].decode(errors="replace").splitlines()
+            )
+            
+            if end < 0 and crashed:
+                return {"status": "crash", "output": output, "error": "Process crashed"}
+
+            if end < 0:
+                # Timeout: il chiamante riavvia il kernel dopo aver rilasciato il lock
                 return {
-                    "status": "success" if not error_output else "error",
-                    "output": "\n".join(output),
-                    "error": "\n".join(error_output)
+                    "status": "timeout",
+                    "output": output,
+                    "error": f"Execution timed out after {timeout}s"
                 }
 
-            except Exception as e:
-                logger.error(f"Errore esecuzione codice: {e}")
-                return {"status": "system_error", "output": "", "error": str(e)}
+            error_output = self._clean_stderr(err_buf)
+            return {
+                "status": "success" if not error_output else "error",
+                "output": output,
+                "error": "\n".join(error_output)
+            }
+
+        except Exception as e:
+            logger.error(f"Errore esecuzione codice: {e}")
+            return {"status": "system_error", "output": "", "error": str(e)}
 
 # Singleton instance per persistenza globale
 _executor_instance = None
@@ -14,10 +14,12 @@ import os
 import re
 import logging
 import subprocess
-from typing import Optional, Dict, Any, Tuple
+from typing import Optional, Dict, Any, List, Tuple
 from dataclasses import dataclass
 from datetime import datetime
 
+from backend.core.execution.process_utils import run_capped
+
 # Import security config
 from backend.config.security import (
     SecurityLevel,
@@ -137,6 +139,73 @@ class SafeExecutor:
         else:
             return self._execute_direct(command, context)
     
+    def execute_batch(
+        self, 
+        commands: List[str], 
+        context: ExecutionContext = None
+    ) -> List[Tuple[bool, str]]:
+        """
+        Esegue un piano di comandi: validazione per singolo comando, poi
+        un'unica invocazione del container per tutto il batch.
+        
+        Args:
+            commands: Comandi bash da eseguire in ordine
+            context: Contesto di esecuzione opzionale
+            
+        Returns:
+            Lista di tuple (success, output/error), una per comando
+            
+        Raises:
+            SecurityViolation: Se un comando viola le policy (nessuno viene eseguito)
+        """
+        if context is None:
+            context = ExecutionContext()
+        
+        self._execution_count += len(commands)
+        
+        # === STEP 1: Security Check (tutto il piano prima di eseguire) ===
+        for command in commands:
+            try:
+                self._security_check(command, context)
+            except SecurityViolation as e:
+                self._blocked_count += 1
+                log_security_event(
+                    event_type="VIOLATION",
+                    command=command,
+                    reason=e.reason,
+                    blocked=True
+                )
+                raise
+        
+        # === STEP 2: Audit Log ===
+        for command in commands:
+            log_security_event(
+                event_type="EXECUTE",
+                command=command,
+                reason=f"Approved by {context.actor} (batch)",
+                blocked=False
+            )
+        
+        # === STEP 3: Esecuzione ===
+        if context.sandbox_mode:
+            try:
+                from backend.core.execution.container_sandbox import run_commands_in_sandbox
+            except ImportError:
+                logger.warning("[SafeExecutor] Sandbox not available, falling back to direct execution")
+            else:
+                try:
+                    outputs = run_commands_in_sandbox(
+                        commands,
+                        network=context.allow_network,
+                        timeout=context.timeout
+                    )
+                    return [(True, output) for output in outputs]
+                except Exception as e:
+                    logger.error(f"[SafeExecutor] Sandbox batch execution failed: {e}")
+                    return [(False, f"[SANDBOX ERROR] {str(e)}")] * len(commands)
+        
+        return [self._execute_direct(command, context) for command in commands]
+    
     def _security_check(self, command: str, context: ExecutionContext) -> None:
         """
         Esegue tutti i controlli di sicurezza.
@@ -196,21 +265,21 @@ class SafeExecutor:
         logger.info(f"[SafeExecutor] Direct execution: {command[:80]}...")
         
         try:
-            result = subprocess.run(
+            # Al timeout viene terminato l'intero albero (SIGTERM → SIGKILL);
+            # output in un buffer limitato, decodificato una volta alla fine
+            result = run_capped(
                 command,
                 shell=True,
                 executable="/bin/bash",
-                capture_output=True,
-                text=True,
                 timeout=context.timeout,
                 cwd=os.path.expanduser("~")
             )
             
             if result.returncode == 0:
-                output = result.stdout.strip() or "[No output]"
+                output = result.stdout.decode("utf-8", "replace").strip() or "[No output]"
                 return (True, output)
             else:
-                error = result.stderr.strip() or f"Exit code: {result.returncode}"
+                error = result.stderr.decode("utf-8", "replace").strip() or f"Exit code: {result.returncode}"
                 return (False, f"[ERROR] {error}")
                 
         except subprocess.TimeoutExpired:
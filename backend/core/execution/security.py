@@ -1,64 +1,150 @@
 import ast
+import hashlib
 import logging
+import threading
+from collections import OrderedDict
+
+try:
+    import ahocorasick
+    AHOCORASICK_AVAILABLE = True
+except ImportError:
+    AHOCORASICK_AVAILABLE = False
 
 logger = logging.getLogger('SecurityValidator')
 
+# Esiti di validate_code memorizzati per digest del codice
+VALIDATION_CACHE_SIZE = 512
+
+
+def _build_automaton(words):
+    """Automa Aho-Corasick: tutte le sottostringhe cercate in una sola passata"""
+    if not AHOCORASICK_AVAILABLE:
+        return None
+    automaton = ahocorasick.Automaton()
+    for word in words:
+        automaton.add_word(word, word)
+    automaton.make_automaton()
+    return automaton
+
+
+def _first_match(automaton, words, text):
+    """Prima parola di `words` contenuta in `text`, o None"""
+    if automaton is not None:
+        for _, word in automaton.iter(text):
+            return word
+        return None
+    return next((word for word in words if word in text), None)
+
+
+class _Violation(Exception):
+    """Interrompe la visita dell'AST alla prima violazione"""
+    def __init__(self, reason: str):
+        super().__init__(reason)
+        self.reason = reason
+
+
+class _ViolationVisitor(ast.NodeVisitor):
+    """Visita l'AST con dispatch per tipo di nodo; solleva _Violation al primo problema"""
+
+    def __init__(self, validator: "SecurityValidator"):
+        self.v = validator
+
+    def visit_Import(self, node):
+        # 1. Controllo Import
+        for alias in node.names:
+            if self.v._is_prohibited_module(alias.name):
+                raise _Violation(f"Prohibited module import: {alias.name}")
+
+    visit_ImportFrom = visit_Import
+
+    def visit_Call(self, node):
+        # 2. Controllo Chiamate Funzioni
+        func = node.func
+        if isinstance(func, ast.Name):
+            if func.id in self.v.PROHIBITED_CALLS:
+                raise _Violation(f"Prohibited function call: {func.id}")
+        elif isinstance(func, ast.Attribute):
+            if func.attr in self.v.PROHIBITED_CALLS:
+                raise _Violation(f"Prohibited method call: {func.attr}")
+        self.generic_visit(node)
+
+    def visit_Constant(self, node):
+        # 3. Controllo Stringhe (Path sensibili)
+        if isinstance(node.value, str):
+            path = _first_match(self.v._PATH_AC, self.v.UNSAFE_PATHS, node.value)
+            if path is not None:
+                raise _Violation(f"Prohibited path string: {path}")
+
+
 class SecurityValidator:
     """
     Validatore statico del codice (The Gatekeeper).
     Usa AST per bloccare operazioni proibite prima dell'esecuzione.
     """
     
-    PROHIBITED_IMPORTS = [
+    PROHIBITED_IMPORTS = frozenset({
         'os.system', 'subprocess', 'pty', 'tty', 
         'platform', 'ctypes', 'tkinter'
-    ]
+    })
     
-    PROHIBITED_CALLS = [
+    PROHIBITED_CALLS = frozenset({
         'system', 'popen', 'spawn', 'fork', 'exec', 
         'eval', 'execfile'
-    ]
+    })
     
-    UNSAFE_PATHS = [
+    UNSAFE_PATHS = (
         '/etc/passwd', '/etc/shadow', '/root', '/var/run/docker.sock'
-    ]
+    )
+    
+    # Automi costruiti una volta al caricamento della classe
+    _IMPORT_AC = _build_automaton(PROHIBITED_IMPORTS)
+    _PATH_AC = _build_automaton(UNSAFE_PATHS)
+
+    def __init__(self, cache_size: int = VALIDATION_CACHE_SIZE):
+        # LRU digest -> (is_safe, reason): gli agenti ripropongono spesso lo stesso script
+        self._cache: "OrderedDict[bytes, tuple[bool, str]]" = OrderedDict()
+        self._cache_size = cache_size
+        self._cache_lock = threading.Lock()
 
     def validate_code(self, code: str) -> tuple[bool, str]:
         """
         Analizza il codice Python.
         Return: (is_safe: bool, reason: str)
         """
+        digest = hashlib.blake2b(code.encode("utf-8", "surrogatepass"), digest_size=16).digest()
+        with self._cache_lock:
+            cached = self._cache.get(digest)
+            if cached is not None:
+                self._cache.move_to_end(digest)
+                return cached
+        
+        result = self._validate_uncached(code)
+        with self._cache_lock:
+            self._cache[digest] = result
+            if len(self._cache) > self._cache_size:
+                self._cache.popitem(last=False)
+        return result
+
+    def clear_cache(self):
+        """Svuota la cache (da chiamare se cambiano le regole di validazione)"""
+        with self._cache_lock:
+            self._cache.clear()
+
+    def _validate_uncached(self, code: str) -> tuple[bool, str]:
         try:
             tree = ast.parse(code)
         except SyntaxError as e:
             return False, f"Syntax Error: {e}"
 
-        for node in ast.walk(tree):
-            # 1. Controllo Import
-            if isinstance(node, (ast.Import, ast.ImportFrom)):
-                for alias in node.names:
-                    if self._is_prohibited_module(alias.name):
-                        return False, f"Prohibited module import: {alias.name}"
-
-            # 2. Controllo Chiamate Funzioni
-            if isinstance(node, ast.Call):
-                if isinstance(node.func, ast.Name):
-                    if node.func.id in self.PROHIBITED_CALLS:
-                        return False, f"Prohibited function call: {node.func.id}"
-                elif isinstance(node.func, ast.Attribute):
-                    if node.func.attr in self.PROHIBITED_CALLS:
-                        return False, f"Prohibited method call: {node.func.attr}"
-
-            # 3. Controllo Stringhe (Path sensibili)
-            if isinstance(node, ast.Constant) and isinstance(node.value, str):
-                for path in self.UNSAFE_PATHS:
-                    if path in node.value:
-                        return False, f"Prohibited path string: {path}"
+        try:
+            _ViolationVisitor(self).visit(tree)
+        except _Violation as v:
+            return False, v.reason
 
         return True, "Code is safe"
 
     def _is_prohibited_module(self, module_name):
-        return any(proh in module_name for proh in self.PROHIBITED_IMPORTS)
+        return _first_match(self._IMPORT_AC, self.PROHIBITED_IMPORTS, module_name) is not None
 
 # Singleton
 _security_validator = SecurityValidator()
@@ -1,8 +1,17 @@
 import os
 import sys
+import copy
+import atexit
+import inspect
+import contextvars
 import json
+import hashlib
 import logging
 import time
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from itertools import groupby
 import autogen
 from typing import Dict, List, Optional, Tuple, Any
 from dotenv import load_dotenv
@@ -144,16 +153,57 @@ GhostBrain_AI_Assistant.register_for_execution(
     )
 )
 
+# Più tool call nello stesso messaggio girano in parallelo: il turno costa
+# max(latenze) invece della somma. Le scritture sul grafo restano serializzate
+# da _graph_lock
+_TOOL_POOL = ThreadPoolExecutor(max_workers=8, thread_name_prefix="ghostbrain-tool")
+atexit.register(_TOOL_POOL.shutdown, wait=False)
+
+def _parallel_tool_calls_reply(agent, messages=None, sender=None, config=None):
+    """
+    Come ConversableAgent.generate_tool_calls_reply, ma esegue le tool call
+    su _TOOL_POOL. Le risposte mantengono l'ordine delle chiamate.
+    """
+    if messages is None:
+        messages = agent._oai_messages[sender]
+    tool_calls = messages[-1].get("tool_calls") or []
+    function_map = agent.function_map
+    if len(tool_calls) < 2 or any(
+            inspect.iscoroutinefunction(function_map.get(call.get("function", {}).get("name")))
+            for call in tool_calls):
+        # Chiamata singola o tool async: implementazione originale
+        return autogen.ConversableAgent.generate_tool_calls_reply(agent, messages, sender, config)
+    
+    # Un contesto per chiamata: l'IOStream di autogen è una ContextVar
+    futures = [
+        _TOOL_POOL.submit(contextvars.copy_context().run, agent.execute_function, call.get("function", {}))
+        for call in tool_calls
+    ]
+    tool_returns = []
+    for call, future in zip(tool_calls, futures):
+        _, func_return = future.result()
+        response = {"role": "tool", "content": func_return.get("content") or ""}
+        if call.get("id") is not None:
+            response["tool_call_id"] = call["id"]
+        tool_returns.append(response)
+    return True, {
+        "role": "tool",
+        "tool_responses": tool_returns,
+        "content": "\n\n".join(str(response["content"]) for response in tool_returns),
+    }
+
+GhostBrain_AI_Assistant.replace_reply_func(
+    autogen.ConversableAgent.generate_tool_calls_reply,
+    _parallel_tool_calls_reply
+)
+
 # === 5. DEDUPLICA TESTI ===
 def clean_duplicates(text: str) -> str:
-    if not isinstance(text, str):
+    # Righe vuote scartate, righe consecutive identiche collassate
+    try:
+        return "\n".join(line for line, _ in groupby(filter(None, (l.strip() for l in text.splitlines()))))
+    except (AttributeError, TypeError):
         return str(text)
-    lines = [l.strip() for l in text.splitlines() if l.strip()]
-    result = []
-    for line in lines:
-        if not result or line != result[-1]:
-            result.append(line)
-    return "\n".join(result)
 
 # === 6. RECUPERA MODELLO ===
 def get_model_name():
@@ -165,6 +215,166 @@ def get_model_name():
         log_info(f"[ERRORE] Estrazione modello: {e}")
     return "N/A"
 
+# === CLIENT LLM CONDIVISO ===
+# Un solo client per processo: le chiamate riusano il pool di connessioni
+# httpx (e le sessioni TLS) invece di rifare handshake a ogni richiesta
+_llm_client = None
+_llm_client_lock = threading.Lock()
+
+def _get_llm_client():
+    """Restituisce il client OpenAI condiviso (None se manca OPENAI_API_KEY)."""
+    global _llm_client
+    client = _llm_client
+    if client is not None:
+        return client
+    with _llm_client_lock:
+        if _llm_client is None:
+            api_key = os.getenv('OPENAI_API_KEY')
+            if not api_key:
+                return None
+            from openai import OpenAI
+            import httpx
+            _llm_client = OpenAI(
+                api_key=api_key,
+                base_url=os.getenv('OPENAI_BASE_URL', 'https://api.deepseek.com/v1/'),
+                timeout=30.0,
+                http_client=httpx.Client(
+                    timeout=30.0,
+                    limits=httpx.Limits(max_connections=32, max_keepalive_connections=16)
+                )
+            )
+        return _llm_client
+
+def reset_llm_client():
+    """Chiude il client condiviso: il prossimo uso rilegge l'env (es. dopo load_dotenv)."""
+    global _llm_client
+    with _llm_client_lock:
+        client, _llm_client = _llm_client, None
+    if client is not None:
+        try:
+            client.close()
+        except Exception as e:
+            log_info(f"[ERRORE] Chiusura client LLM: {e}")
+
+# === CACHE RISPOSTE LLM ===
+LLM_CACHE_TTL = 300.0
+LLM_CACHE_SIZE = 2000
+
+class _LLMCache:
+    """
+    Cache LRU+TTL delle risposte LLM, thread-safe.
+    Chiave: blake2b di (tipo chiamata, modello, temperatura, max_tokens, prompt, schema).
+    """
+    
+    def __init__(self, max_entries: int = LLM_CACHE_SIZE, ttl: float = LLM_CACHE_TTL):
+        self._entries: "OrderedDict[bytes, Tuple[float, Any]]" = OrderedDict()
+        self._max_entries = max_entries
+        self._ttl = ttl
+        self._lock = threading.RLock()
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+    
+    @staticmethod
+    def make_key(kind: str, model: str, temperature: float, max_tokens: int,
+                 prompt: str, schema: Optional[dict] = None) -> bytes:
+        schema_json = json.dumps(schema, sort_keys=True) if schema is not None else ""
+        raw = f"{kind}|{model}|{temperature}|{max_tokens}|{prompt}|{schema_json}"
+        return hashlib.blake2b(raw.encode("utf-8", "surrogatepass"), digest_size=16).digest()
+    
+    def get(self, key: bytes) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    del self._entries[key]
+                    self._evictions += 1
+                self._misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self._hits += 1
+            return entry[1]
+    
+    def put(self, key: bytes, value: Any) -> None:
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self._ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self._max_entries:
+                self._entries.popitem(last=False)
+                self._evictions += 1
+    
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+    
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                "entries": len(self._entries),
+                "hits": self._hits,
+                "misses": self._misses,
+                "evictions": self._evictions,
+                "hit_rate": self._hits / lookups if lookups else 0.0,
+            }
+
+_llm_cache = _LLMCache()
+
+def get_llm_cache_stats() -> Dict[str, Any]:
+    """Statistiche della cache risposte LLM (hits/misses/evictions/hit_rate)"""
+    return _llm_cache.get_stats()
+
+def clear_llm_cache() -> None:
+    """Svuota la cache risposte LLM"""
+    _llm_cache.clear()
+
+def _extract_first_json_object(text: str, start: int = 0) -> Optional[str]:
+    """
+    Primo oggetto {...} bilanciato in text, in una sola passata: conta la
+    profondità delle graffe ignorando quelle dentro le stringhe JSON.
+    """
+    start = text.find("{", start)
+    if start < 0:
+        return None
+    depth = 0
+    in_str = False
+    esc = False
+    for i in range(start, len(text)):
+        ch = text[i]
+        if in_str:
+            if esc:
+                esc = False
+            elif ch == "\\":
+                esc = True
+            elif ch == '"':
+                in_str = False
+        elif ch == '"':
+            in_str = True
+        elif ch == "{":
+            depth += 1
+        elif ch == "}":
+            depth -= 1
+            if depth == 0:
+                return text[start:i + 1]
+    return None
+
+def _extract_json_from_text(text: str) -> Optional[Any]:
+    """JSON circondato da testo: prima dalla prima '{' all'ultima '}', poi scansione bilanciata"""
+    start, end = text.find("{"), text.rfind("}")
+    if start < 0 or end < start:
+        return None
+    try:
+        return json.loads(text[start:end + 1])
+    except json.JSONDecodeError:
+        pass
+    candidate = _extract_first_json_object(text, start)
+    if candidate is None:
+        return None
+    try:
+        return json.loads(candidate)
+    except json.JSONDecodeError:
+        return None
+
 # === 8. CHIAMATA DIRETTA CON JSON OUTPUT (COMPATIBILE DEEPSEEK) ===
 def call_llm_structured(
     prompt: str, 
@@ -176,24 +386,23 @@ def call_llm_structured(
     Chiama direttamente il modello richiedendo JSON (compatibile DeepSeek).
     NOTA: schema viene usato solo per documentazione, non per validation strict.
     """
-    from openai import OpenAI
-    import json
-    import re
-    
-    api_key = os.getenv('OPENAI_API_KEY')
-    base_url = os.getenv('OPENAI_BASE_URL', 'https://api.deepseek.com/v1/')
     model_name = os.getenv('MODEL_NAME', 'deepseek-chat')
+    client = _get_llm_client()
     
-    if not api_key:
+    if client is None:
         log_info("[CRITICO] OPENAI_API_KEY non trovata!")
         return None
     
+    # Prompt identici (frequenti nei loop dell'agente) non rifanno il round trip
+    cache_key = _LLMCache.make_key("structured", model_name, temperature, max_tokens, prompt, schema)
+    cached = _llm_cache.get(cache_key)
+    if cached is not None:
+        return copy.deepcopy(cached)
+    
     from tools.monitoring import metrics_collector
     start_time = time.time()
     
     try:
-        client = OpenAI(api_key=api_key, base_url=base_url, timeout=30.0)
-        
         # 🔧 Controlla se il modello supporta structured output
         # deepseek-reasoner non supporta response_format json_object
         models_without_structured = ['deepseek-reasoner', 'reasoner']
@@ -234,14 +443,16 @@ def call_llm_structured(
         
         # Prova a parsare JSON (potrebbe essere testo con JSON dentro)
         try:
-            return json.loads(result)
+            parsed = json.loads(result)
         except json.JSONDecodeError:
             # Prova a estrarre JSON da testo (se il modello ha aggiunto testo)
-            json_match = re.search(r'\{[^{}]*(?:\{[^{}]*\}[^{}]*)*\}', result, re.DOTALL)
-            if json_match:
-                return json.loads(json_match.group(0))
-            log_info(f"[ERRORE] JSON output: Nessun JSON valido trovato in: {result[:100]}")
-            return None
+            parsed = _extract_json_from_text(result)
+            if parsed is None:
+                log_info(f"[ERRORE] JSON output: Nessun JSON valido trovato in: {result[:100]}")
+                return None
+        
+        _llm_cache.put(cache_key, copy.deepcopy(parsed))
+        return parsed
         
     except Exception as e:
         duration = time.time() - start_time
@@ -260,19 +471,22 @@ def call_llm_streaming(
     Chiama il modello con streaming per feedback in tempo reale.
     callback(chunk): funzione chiamata per ogni chunk di testo
     """
-    from openai import OpenAI
-    
-    api_key = os.getenv('OPENAI_API_KEY')
-    base_url = os.getenv('OPENAI_BASE_URL', 'https://api.deepseek.com/v1/')
     model_name = os.getenv('MODEL_NAME', 'deepseek-chat')
+    client = _get_llm_client()
     
-    if not api_key:
+    if client is None:
         log_info("[CRITICO] OPENAI_API_KEY non trovata!")
         return ""
     
+    # Hit: la risposta già assemblata viene consegnata al callback in un colpo solo
+    cache_key = _LLMCache.make_key("streaming", model_name, temperature, max_tokens, prompt)
+    cached = _llm_cache.get(cache_key)
+    if cached is not None:
+        if callback:
+            callback(cached)
+        return cached
+    
     try:
-        client = OpenAI(api_key=api_key, base_url=base_url, timeout=30.0)
-        
         stream = client.chat.completions.create(
             model=model_name,
             messages=[
@@ -292,6 +506,8 @@ def call_llm_streaming(
                 if callback:
                     callback(content)
         
+        if full_response:
+            _llm_cache.put(cache_key, full_response)
         return full_response
         
     except Exception as e:
@@ -7,7 +7,8 @@ Memorizza host, servizi e relazioni per abilitare ragionamento laterale.
 import os
 import json
 import time
-from collections import deque
+import atexit
+from collections import defaultdict, deque
 from threading import RLock
 from typing import Dict, List, Optional
 
@@ -15,42 +16,134 @@ PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..
 DATA_PATH = os.path.join(PROJECT_ROOT, "data")
 GRAPH_DIR = os.path.join(DATA_PATH, "graph")
 GRAPH_PATH = os.path.join(GRAPH_DIR, "knowledge_graph.json")
+# Mutazioni successive all'ultimo snapshot, una riga JSON ciascuna
+GRAPH_LOG_PATH = os.path.join(GRAPH_DIR, "knowledge_graph.log")
+
+# Snapshot completo al massimo ogni N mutazioni o S secondi (il log copre il resto)
+SNAPSHOT_EVERY_MUTATIONS = 50
+SNAPSHOT_INTERVAL = 5.0
+MAX_EDGES = 2000
 
 _graph_lock = RLock()
 _graph_data = None  # Lazy load
+_dirty_count = 0
+_last_snapshot_ts = 0.0
+# Adiacenza derivata dagli edges: ricostruita solo se gli edges sono cambiati
+_adjacency_version = 0
+_adjacency_cache = None
+_adjacency_cache_version = -1
 
 
 def _default_graph():
     return {
         "nodes": {},  # node_id -> {"label": str, "attributes": {...}, "updated_at": ts}
         "edges": [],  # list of {"source": str, "target": str, "relation": str, "metadata": {...}, "timestamp": ts}
-        "version": 1
+        "version": 1,
+        "seq": 0      # ultima mutazione inclusa nello snapshot
     }
 
 
+def _apply_event(event: Dict):
+    global _adjacency_version
+    op = event.get("op")
+    if op == "node":
+        _graph_data["nodes"][event["id"]] = event["node"]
+    elif op == "edge":
+        _graph_data["edges"].append(event["edge"])
+        if len(_graph_data["edges"]) > MAX_EDGES:
+            del _graph_data["edges"][:-MAX_EDGES]
+        _adjacency_version += 1
+    _graph_data["seq"] = event["seq"]
+
+
+def _replay_log():
+    """Riapplica le mutazioni del log successive allo snapshot."""
+    if not os.path.exists(GRAPH_LOG_PATH):
+        return
+    snapshot_seq = _graph_data.get("seq", 0)
+    with open(GRAPH_LOG_PATH, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                event = json.loads(line)
+            except ValueError:
+                break  # Ultima riga troncata da un crash
+            if event.get("seq", 0) > snapshot_seq:
+                _apply_event(event)
+
+
 def _load_graph():
-    global _graph_data
+    global _graph_data, _last_snapshot_ts
     if _graph_data is not None:
         return
-    os.makedirs(GRAPH_DIR, exist_ok=True)
-    if os.path.exists(GRAPH_PATH):
-        try:
-            with open(GRAPH_PATH, "r", encoding="utf-8") as f:
-                _graph_data = json.load(f)
-        except Exception:
+    with _graph_lock:
+        if _graph_data is not None:
+            return
+        os.makedirs(GRAPH_DIR, exist_ok=True)
+        if os.path.exists(GRAPH_PATH):
+            try:
+                with open(GRAPH_PATH, "r", encoding="utf-8") as f:
+                    _graph_data = json.load(f)
+                _graph_data.setdefault("seq", 0)
+            except Exception:
+                _graph_data = _default_graph()
+        else:
             _graph_data = _default_graph()
-    else:
-        _graph_data = _default_graph()
+        try:
+            _replay_log()
+        except OSError:
+            pass
+        _last_snapshot_ts = time.time()
 
 
-def _save_graph():
-    if _graph_data is None:
-        return
+def _append_event(event: Dict):
+    """Registra una mutazione in coda al log (O_APPEND: una write per evento)."""
+    with open(GRAPH_LOG_PATH, "a", encoding="utf-8") as f:
+        f.write(json.dumps(event, ensure_ascii=False, separators=(",", ":")) + "\n")
+
+
+def _write_snapshot():
+    global _dirty_count, _last_snapshot_ts
     os.makedirs(GRAPH_DIR, exist_ok=True)
     tmp_path = GRAPH_PATH + ".tmp"
     with open(tmp_path, "w", encoding="utf-8") as f:
-        json.dump(_graph_data, f, ensure_ascii=False, indent=2)
+        json.dump(_graph_data, f, ensure_ascii=False, separators=(",", ":"))
     os.replace(tmp_path, GRAPH_PATH)
+    # Dopo il replace: un crash prima del troncamento lascia solo eventi con
+    # seq <= snapshot, che il replay salta
+    with open(GRAPH_LOG_PATH, "w", encoding="utf-8"):
+        pass
+    _dirty_count = 0
+    _last_snapshot_ts = time.time()
+
+
+def _save_graph(event: Optional[Dict] = None):
+    """
+    Persiste una mutazione: append sul log e snapshot completo solo ogni
+    SNAPSHOT_EVERY_MUTATIONS mutazioni o SNAPSHOT_INTERVAL secondi.
+    Da chiamare con _graph_lock acquisito.
+    """
+    global _dirty_count
+    if _graph_data is None:
+        return
+    os.makedirs(GRAPH_DIR, exist_ok=True)
+    if event is not None:
+        event["seq"] = _graph_data.get("seq", 0) + 1
+        _apply_event(event)
+        _append_event(event)
+        _dirty_count += 1
+    if _dirty_count >= SNAPSHOT_EVERY_MUTATIONS or (
+            _dirty_count and time.time() - _last_snapshot_ts >= SNAPSHOT_INTERVAL):
+        _write_snapshot()
+
+
+def flush_graph():
+    """Scrive subito lo snapshot se ci sono mutazioni solo nel log (registrata con atexit)."""
+    with _graph_lock:
+        if _graph_data is not None and _dirty_count:
+            _write_snapshot()
+
+
+atexit.register(flush_graph)
 
 
 def _upsert_node(node_id: str, label: str, attributes: Optional[Dict] = None):
@@ -63,8 +156,7 @@ def _upsert_node(node_id: str, label: str, attributes: Optional[Dict] = None):
             node["attributes"].update({k: v for k, v in attributes.items() if v is not None})
         node["label"] = label or node.get("label", "entity")
         node["updated_at"] = time.time()
-        _graph_data["nodes"][node_id] = node
-        _save_graph()
+        _save_graph({"op": "node", "id": node_id, "node": node})
 
 
 def _add_edge(source: str, relation: str, target: str, metadata: Optional[Dict] = None):
@@ -80,11 +172,8 @@ def _add_edge(source: str, relation: str, target: str, metadata: Optional[Dict]
             "metadata": metadata,
             "timestamp": time.time()
         }
-        _graph_data["edges"].append(edge)
-        # Limita edges per evitare crescita infinita
-        if len(_graph_data["edges"]) > 2000:
-            _graph_data["edges"] = _graph_data["edges"][-2000:]
-        _save_graph()
+        # Limite a MAX_EDGES applicato da _apply_event (anche nel replay)
+        _save_graph({"op": "edge", "edge": edge})
 
 
 def record_host_observation(ip: str, hostname: Optional[str] = None, vendor: Optional[str] = None,
@@ -145,6 +234,35 @@ def get_graph_summary_text(limit_nodes: int = 15, limit_edges: int = 25) -> str:
     return "\n".join(summary)
 
 
+def _get_adjacency():
+    """Adiacenza source -> [(target, relation)], dalla cache se gli edges non sono cambiati."""
+    global _adjacency_cache, _adjacency_cache_version
+    if _adjacency_cache is None or _adjacency_cache_version != _adjacency_version:
+        adjacency = defaultdict(list)
+        for edge in _graph_data["edges"]:
+            adjacency[edge["source"]].append((edge["target"], edge["relation"]))
+        _adjacency_cache = adjacency
+        _adjacency_cache_version = _adjacency_version
+    return _adjacency_cache
+
+
+def _path_contains(entry, node: str) -> bool:
+    while entry is not None:
+        if entry[0] == node:
+            return True
+        entry = entry[2]
+    return False
+
+
+def _unwind_path(entry) -> List[str]:
+    hops = []
+    while entry is not None:
+        node, relation, entry, _depth = entry
+        hops.append(f"{relation}:{node}" if relation else node)
+    hops.reverse()
+    return hops
+
+
 def find_paths_between_hosts(source_ip: str, target_ip: str, max_depth: int = 4, max_paths: int = 3) -> str:
     source_node = f"host:{source_ip}"
     target_node = f"host:{target_ip}"
@@ -155,28 +273,29 @@ def find_paths_between_hosts(source_ip: str, target_ip: str, max_depth: int = 4,
     if target_node not in _graph_data["nodes"]:
         return f"[GRAPH] Host destinazione non presente nel grafo: {target_ip}"
 
-    adjacency = {}
-    for edge in _graph_data["edges"]:
-        adjacency.setdefault(edge["source"], []).append((edge["target"], edge["relation"], edge.get("metadata", {})))
+    with _graph_lock:
+        adjacency = _get_adjacency()
 
+    # Voci della coda: (nodo, relazione, voce genitore, profondità). I percorsi
+    # condividono il prefisso invece di copiare una lista a ogni espansione
     paths = []
-    queue = deque([(source_node, [source_node])])
-    visited = {source_node}
+    queue = deque([(source_node, None, None, 0)])
 
     while queue and len(paths) < max_paths:
-        current, path = queue.popleft()
-        if len(path) > max_depth + 1:
+        entry = queue.popleft()
+        current, _relation, _parent, depth = entry
+        if depth >= max_depth:
             continue
-        for neighbor, relation, metadata in adjacency.get(current, []):
-            if neighbor in path:
+        for neighbor, relation in adjacency.get(current, ()):
+            if _path_contains(entry, neighbor):
                 continue
-            new_path = path + [f"{relation}:{neighbor}"]
+            hop = (neighbor, relation, entry, depth + 1)
             if neighbor == target_node:
-                paths.append(new_path)
+                paths.append(_unwind_path(hop))
                 if len(paths) >= max_paths:
                     break
             else:
-                queue.append((neighbor, path + [neighbor]))
+                queue.append(hop)
 
     if not paths:
         return "[GRAPH] Nessun percorso trovato tra gli host."
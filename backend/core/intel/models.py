@@ -6,11 +6,15 @@ All sources (CISA, NVD, ExploitDB) normalize to VulnArtifact.
 """
 
 from dataclasses import dataclass, field, asdict
-from datetime import datetime
-from typing import Dict, Any, Optional, List
+from datetime import datetime, timezone
+from typing import Dict, Any, Iterable, Optional, List
 from enum import Enum
 
 
+# NVD severity -> priority bonus
+_NVD_BONUS = {"CRITICAL": 40, "HIGH": 30, "MEDIUM": 15}
+
+
 class VulnStatus(Enum):
     """Vulnerability triage status."""
     NEW = "NEW"
@@ -57,15 +61,35 @@ class VulnArtifact:
     known_ransomware: bool = False
     exploitation_activity: str = ""
     
-    def calculate_priority(self) -> float:
+    # (date_added, parsed datetime) of the last parse. Left unannotated so it
+    # is not a dataclass field: asdict()/to_dict() never see it.
+    _date_added_cache = None
+    
+    def _parsed_date_added(self) -> Optional[datetime]:
+        """date_added as a datetime, parsed once per distinct value."""
+        cache = self._date_added_cache
+        if cache is not None and cache[0] == self.date_added:
+            return cache[1]
+        try:
+            parsed = datetime.fromisoformat(self.date_added.replace("Z", "+00:00"))
+        except (ValueError, TypeError, AttributeError):
+            parsed = None
+        self._date_added_cache = (self.date_added, parsed)
+        return parsed
+    
+    def calculate_priority(self, now: Optional[datetime] = None) -> float:
         """
         Calculate priority score based on intel sources.
         
         Rules:
         - CISA KEV listed = 100 (CRITICAL - actively exploited)
         - Known ransomware = +20
-        - NVD severity HIGH/CRITICAL = +30
+        - NVD severity CRITICAL/HIGH/MEDIUM = +40/+30/+15
         - Recent (< 30 days) = +10
+        
+        Args:
+            now: Reference time for the recency bonus (aware); pass it when
+                 scoring many artifacts, see score_batch()
         """
         score = self.risk_score
         
@@ -79,26 +103,27 @@ class VulnArtifact:
         
         # NVD severity
         nvd_sev = self.sources.get("nvd_severity", "").upper()
-        if nvd_sev == "CRITICAL":
-            score = min(100.0, score + 40)
-        elif nvd_sev == "HIGH":
-            score = min(100.0, score + 30)
-        elif nvd_sev == "MEDIUM":
-            score = min(100.0, score + 15)
+        score = min(100.0, score + _NVD_BONUS.get(nvd_sev, 0))
         
         # Recency bonus
         if self.date_added:
-            try:
-                added = datetime.fromisoformat(self.date_added.replace("Z", "+00:00"))
-                days_old = (datetime.now(added.tzinfo) - added).days
+            added = self._parsed_date_added()
+            if added is not None:
+                if added.tzinfo is None:
+                    added = added.astimezone()  # Naive dates are local time
+                days_old = ((now or datetime.now(timezone.utc)) - added).days
                 if days_old < 30:
                     score = min(100.0, score + 10)
-            except (ValueError, TypeError):
-                pass
         
         self.risk_score = score
         return score
     
+    @classmethod
+    def score_batch(cls, artifacts: Iterable["VulnArtifact"]) -> List[float]:
+        """Recalculate priority for many artifacts against a single 'now'."""
+        now = datetime.now(timezone.utc)
+        return [artifact.calculate_priority(now) for artifact in artifacts]
+    
     def to_dict(self) -> Dict[str, Any]:
         """Serialize to dictionary for JSON storage."""
         data = asdict(self)
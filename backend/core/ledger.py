@@ -17,6 +17,15 @@ from typing import Dict, Any, List, Optional
 from datetime import datetime
 
 
+def new_event_id() -> str:
+    """Generate a ledger event ID (usable before the event is written)."""
+    return uuid.uuid4().hex[:12]
+
+
+# Default for record(run_id=...): use the run active when the event is written
+ACTIVE_RUN: Any = object()
+
+
 class ExecutionLedger:
     """
     Append-only ledger for recording all system events.
@@ -47,6 +56,11 @@ class ExecutionLedger:
         # Current run_id (set per mission)
         self._current_run_id: Optional[str] = None
     
+    @property
+    def current_run_id(self) -> Optional[str]:
+        """ID of the active run (None outside of a mission)."""
+        return self._current_run_id
+    
     def start_run(self, objective: str = "") -> str:
         """Start a new run/mission and return its ID."""
         self._current_run_id = f"run_{uuid.uuid4().hex[:8]}"
@@ -70,7 +84,10 @@ class ExecutionLedger:
         actor: str, 
         event_type: str, 
         data: Dict[str, Any], 
-        correlation_id: Optional[str] = None
+        correlation_id: Optional[str] = None,
+        event_id: Optional[str] = None,
+        timestamp: Optional[float] = None,
+        run_id: Any = ACTIVE_RUN
     ) -> str:
         """
         Record an event to the ledger (atomic, append-only).
@@ -80,18 +97,26 @@ class ExecutionLedger:
             event_type: TOOL_CALL, TOOL_OUTPUT, CHAT, DECISION, ERROR
             data: Event-specific data (command, output, content, etc.)
             correlation_id: Links this event to a previous event (e.g., output to call)
+            event_id: Pre-assigned ID (for writers that record asynchronously)
+            timestamp: When the event happened, if recorded later (default: now)
+            run_id: Run the event belongs to, captured by asynchronous writers when
+                the event is queued (default: the run active now)
             
         Returns:
             event_id: Unique identifier for this event
         """
-        event_id = uuid.uuid4().hex[:12]
-        timestamp = time.time()
+        if event_id is None:
+            event_id = new_event_id()
+        if timestamp is None:
+            timestamp = time.time()
+        if run_id is ACTIVE_RUN:
+            run_id = self._current_run_id
         
         entry = {
             "event_id": event_id,
             "timestamp": timestamp,
             "iso_time": datetime.fromtimestamp(timestamp).isoformat(),
-            "run_id": self._current_run_id,
+            "run_id": run_id,
             "actor": actor,
             "type": event_type,
             "correlation_id": correlation_id,
@@ -243,13 +268,21 @@ def get_ledger() -> ExecutionLedger:
 
 
 # Convenience functions
-def record_tool_call(actor: str, tool: str, command: str, **kwargs) -> str:
+def record_tool_call(
+    actor: str, 
+    tool: str, 
+    command: str, 
+    event_id: Optional[str] = None,
+    timestamp: Optional[float] = None,
+    run_id: Any = ACTIVE_RUN,
+    **kwargs
+) -> str:
     """Record a tool call event."""
     return get_ledger().record(actor, "TOOL_CALL", {
         "tool": tool,
         "command": command[:2000],  # Truncate very long commands
         **kwargs
-    })
+    }, event_id=event_id, timestamp=timestamp, run_id=run_id)
 
 
 def record_tool_output(
@@ -257,6 +290,8 @@ def record_tool_output(
     output: str, 
     status: str = "SUCCESS",
     return_code: int = 0,
+    timestamp: Optional[float] = None,
+    run_id: Any = ACTIVE_RUN,
     **kwargs
 ) -> str:
     """Record a tool output event."""
@@ -266,7 +301,7 @@ def record_tool_output(
         "status": status,
         "return_code": return_code,
         **kwargs
-    }, correlation_id=correlation_id)
+    }, correlation_id=correlation_id, timestamp=timestamp, run_id=run_id)
 
 
 def record_chat(actor: str, content: str, **kwargs) -> str:
@@ -277,9 +312,15 @@ def record_chat(actor: str, content: str, **kwargs) -> str:
     })
 
 
-def record_error(actor: str, error: str, **kwargs) -> str:
+def record_error(
+    actor: str, 
+    error: str, 
+    timestamp: Optional[float] = None,
+    run_id: Any = ACTIVE_RUN,
+    **kwargs
+) -> str:
     """Record an error event."""
     return get_ledger().record(actor, "ERROR", {
         "error": str(error)[:1000],
         **kwargs
-    })
+    }, timestamp=timestamp, run_id=run_id)
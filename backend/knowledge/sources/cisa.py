@@ -10,7 +10,7 @@ Source: https://www.cisa.gov/known-exploited-vulnerabilities-catalog
 import logging
 import requests
 from typing import List, Optional, Tuple
-from datetime import datetime
+from datetime import datetime, timezone
 
 from backend.core.intel.models import VulnArtifact, IntelReport, VulnStatus
 
@@ -67,12 +67,14 @@ def fetch_cisa_kev(limit: Optional[int] = None) -> Tuple[List[VulnArtifact], Int
         if limit:
             vulns = vulns[:limit]
         
+        # One reference time for the whole catalog's recency bonus
+        now = datetime.now(timezone.utc)
         for entry in vulns:
             try:
                 artifact = _parse_cisa_entry(entry)
                 if artifact:
                     # Calculate priority (CISA KEV = automatic 100)
-                    artifact.calculate_priority()
+                    artifact.calculate_priority(now)
                     artifacts.append(artifact)
                     
                     if artifact.risk_score >= 100:
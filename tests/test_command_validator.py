@@ -0,0 +1,49 @@
+import unittest
+from backend.core.command_validator import CommandValidator, CommandHistory
+
+class TestCommandValidator(unittest.TestCase):
+    def setUp(self):
+        self.prompts = []
+        self.validator = CommandValidator(self._llm)
+
+    def _llm(self, prompt):
+        self.prompts.append(prompt)
+        return "curl -v http://192.168.1.6:8008/setup/eureka_info"
+
+    def test_impossible_goal_rejected(self):
+        print("\n[TEST] Impossible Goal")
+        result = self.validator.is_command_appropriate("nmap 192.168.1.6", "Ottieni shell su Google Home", [])
+        self.assertFalse(result["appropriate"])
+        self.assertIn("google home", result["reason"])
+
+    def test_repeated_command_rejected(self):
+        print("\n[TEST] Repeated Command")
+        result = self.validator.is_command_appropriate("nmap -sV 10.0.0.1", "Scansiona il target", ["nmap -sV 10.0.0.1"])
+        self.assertFalse(result["appropriate"])
+
+    def test_suggestion_cached(self):
+        print("\n[TEST] Suggestion Cache")
+        first = self.validator.suggest_better_command("Interroga endpoint http", "nmap 192.168.1.6", "192.168.1.6")
+        second = self.validator.suggest_better_command("interroga  endpoint HTTP", "nmap 192.168.1.6", "192.168.1.6")
+        self.assertEqual(first, second)
+        self.assertEqual(len(self.prompts), 1)
+
+        # Target diverso: niente riuso del suggerimento
+        self.validator.suggest_better_command("Interroga endpoint http", "nmap 192.168.1.7", "192.168.1.7")
+        self.assertEqual(len(self.prompts), 2)
+
+    def test_history_incremental(self):
+        print("\n[TEST] Command History")
+        history = CommandHistory()
+        history.sync(["nmap 10.0.0.1", "curl http://10.0.0.1"])
+        commands, tools = history.sync(["nmap 10.0.0.1", "curl http://10.0.0.1", "nmap -sV 10.0.0.1"])
+        self.assertIn("nmap -sV 10.0.0.1", commands)
+        self.assertEqual(tools["nmap"], 2)
+
+        # Storico non compatibile: indice ricostruito
+        commands, tools = history.sync(["nc -zv 10.0.0.1 22"])
+        self.assertEqual(commands, {"nc -zv 10.0.0.1 22"})
+        self.assertEqual(tools["nmap"], 0)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,92 @@
+import gc
+import time
+import unittest
+import tempfile
+import threading
+import weakref
+from pathlib import Path
+from backend.core.autonomy.goal_tracker import GoalTracker, GoalStatus, GoalPriority, ZSTD_AVAILABLE
+
+class TestGoalTracker(unittest.TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.tracker = GoalTracker(persistence_dir=self._tmp.name)
+        self.mission_id = self.tracker.set_mission("Ottieni root su 10.0.0.1", "test_mission")
+
+    def tearDown(self):
+        self.tracker.flush()
+        self._tmp.cleanup()
+
+    def test_persist_roundtrip(self):
+        print("\n[TEST] Persist Roundtrip")
+        self.tracker.add_subgoal("enum_ports", "Enum ports", "Scopri servizi aperti")
+        self.tracker.mark_achieved("enum_ports", "Trovati: 22, 80")
+        self.tracker.flush()
+
+        loaded = GoalTracker(persistence_dir=self._tmp.name)
+        self.assertTrue(loaded.load_mission(self.mission_id))
+        goal = loaded.state.goals["enum_ports"]
+        self.assertEqual(goal.status, GoalStatus.ACHIEVED)
+        self.assertEqual(len(goal.evidence), 1)
+        self.assertFalse(list(Path(self._tmp.name).glob("*.tmp")))
+        self.assertEqual(loaded.state.get_progress(), 50.0)
+
+    @unittest.skipUnless(ZSTD_AVAILABLE, "zstandard non installato")
+    def test_large_mission_compressed(self):
+        print("\n[TEST] Compressed Checkpoint")
+        for i in range(40):
+            self.tracker.add_subgoal(f"host_{i}", f"Scan host {i}", "Scansione completa delle porte TCP")
+        self.tracker.flush()
+
+        files = [p.name for p in Path(self._tmp.name).iterdir()]
+        self.assertEqual(len(files), 1)
+        self.assertTrue(files[0].endswith(".zst"))
+
+        loaded = GoalTracker(persistence_dir=self._tmp.name)
+        self.assertTrue(loaded.load_mission(self.mission_id))
+        self.assertEqual(len(loaded.state.goals), 41)
+
+    def test_writes_are_batched(self):
+        print("\n[TEST] Batched Writes")
+        self.tracker.flush()
+        self.tracker.add_subgoal("exploit_web", "Exploit web", "Sfrutta la webapp")
+        self.assertTrue(self.tracker._dirty)
+        self.tracker.flush()
+        self.assertFalse(self.tracker._dirty)
+
+    def test_next_action_priority(self):
+        print("\n[TEST] Next Action Priority")
+        self.tracker.mark_blocked("primary", "serve prima la recon")
+        self.tracker.add_subgoal("priv_esc", "Priv esc", "Diventa root", priority=GoalPriority.LOW)
+        self.tracker.add_subgoal("recon_net", "Recon network", "Mappa la rete", priority=GoalPriority.HIGH)
+        action, suggestion = self.tracker.get_next_action()
+        self.assertEqual(action, "enumerate")
+        self.assertIn("Mappa la rete", suggestion)
+
+        self.tracker.mark_achieved("recon_net", "fatto")
+        action, _ = self.tracker.get_next_action()
+        self.assertEqual(action, "privesc")
+    def test_discarded_tracker_collected(self):
+        print("\n[TEST] Discarded Tracker Collected")
+        refs = []
+        for i in range(5):
+            tracker = GoalTracker(persistence_dir=self._tmp.name)
+            tracker.set_mission(f"Missione {i}", f"gc_mission_{i}")
+            tracker._persist_now()  # Scrittura asincrona sul writer condiviso
+            tracker.flush()
+            refs.append(weakref.ref(tracker))
+            del tracker
+        # Il writer rilascia il tracker appena finito il suo turno sulla coda
+        deadline = time.monotonic() + 2.0
+        while True:
+            gc.collect()
+            alive = [ref for ref in refs if ref() is not None]
+            if not alive or time.monotonic() > deadline:
+                break
+            time.sleep(0.01)
+        self.assertEqual(alive, [])
+        writers = [t for t in threading.enumerate() if t.name == "goal-writer"]
+        self.assertLessEqual(len(writers), 1)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,78 @@
+import os
+import json
+import tempfile
+import unittest
+from unittest import mock
+
+from backend.core import graph_manager
+
+
+class TestGraphManager(unittest.TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        graph_dir = self._tmp.name
+        self._patches = [
+            mock.patch.object(graph_manager, "GRAPH_DIR", graph_dir),
+            mock.patch.object(graph_manager, "GRAPH_PATH", os.path.join(graph_dir, "knowledge_graph.json")),
+            mock.patch.object(graph_manager, "GRAPH_LOG_PATH", os.path.join(graph_dir, "knowledge_graph.log")),
+            mock.patch.object(graph_manager, "_graph_data", None),
+            mock.patch.object(graph_manager, "_dirty_count", 0),
+        ]
+        for patch in self._patches:
+            patch.start()
+
+    def tearDown(self):
+        for patch in reversed(self._patches):
+            patch.stop()
+        self._tmp.cleanup()
+
+    def _reload(self):
+        graph_manager._graph_data = None
+        graph_manager._dirty_count = 0
+        graph_manager._load_graph()
+        return graph_manager._graph_data
+
+    def test_log_replay_without_snapshot(self):
+        print("\n[TEST] Graph Log Replay")
+        graph_manager.record_port_observation("10.0.0.5", 22, service="ssh")
+        graph_manager.record_port_observation("10.0.0.5", 80, service="http")
+        self.assertFalse(os.path.exists(graph_manager.GRAPH_PATH))
+
+        graph = self._reload()
+        self.assertIn("service:10.0.0.5:22/tcp", graph["nodes"])
+        self.assertEqual(len(graph["edges"]), 2)
+
+    def test_snapshot_truncates_log(self):
+        print("\n[TEST] Graph Snapshot")
+        for port in range(graph_manager.SNAPSHOT_EVERY_MUTATIONS):
+            graph_manager.record_relationship("host:10.0.0.1", "TALKS_TO", f"host:10.0.0.{port}")
+        self.assertEqual(os.path.getsize(graph_manager.GRAPH_LOG_PATH), 0)
+        with open(graph_manager.GRAPH_PATH, encoding="utf-8") as f:
+            snapshot = json.load(f)
+        self.assertEqual(len(snapshot["edges"]), graph_manager.SNAPSHOT_EVERY_MUTATIONS)
+
+        # Log rimasto da un crash dopo lo snapshot: gli eventi già inclusi vengono saltati
+        with open(graph_manager.GRAPH_LOG_PATH, "w", encoding="utf-8") as f:
+            f.write(json.dumps({"op": "edge", "seq": 1, "edge": {"source": "a", "target": "b", "relation": "X"}}) + "\n")
+            f.write('{"op": "edge", "seq": 99')
+        graph = self._reload()
+        self.assertEqual(len(graph["edges"]), graph_manager.SNAPSHOT_EVERY_MUTATIONS)
+
+    def test_find_paths(self):
+        print("\n[TEST] Graph Paths")
+        for ip in ("10.0.0.1", "10.0.0.2", "10.0.0.3"):
+            graph_manager.record_host_observation(ip)
+        graph_manager.record_relationship("host:10.0.0.1", "PIVOT", "host:10.0.0.2")
+        graph_manager.record_relationship("host:10.0.0.2", "SSH", "host:10.0.0.3")
+        result = graph_manager.find_paths_between_hosts("10.0.0.1", "10.0.0.3")
+        self.assertIn("host:10.0.0.1 -> PIVOT:host:10.0.0.2 -> SSH:host:10.0.0.3", result)
+        self.assertIn("Nessun percorso", graph_manager.find_paths_between_hosts("10.0.0.1", "10.0.0.3", max_depth=1))
+
+        # Nuovo edge: l'adiacenza in cache viene ricostruita
+        graph_manager.record_relationship("host:10.0.0.1", "RDP", "host:10.0.0.3")
+        result = graph_manager.find_paths_between_hosts("10.0.0.1", "10.0.0.3", max_depth=1)
+        self.assertIn("host:10.0.0.1 -> RDP:host:10.0.0.3", result)
+
+
+if __name__ == "__main__":
+    unittest.main()
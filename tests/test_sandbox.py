@@ -1,5 +1,6 @@
 import unittest
 from backend.core.execution.python_sandbox import execute_python_sandboxed
+from backend.core.execution.security import SecurityValidator
 
 class TestSandbox(unittest.TestCase):
     def test_safe_execution(self):
@@ -26,5 +27,16 @@ class TestSandbox(unittest.TestCase):
         self.assertIn("SECURITY BLOCK", result)
         self.assertIn("Prohibited path string", result)
 
+    def test_validation_cached(self):
+        print("\n[TEST] Validation Cache")
+        validator = SecurityValidator(cache_size=2)
+        first = validator.validate_code("import subprocess")
+        self.assertIs(validator.validate_code("import subprocess"), first)
+        self.assertFalse(first[0])
+
+        validator.validate_code("print(1)")
+        validator.validate_code("print(2)")
+        self.assertEqual(len(validator._cache), 2)
+
 if __name__ == '__main__':
     unittest.main()
@@ -3,9 +3,31 @@ import logging
 from typing import List, Tuple
 from tools.error_handling import SecurityError
 
+# RE2 (opzionale): matching DFA in tempo lineare, niente backtracking
+try:
+    import re2
+    RE2_AVAILABLE = True
+except ImportError:
+    RE2_AVAILABLE = False
+
 logger = logging.getLogger('Security')
 
 
+def _compile_fast(pattern: str):
+    """Compila con RE2 se disponibile, altrimenti con re"""
+    if RE2_AVAILABLE:
+        try:
+            return re2.compile(pattern)
+        except Exception:
+            pass
+    return re.compile(pattern)
+
+
+_BACKTICK_RE = re.compile(r'`([^`\n]{5,200})`')
+_BASH_BLOCK_RE = re.compile(r'```bash\s*\n(.*?)\n```', re.DOTALL)
+_PROMPT_RE = re.compile(r'^\$\s+([a-zA-Z][^\n]{4,200})$', re.MULTILINE)
+
+
 class SecurityValidator:
     """Validazione sicurezza comandi bash."""
     
@@ -54,6 +76,19 @@ class SecurityValidator:
         'for', 'while', 'if', 'test', '[', 'cd', 'pwd', 'export'
     ]
     
+    _blocked_cache = None
+    
+    @classmethod
+    def _blocked_regexes(cls):
+        """Regex combinata + regex singole di BLOCKED_PATTERNS (compilate una volta)"""
+        patterns = tuple(cls.BLOCKED_PATTERNS)
+        cache = cls._blocked_cache
+        if cache is None or cache[0] != patterns:
+            combined = _compile_fast("|".join(f"(?:{p})" for p in patterns))
+            compiled = tuple((p, re.compile(p)) for p in patterns)
+            cache = cls._blocked_cache = (patterns, combined, compiled)
+        return cache[1], cache[2]
+    
     @classmethod
     def validate_command(cls, command: str, strict_mode: bool = False, bypass: bool = False,
                         security_profile: str = "LOCAL_READONLY") -> Tuple[bool, str]:
@@ -107,10 +142,13 @@ class SecurityValidator:
         if strict_mode and first_word not in cls.ALLOWED_COMMANDS:
             return False, f"Comando non in whitelist: {first_word}"
         
-        # 2. Check pattern pericolosi
-        for pattern in cls.BLOCKED_PATTERNS:
-            if re.search(pattern, command_lower):
-                return False, f"Pattern pericoloso rilevato: {pattern}"
+        # 2. Check pattern pericolosi: un solo passaggio sul comando;
+        #    il pattern specifico si cerca solo se qualcosa ha fatto match
+        combined, compiled = cls._blocked_regexes()
+        if combined.search(command_lower):
+            for pattern, regex in compiled:
+                if regex.search(command_lower):
+                    return False, f"Pattern pericoloso rilevato: {pattern}"
         
         # 3. Check lunghezza ragionevole
         if len(command) > 5000:
@@ -153,21 +191,18 @@ class SecurityValidator:
         commands = []
         
         # Pattern 1: Backticks singoli `comando`
-        backtick_pattern = r'`([^`\n]{5,200})`'
-        matches = re.findall(backtick_pattern, text)
+        matches = _BACKTICK_RE.findall(text)
         commands.extend(matches)
         
         # Pattern 2: Code blocks bash
-        bash_block_pattern = r'```bash\s*\n(.*?)\n```'
-        matches = re.findall(bash_block_pattern, text, re.DOTALL)
+        matches = _BASH_BLOCK_RE.findall(text)
         for match in matches:
             # Split per linee e prendi comandi validi
             lines = [l.strip() for l in match.split('\n') if l.strip() and not l.strip().startswith('#')]
             commands.extend(lines)
         
         # Pattern 3: Prompt style ($ comando)
-        prompt_pattern = r'^\$\s+([a-zA-Z][^\n]{4,200})$'
-        matches = re.findall(prompt_pattern, text, re.MULTILINE)
+        matches = _PROMPT_RE.findall(text)
         commands.extend(matches)
         
         return commands